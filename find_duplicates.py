@@ -1,11 +1,75 @@
+"""
+Reports duplicated documents (documents with different names but the same or
+nearly the same text) across the raw text files and the datasaur exports: 
+groups of documents with identical text (found by content hash), and clusters
+of near-duplicates (found with MinHash and LSH banding).
+"""
+import argparse
+import os
+import utils.data.datasaur as datasaur
 import utils.data.raw as raw
-from utils.document import TextDocument
-from itertools import product
-from pprint import pprint
+from utils.data.duplicates import MinHashLSH, content_hash, exact_duplicates
 
 
-raw_docs = [TextDocument(dp) for dp in raw.doc_paths]
+def load_texts(source: str) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Full text of each document from `source` by path, and the name of the
+    document at each path. A text file and the datasaur export of the same
+    document share a name (set 1 exports are named without their leading 
+    '1', so their fixed name is used).
+    """
+    texts, names = {}, {}
+    if source in ('text', 'all'):
+        for doc_path in raw.doc_paths:
+            with open(doc_path, 'r', encoding='utf-8') as f:
+                texts[doc_path] = f.read()
+            names[doc_path] = os.path.basename(doc_path)
+    if source in ('datasaur', 'all'):
+        datasaur.registry.preload()
+        for doc in datasaur.registry:
+            texts[doc.path] = doc.full_text
+            names[doc.path] = doc.fixed_name
+    return texts, names
 
-pprint([doc_pair for doc_pair in product(raw_docs, repeat=2)
-        if doc_pair[0].full_text == doc_pair[1].full_text and
-           doc_pair[0].name != doc_pair[1].name])
\ No newline at end of file
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--source', choices=('text', 'datasaur', 'all'),
+                        default='all', help="Which documents to compare.")
+    parser.add_argument('--threshold', type=float, default=0.8,
+                        help="Minimum estimated Jaccard similarity of the "
+                             "word shingles of near-duplicates.")
+    parser.add_argument('--shingle-size', type=int, default=5)
+    parser.add_argument('--num-perm', type=int, default=128)
+    parser.add_argument('--bands', type=int, default=32)
+    args = parser.parse_args()
+
+    texts, names = load_texts(args.source)
+
+    def is_duplicate(paths: list[str]) -> bool:
+        """Whether `paths` hold more than one document."""
+        return len({names[path] for path in paths}) > 1
+
+    exact_groups = [group for group in exact_duplicates(texts)
+                    if is_duplicate(group)]
+    print(f"{len(exact_groups)} groups of identical documents:")
+    for group in exact_groups:
+        print('  ' + '\n  '.join(group) + '\n')
+
+    lsh = MinHashLSH(args.num_perm, args.bands, args.shingle_size)
+    for path, text in texts.items():
+        lsh.add(path, text)
+    # Groups that only hold identical documents were reported above
+    near_clusters = [cluster for cluster in lsh.clusters(args.threshold)
+                     if is_duplicate(cluster) and 
+                        len({content_hash(texts[path])
+                             for path in cluster}) > 1]
+    print(f"{len(near_clusters)} clusters of near-duplicate documents "
+          f"(similarity >= {args.threshold}, shown to the first document "
+          "of each cluster):")
+    for cluster in near_clusters:
+        first, *rest = cluster
+        print(f"  {first}")
+        for path in rest:
+            print(f"  {path} ({lsh.similarity(first, path):.2f})")
+        print()
@@ -0,0 +1,70 @@
+"""
+Finds where substrings, whole tokens or regex patterns occur in the text files
+and the datasaur exports, and prints the file, line and column of each
+occurrence. Queries go through a persistent index of the corpus (see
+`utils.data.search.CorpusIndex`, kept in `./.cache/corpus_index.pickle`), and
+only files that changed since the last run are reindexed.
+
+Ex: python find_in_corpus.py 'Speaker1:'
+    python find_in_corpus.py --token 'Interviewer1:' --source datasaur
+    python find_in_corpus.py --regex '\\d\\d: \\d\\d' --literal ': '
+    python find_in_corpus.py --check-tokens
+"""
+import argparse
+from collections import Counter
+from utils.data.search import CorpusIndex, Hit
+
+
+def in_source(hit: Hit, source: str) -> bool:
+    return (source == 'all' or
+            (source == 'text') == hit.path.endswith('.txt'))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('queries', nargs='*',
+                        help="Substrings (or tokens, or patterns) to find.")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--token', action='store_true',
+                      help="Only match whole whitespace-separated tokens.")
+    mode.add_argument('--regex', action='store_true',
+                      help="Queries are regular expressions.")
+    mode.add_argument('--check-tokens', action='store_true',
+                      help="Find the check tokens of fix_text_files_clean.py "
+                           "in the text files.")
+    parser.add_argument('--literal', default=None,
+                        help="With --regex, a string every match contains, "
+                             "so only rows containing it are searched.")
+    parser.add_argument('--ignore-case', action='store_true')
+    parser.add_argument('--source', choices=('text', 'datasaur', 'all'),
+                        default='all', help="Where to report matches from.")
+    parser.add_argument('--count', action='store_true',
+                        help="Only print the number of matches per file.")
+    args = parser.parse_args()
+
+    index = CorpusIndex.load()
+    if index.update():
+        index.save()
+
+    queries = args.queries
+    source = args.source
+    if args.check_tokens:
+        from fix_text_files_clean import check_tokens
+        queries, source = check_tokens, 'text'
+    for query in queries:
+        if args.token:
+            hits = index.find_token(query)
+        elif args.regex:
+            hits = index.find_pattern(query, args.literal)
+        else:
+            hits = index.find(query, args.ignore_case)
+        hits = [hit for hit in hits if in_source(hit, source)]
+        print(f"{query!r}: {len(hits)} matches")
+        if args.count:
+            for path, count in Counter(hit.path for hit in hits).items():
+                print(f"  {path}: {count}")
+            continue
+        for hit in hits:
+            print(f"  {hit.path}:{hit.line}:{hit.column}: {hit.match}")
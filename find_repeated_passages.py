@@ -0,0 +1,63 @@
+"""
+Reports passages (runs of lines) that are repeated between documents, such as
+excerpts of an interview that were transcribed into two documents. Documents
+are compared within each transcript by default, or across the whole corpus
+with `--scope corpus`.
+"""
+import argparse
+from collections import defaultdict
+import utils.data.datasaur as datasaur
+import utils.data.raw as raw
+from utils.data.duplicates import PassageIndex
+
+
+def load_lines(source: str) -> dict[str, dict[str, list[str]]]:
+    """Lines of each document from `source` by path, by transcript number."""
+    lines = defaultdict(dict)
+    if source == 'text':
+        for transcript_number, doc_paths in raw.docs_by_transcript.items():
+            for doc_path in doc_paths:
+                with open(doc_path, 'r', encoding='utf-8') as f:
+                    lines[transcript_number][doc_path] = f.read().splitlines()
+    else:
+        datasaur.registry.preload()
+        for doc in datasaur.registry:
+            lines[doc.transcript_number][doc.path] = doc.full_lines
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--source', choices=('text', 'datasaur'),
+                        default='text', help="Which documents to compare.")
+    parser.add_argument('--scope', choices=('transcript', 'corpus'),
+                        default='transcript',
+                        help="Compare documents within each transcript, or "
+                             "across all transcripts.")
+    parser.add_argument('--window', type=int, default=3,
+                        help="Minimum number of (non-blank) lines in a "
+                             "repeated passage.")
+    parser.add_argument('--min-chars', type=int, default=60,
+                        help="Ignore windows of lines shorter than this.")
+    args = parser.parse_args()
+
+    lines_by_transcript = load_lines(args.source)
+    if args.scope == 'corpus':
+        groups = [{path: lines 
+                   for lines_by_path in lines_by_transcript.values()
+                   for path, lines in lines_by_path.items()}]
+    else:
+        groups = [lines_by_transcript[transcript_number] 
+                  for transcript_number in sorted(lines_by_transcript)]
+
+    passages = []
+    for lines_by_path in groups:
+        index = PassageIndex(args.window, args.min_chars)
+        for path, lines in lines_by_path.items():
+            index.add(path, lines)
+        passages.extend(index.repeated_passages())
+
+    print(f"{len(passages)} repeated passages:")
+    for passage in passages:
+        print(f"  {passage.key_a}, lines {passage.start_a}-{passage.end_a}\n"
+              f"  {passage.key_b}, lines {passage.start_b}-{passage.end_b}\n")
@@ -1,36 +1,31 @@
 """
 This script combines all of the fixes listed in DATA_CLEANING.md for the raw
 document data, applying them all in order.
+
+Each fix is registered in `FIXES` and selects the documents it applies to by
+their name before any fix was applied. Every file is read once, goes through
+all of the fixes that select it, and is written once (see
+`utils.data.fixes.FixPipeline`). Pass `--dry-run` to only print what would
+change.
+
+Files that went through these fixes before are recorded in the fix ledger
+(`utils.data.ledger`) and skipped, so running this again doesn't fix anything
+twice (e.g. swap the 2005 speaker labels back).
 """
+import argparse
 import os
+import sys
 from collections import Counter
 from utils.data.raw import *
+from utils.data.fixes import Fix, FixPipeline, documents, replace_fix, \
+                             transcripts
+from utils.data.ledger import FixLedger
 
 
-"""Step 0a: Remove non-txt files from raw data directories"""
-for root, dirs, files in os.walk(f'{text_files_dir}/raw/'):
-    for filename in files:
-        if not filename.endswith('.txt'):
-            os.remove(os.path.join(root, filename))
-
-"""Step 0b. Fix Document 2001-003.txt: replace - with _"""
-if '2001-003.txt' in os.listdir(f'{text_files_dir}/raw/set02'):
-    os.rename(f'{text_files_dir}/raw/set02/2001-003.txt', 
-              f'{text_files_dir}/raw/set02/2001_003.txt')
-
-
-"""Fix transcript 012"""
-for doc_path in docs_by_transcript['012']:
-    with open(doc_path, 'r+') as f:
-        content = f.read()
-        f.seek(0)
-        f.write(content.replace('Interviewee:', 'Interviewer:'))
-        f.truncate()
-
 """Fix misspelled speaker labels and deidentify all documents"""
 replacements = {
-    **dict.fromkeys(["Rebecca", "Christian"], "Interviewer"), 
-    **dict.fromkeys(["Ann", "Lauren Mellin", "Josha"], "NAME"), 
+    **dict.fromkeys(["Rebecca", "Christian"], "Interviewer"),
+    **dict.fromkeys(["Ann", "Lauren Mellin", "Josha"], "NAME"),
     **dict.fromkeys(["Sand", "Buttonheim"], "LOCATION"),
 }
 misspellings = {
@@ -40,72 +35,31 @@ misspellings = {
     "Note" : ["1:Note"] # extra thing we caught---we'll fix even though it isn't a speaker label
 }
 
-for dp in doc_paths:
-    with open(dp, 'r+') as f:
-        content = f.read()
-        if "Rebecca" in content and "Christian" in content:
-            replacements["Rebecca"] = "Interviewer 1"
-            replacements["Christian"] = "Interviewer 2"
-        for old, new in replacements.items():
-            content = content.replace(old, new)
-        for key in misspellings:
-            for misspelling in misspellings[key]:
-                content = content.replace(misspelling, key)
-        f.seek(0)
-        f.write(content)
-        f.truncate()
-
-"""Fix Document 3001_039.txt"""
-with open(get_doc_path('3001_039.txt'), 'r+') as f:
-    content = f.read()
-    f.seek(0)
-    f.write(content.replace('Interviewer:Right', 'Interviewer: Right'))
-    f.truncate()
-
-        
+
+def deidentify(name: str, content: str) -> tuple[str, str]:
+    doc_replacements = replacements
+    if "Rebecca" in content and "Christian" in content:
+        doc_replacements = {**replacements,
+                            "Rebecca": "Interviewer 1",
+                            "Christian": "Interviewer 2"}
+    for old, new in doc_replacements.items():
+        content = content.replace(old, new)
+    for key in misspellings:
+        for misspelling in misspellings[key]:
+            content = content.replace(misspelling, key)
+    return name, content
+
+
 """Fix filenames for all documents from transcripts 001-007"""
-docs_to_check = [
-    doc 
-    for tn in ['001', '002', '003', '005', '006', '007']
-    for doc in docs_by_transcript[tn]
-]
 unique_set2_speaker_labels = {'Interviewee', 'P1', 'P2', 'P3'}
-for doc_path in docs_to_check:
-    with open(doc_path, 'r') as f:
-        content = f.read()
-    if any(speaker_label in content 
+
+
+def rename_set2_document(name: str, content: str) -> tuple[str, str]:
+    if any(speaker_label in content
            for speaker_label in unique_set2_speaker_labels):
-        dir_path, filename = os.path.split(doc_path)
-        new_name = '2' + filename
-        new_path = dir_path + '/' + new_name
-        os.rename(doc_path, new_path)
-        print(f'Renamed {doc_path} to {new_path}')
-
-
-"""Remove duplicates"""
-doc_name_cntr = Counter(doc_names)
-duplicate_doc_names = {name : count for name, count in doc_name_cntr.items()
-                       if count >= 2}
-# !! Not moving forward with this, as manual inspection showed that the
-#    `duplicate_doc_names` dictionary was empty.
-
-"""Fix transcript 2005"""
-for doc_path in docs_by_transcript['2005']:
-    with open(doc_path, 'r+') as f:
-        content = f.read()
-        content = content.replace('P3:', 'Temp:')
-        content = content.replace('Interviewer:', 'P3:')
-        content = content.replace('Temp:', 'P3:')
-        f.seek(0)
-        f.write(content)
-        f.truncate()
-
-"""Fix Document 059_718.txt"""
-with open(get_doc_path('059_718.txt'), 'r+') as f:
-    content = f.read()
-    f.seek(0)
-    f.write(content.replace('Interviewer19:09-', 'Interviewer 19:09 -'))
-    f.truncate()
+        return '2' + name, content
+    return name, content
+
 
 """Fix timestamps in various documents"""
 broken_timestamps = [
@@ -131,13 +85,82 @@ broken_timestamps = [
     ('34:4y', '34:46', 44, ['054', '671']),
     ('36:4o', '36:40', 15, ['3001', '034'])
 ]
+timestamp_fixes = {}
+for broken_ts, fixed_ts, line_num, [trans_num, doc_num] in broken_timestamps:
+    timestamp_fixes.setdefault(f'{trans_num}_{doc_num}.txt', []) \
+                   .append((broken_ts, fixed_ts))
+
+
+FIXES = [
+    replace_fix('Fix transcript 012', [('Interviewee:', 'Interviewer:')],
+                selects=transcripts('012')),
+    Fix('Fix misspelled speaker labels and deidentify', deidentify),
+    replace_fix('Fix Document 3001_039.txt',
+                [('Interviewer:Right', 'Interviewer: Right')],
+                selects=documents('3001_039.txt')),
+    Fix('Fix filenames for transcripts 001-007', rename_set2_document,
+        selects=transcripts('001', '002', '003', '005', '006', '007')),
+    # Swap P3 and Interviewer
+    replace_fix('Fix transcript 2005', [('P3:', 'Temp:'),
+                                        ('Interviewer:', 'P3:'),
+                                        ('Temp:', 'P3:')],
+                selects=transcripts('2005')),
+    replace_fix('Fix Document 059_718.txt',
+                [('Interviewer19:09-', 'Interviewer 19:09 -')],
+                selects=documents('059_718.txt')),
+    *(replace_fix(f'Fix timestamps in {doc_name}', fixes,
+                  selects=documents(doc_name))
+      for doc_name, fixes in timestamp_fixes.items()),
+]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print what would change without writing.")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--mark-applied', action='store_true',
+                        help="Don't fix anything, record every text file as "
+                             "already fixed in the ledger (for files fixed "
+                             "before the ledger existed).")
+    args = parser.parse_args()
+
+    if args.mark_applied:
+        ledger = FixLedger()
+        marked = ledger.mark_applied('fix_raw', text_file_paths())
+        ledger.save()
+        print(f"Marked {marked} files as fixed")
+        sys.exit()
+
+    """Step 0a: Remove non-txt files from raw data directories"""
+    for root, dirs, files in os.walk(f'{text_files_dir}/raw/'):
+        for filename in files:
+            if not filename.endswith('.txt') and not args.dry_run:
+                os.remove(os.path.join(root, filename))
+
+    """Step 0b. Fix Document 2001-003.txt: replace - with _"""
+    if os.path.exists(f'{text_files_dir}/raw/set02/2001-003.txt') and \
+       not args.dry_run:
+        os.rename(f'{text_files_dir}/raw/set02/2001-003.txt',
+                  f'{text_files_dir}/raw/set02/2001_003.txt')
+
+    """Remove duplicates"""
+    doc_name_cntr = Counter(doc_names)
+    duplicate_doc_names = {name : count
+                           for name, count in doc_name_cntr.items()
+                           if count >= 2}
+    # !! Not moving forward with this, as manual inspection showed that the
+    #    `duplicate_doc_names` dictionary was empty.
 
-for broken_ts, fixed_ts, line_num, [trans_num, doc_num] in broken_timestamps: 
-    doc_path = get_doc_path(f'{trans_num}_{doc_num}.txt')
-    with open(doc_path, 'r+') as f:
-        content = f.read()
-        # Fix line
-        content = content.replace(broken_ts, fixed_ts)
-        f.seek(0)
-        f.write(content)
-        f.truncate()
+    # `doc_paths` was listed before step 0b, so list the files again
+    pipeline = FixPipeline(FIXES, FixLedger(), 'fix_raw')
+    results = pipeline.run(text_file_paths(), args.workers, args.dry_run)
+    for result in results:
+        if result.new_path != result.path:
+            print(f'Renamed {result.path} to {result.new_path}')
+    changed = [result for result in results if result.applied]
+    print(f"{len(changed)} of {len(results)} documents "
+          f"{'would be ' if args.dry_run else ''}changed:")
+    for fix_name, count in Counter(fix_name for result in changed
+                                   for fix_name in result.applied).items():
+        print(f"  {fix_name}: {count}")
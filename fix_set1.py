@@ -2,21 +2,49 @@
 All documents from set 1 start with a 0, but we wanted them to start with a 1.
 This is consistent, so all this script does is add a 1 to the beginning of 
 every filename in set 1.
+
+Renamed files are recorded in the fix ledger (`utils.data.ledger`), and files
+recorded there are skipped. Pass `--mark-applied` to only record every file as
+already renamed.
 """
 # In the text files
 from utils.data.raw import doc_paths
+from utils.data.ledger import FixLedger
+import argparse
 import os
+import sys
+
+
+parser = argparse.ArgumentParser(description=__doc__)
+parser.add_argument('--mark-applied', action='store_true',
+                    help="Don't rename anything, record every text file as "
+                         "already renamed in the ledger (for files renamed "
+                         "before the ledger existed).")
+args = parser.parse_args()
 
+ledger = FixLedger()
+if args.mark_applied:
+    marked = ledger.mark_applied('fix_set1', doc_paths)
+    ledger.save()
+    print(f"Marked {marked} files as renamed")
+    sys.exit()
 
 for doc_path in doc_paths:
+    if ledger.is_applied('fix_set1', doc_path):
+        continue
     doc_name = os.path.basename(doc_path)
     set_num = doc_name[0]
     if set_num == '0':
         new_name = '1' + doc_name
         new_path = doc_path.replace(doc_name, new_name)
+        pre_hash = ledger.current_hash(doc_path)
         # Rename the file
         os.rename(doc_path, new_path)
+        # Renaming doesn't change the contents
+        ledger.record('fix_set1', new_path, pre_hash, pre_hash,
+                      old_path=doc_path)
         print(f'Renamed {doc_name} to {new_name}')
+ledger.save()
 
 # # In datasaur
 # import utils.datasaur as data
@@ -1,146 +1,124 @@
+import argparse
+from collections import Counter, defaultdict
 import os
 import re
+import sys
+from utils.data.ledger import FixLedger
+from utils.data.raw import text_file_paths
+from utils.data.search import CorpusIndex
+from utils.regexes import RewriteEngine, RewriteRule
 
 TEXT_FILE_DIRECTORY = './data/mathews/documents/text_files/'
 
-interviewer_errors = [': Interviewer:', 'Interview-', 'interviewer:']
-
-speaker_errors = ['-Speaker:', 'Speaker 1 -', 'Speaker1:', 'Speaker:', 'Participant:']
-participant_errors = 'Participant '
-
-note_taker_errors = ['Note Taker-', 'Note taker:']
-
-location_errors = [' UF', ' LOCATION', ' THE_[LOCATION]']
-    #Kept [' Bay Area', ' Silicon Valley', ' Mountain View', ' San Francisco'] for now since included in multiple interviews
-
-#Found in 1001 files that were added later
-anonymous_errors = ['Lifelock', 'Symantec', 'Broadcom']
-age_error1 = ["I'm 66"]
-age_error2 = ["birthday in May"]
-
-notes_not_speech = ['[laughter]', '[LAUGHTER]', ' LAUGH', '[LAUGH]', ' LAUGHS', '[LAUGHS]', 'LAUGHING', '[LAUGHING]', 'AFFIRMATIVE', '[affirmative]', '[AFFIRMATIVE]', ' NEGATIVE', '[negative]', '[NEGATIVE]', 'Transcribed by Aqueena', 'Transcripted by Aqueena']
-
-unclear_notes = [' [unclear]', ' UNCLEAR']
-inaudible_notes = [' [inaudible]', ' INAUDIBLE']
-incoherent_notes = [' [incoherent', ' INCOHERENT']
-crosstalk_notes = [' [crosstalk]', ' CROSSTALK']
-talking_notes = [' [Talking to person not on the phone]', ' TALKING TO PERSON NOT ON THE PHONE']
-
-paused_notes = ['TRANSCRIPTION PAUSED', 'Transcription Paused – Kendall', 'Transcription paused by Aqueena @', '[CUTS_OUT]']
-end_notes = ['END_OF_RECORDING']
-end_note_corrections = ['-End of transcript-', 'End of transcription.', 'End of transcription']
-
-underscore = r'__+'
-
-for root, dirs, files in os.walk(f'{TEXT_FILE_DIRECTORY}'):
-    for text_file in files:
-        if text_file.endswith(".txt"):
-            file_path = os.path.join(root, text_file)
-            with open(file_path, "r") as f:
-                clean = f.read()
-
-            """
-            Fix interviewer misspellings.
-                : Interviewer:  ; [('3001_076.txt', 12)]
-                Interview-  ; [('3001_037.txt', 1)]
-                interviewer  ; [('3001_030.txt', 8)
-                --> Interviewer:
-            """
-            for error in interviewer_errors:
-                clean = clean.replace(f'{error}', 'Interviewer:')
-
-            """
-            Interviewee errors. 
-            Note: Speaker1 is the same as Speaker in the interviewers.
-                -Speaker:  ; [('3001_017.txt', 38)]
-                Speaker 1 -  ; [('1058_712.txt', 21)]
-                Speaker1:  ; [('3001_011.txt', 58), ('3001_012.txt', 1)]
-                Speaker: (set 3)
-                Participant: 
-                Participant ##: → Interviewee##:        #most consistent with previous changes
-                    #'Participant,' used in a sentence file 1052_642
-            Changed to 'Interviewee:' in sets 1-3
-            """
-            for error in speaker_errors:
-                clean = clean.replace(f'{error}', 'Interviewee:')
-                clean = clean.replace(f'{participant_errors}', 'Interviewee')
-
-            """
-            Note Taker in set03. Changed to Interviewer2. However, Interviewer was not changed to Interviewer1 in these files.
-            'Note Taker-', 'Note taker:'
-            """
-            for error in note_taker_errors:
-                clean = clean.replace(f'{error}', 'Interviewer2:')
-
-            """
-            Location errors
-                UF --> [LOCATION]
-                ' LOCATION' --> ' [LOCATION]'
-                THE_[LOCATION] error in 3001_074.
-                1001 files had very specific California information replaced with [LOCATION], and companies, age, and birthday that were replaced with [ANONYMIZATION]
-            """
-            for error in location_errors:
-                clean = clean.replace(f'{error}', ' [LOCATION]')
-            for error in anonymous_errors:
-                clean = clean.replace(f'{error}', '[ANONYMIZATION]')
-            for error in age_error1:
-                clean = clean.replace(f'{error}', "I'm [ANONYMIZATION]")
-            for error in age_error2:
-                clean = clean.replace(f'{error}', "birthday in [ANONYMIZATION]")
-
-            """
-            Removing transcriber notes that do not stand in for speech.
-            [laughter], [LAUGHTER], LAUGH, [LAUGH], [affirmative], [AFFIRMATIVE], [negative], [NEGATIVE]
-            """
-            for error in notes_not_speech:
-                clean = clean.replace(f'{error}', '')
-
-            """
-            Correct transcriber notes that do stand in for speech. Should be in all caps and within brackets.
-            [unclear], [inaudible], [incoherent], unclear, [crosstalk], [Talking to person not on the phone], 'END_OF_RECORDING '
-            """
-            for error in unclear_notes:
-                clean = clean.replace(f'{error}', ' [UNCLEAR]')
-            for error in inaudible_notes:
-                clean = clean.replace(f'{error}', ' [INAUDIBLE]')
-            for error in incoherent_notes:
-                clean = clean.replace(f'{error}', ' [INCOHERENT]')
-            for error in crosstalk_notes:
-                clean = clean.replace(f'{error}', ' [CROSSTALK]')
-            for error in talking_notes:
-                clean = clean.replace(f'{error}', ' [TALKING TO PERSON NOT ON THE PHONE]')
-
-            """
-            Transcriptions paused corrections. Should be [PAUSED] or [END_OF_RECORDING]
-            """
-            for error in paused_notes:
-                clean = clean.replace(f'{error}', '[PAUSED]')
-            for error in end_notes:
-                clean = clean.replace(f'{error}', '[END_OF_RECORDING]')
-            for error in end_note_corrections:
-                clean = clean.replace(f'{error}', '[END_OF_TRANSCRIPT]')
-                #could be removed completely ''
-            clean = clean.replace('[[END_OF_RECORDING]]', '[END_OR_RECORDING]')
-
-            """
-            Other errors and typos.
-                Either/ in 3001_096
-                []  in 3001_011     #It is just an empty bracket set
-            """
-            clean = clean.replace('Either/', 'Either')
-            clean = clean.replace('[]', '')
-
-            """
-            The underscores. No clear reasoning. 
-            Changed to [UNDERSCORES]
-            Usually, two underscores next to each other '__', but up to five.
-            Single '_' underscores left because some are necessary.
-            May stand in for [INAUDIBLE].
-            """
-            clean = re.sub(underscore, '[UNDERSCORE]', clean)
-
-            with open(file_path, "w") as f:
-                f.write(clean)
+"""
+Every fix below is a `RewriteRule`. All rules are applied to each file at once
+by a `RewriteEngine`, in a single scan of the file, so the order of the rules
+doesn't matter and text put in by one rule is never rewritten by another.
+"""
+REWRITE_RULES = [
+    # Fix interviewer misspellings.
+    #     : Interviewer:  ; [('3001_076.txt', 12)]
+    #     Interview-  ; [('3001_037.txt', 1)]
+    #     interviewer  ; [('3001_030.txt', 8)
+    #     --> Interviewer:
+    RewriteRule('interviewer_errors',
+                [': Interviewer:', 'Interview-', 'interviewer:'],
+                'Interviewer:'),
+
+    # Interviewee errors.
+    # Note: Speaker1 is the same as Speaker in the interviewers.
+    #     -Speaker:  ; [('3001_017.txt', 38)]
+    #     Speaker 1 -  ; [('1058_712.txt', 21)]
+    #     Speaker1:  ; [('3001_011.txt', 58), ('3001_012.txt', 1)]
+    #     Speaker: (set 3)
+    #     Participant:
+    #     Participant ##: → Interviewee##:  #most consistent with previous changes
+    #         #'Participant,' used in a sentence file 1052_642
+    # Changed to 'Interviewee:' in sets 1-3
+    RewriteRule('speaker_errors',
+                ['-Speaker:', 'Speaker 1 -', 'Speaker1:', 'Speaker:',
+                 'Participant:'],
+                'Interviewee:'),
+    RewriteRule('participant_errors', ['Participant '], 'Interviewee'),
+
+    # Note Taker in set03. Changed to Interviewer2. However, Interviewer was
+    # not changed to Interviewer1 in these files.
+    RewriteRule('note_taker_errors', ['Note Taker-', 'Note taker:'],
+                'Interviewer2:'),
+
+    # Location errors
+    #     UF --> [LOCATION]
+    #     ' LOCATION' --> ' [LOCATION]'
+    #     THE_[LOCATION] error in 3001_074.
+    #     1001 files had very specific California information replaced with
+    #     [LOCATION], and companies, age, and birthday that were replaced with
+    #     [ANONYMIZATION]
+    # Kept [' Bay Area', ' Silicon Valley', ' Mountain View', ' San Francisco']
+    # for now since included in multiple interviews
+    RewriteRule('location_errors', [' UF', ' LOCATION', ' THE_[LOCATION]'],
+                ' [LOCATION]'),
+    # Found in 1001 files that were added later
+    RewriteRule('anonymous_errors', ['Lifelock', 'Symantec', 'Broadcom'],
+                '[ANONYMIZATION]'),
+    RewriteRule('age_errors', ["I'm 66"], "I'm [ANONYMIZATION]"),
+    RewriteRule('birthday_errors', ["birthday in May"],
+                "birthday in [ANONYMIZATION]"),
+
+    # Removing transcriber notes that do not stand in for speech.
+    # [laughter], [LAUGHTER], LAUGH, [LAUGH], [affirmative], [AFFIRMATIVE],
+    # [negative], [NEGATIVE]
+    RewriteRule('notes_not_speech',
+                ['[laughter]', '[LAUGHTER]', ' LAUGH', '[LAUGH]', ' LAUGHS',
+                 '[LAUGHS]', 'LAUGHING', '[LAUGHING]', 'AFFIRMATIVE',
+                 '[affirmative]', '[AFFIRMATIVE]', ' NEGATIVE', '[negative]',
+                 '[NEGATIVE]', 'Transcribed by Aqueena',
+                 'Transcripted by Aqueena'],
+                ''),
+
+    # Correct transcriber notes that do stand in for speech. Should be in all
+    # caps and within brackets.
+    # [unclear], [inaudible], [incoherent], unclear, [crosstalk],
+    # [Talking to person not on the phone], 'END_OF_RECORDING '
+    RewriteRule('unclear_notes', [' [unclear]', ' UNCLEAR'], ' [UNCLEAR]'),
+    RewriteRule('inaudible_notes', [' [inaudible]', ' INAUDIBLE'],
+                ' [INAUDIBLE]'),
+    RewriteRule('incoherent_notes', [' [incoherent', ' INCOHERENT'],
+                ' [INCOHERENT]'),
+    RewriteRule('crosstalk_notes', [' [crosstalk]', ' CROSSTALK'],
+                ' [CROSSTALK]'),
+    RewriteRule('talking_notes',
+                [' [Talking to person not on the phone]',
+                 ' TALKING TO PERSON NOT ON THE PHONE'],
+                ' [TALKING TO PERSON NOT ON THE PHONE]'),
+
+    # Transcriptions paused corrections. Should be [PAUSED] or
+    # [END_OF_RECORDING]
+    RewriteRule('paused_notes',
+                ['TRANSCRIPTION PAUSED', 'Transcription Paused – Kendall',
+                 'Transcription paused by Aqueena @', '[CUTS_OUT]'],
+                '[PAUSED]'),
+    # Already bracketed notes are matched too, so they stay single-bracketed
+    RewriteRule('end_notes', [r'\[*END_OF_RECORDING\]*'],
+                '[END_OF_RECORDING]', regex=True),
+    # could be removed completely ''
+    RewriteRule('end_note_corrections',
+                ['-End of transcript-', 'End of transcription.',
+                 'End of transcription'],
+                '[END_OF_TRANSCRIPT]'),
+
+    # Other errors and typos.
+    #     Either/ in 3001_096
+    #     []  in 3001_011     #It is just an empty bracket set
+    RewriteRule('typos', ['Either/'], 'Either'),
+    RewriteRule('empty_brackets', ['[]'], ''),
+
+    # The underscores. No clear reasoning.
+    # Changed to [UNDERSCORES]
+    # Usually, two underscores next to each other '__', but up to five.
+    # Single '_' underscores left because some are necessary.
+    # May stand in for [INAUDIBLE].
+    RewriteRule('underscore', [r'__+'], '[UNDERSCORE]', regex=True),
+]
 
 """
 Dashes left in. Appear as '-' or '--' at the end of the line.
@@ -201,20 +179,88 @@ check_tokens = ['-Speaker:', 'Transcribed by Aqueena', 'Transcripted by Aqueena'
 underscores = ['__', '___', '____', '______']
     #some single underscores, but maybe necessary
 
-found = dict()
 regex_happy_list = map(re.escape, check_tokens)
 tokens = re.compile("|".join(regex_happy_list))
 
-for root, dirs, files in os.walk(f'{TEXT_FILE_DIRECTORY}'):
-    for text_file in files:
-        if text_file.endswith(".txt"):
-            file_path = os.path.join(root, text_file)
-            with open(file_path, "r") as f:
-                for line_num, line in enumerate(f, start=1):
-                    for match in tokens.finditer(line):
-                        key = match.group()
-                        if key not in found:
-                            found[key] = []
-                        found[key].append((file_path[42:], line_num))
-for key in sorted(found):
-    print(f'{key}  ; {found[key]}')
\ No newline at end of file
+
+def find_check_tokens() -> dict[str, list[tuple[str, int]]]:
+    """
+    Every check token left in the text files, with the files and (1-based)
+    lines it's on. Looked up in the corpus index (see `find_in_corpus.py`),
+    so only files that changed since the last lookup are read.
+    """
+    index = CorpusIndex.load()
+    if index.update():
+        index.save()
+    found = defaultdict(list)
+    for key in check_tokens:
+        for hit in index.find(key):
+            if hit.path.endswith('.txt'):
+                found[key].append((hit.path[42:], hit.line))
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Cleans up the text files that weren't cleaned yet."
+    )
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Don't write any files; print how many times "
+                             "each rule would be applied to each file.")
+    parser.add_argument('--mark-applied', action='store_true',
+                        help="Don't clean anything, record every text file "
+                             "as already cleaned in the ledger (for files "
+                             "cleaned before the ledger existed).")
+    parser.add_argument('--check-tokens', action='store_true',
+                        help="Afterwards, report which check tokens are "
+                             "left in the text files (all of them, as they "
+                             "are on disk).")
+    args = parser.parse_args()
+
+    if args.mark_applied:
+        ledger = FixLedger()
+        marked = ledger.mark_applied('fix_text_files_clean',
+                                     text_file_paths())
+        ledger.save()
+        print(f"Marked {marked} files as cleaned")
+        sys.exit()
+
+    engine = RewriteEngine(REWRITE_RULES)
+    # Files already cleaned aren't opened at all
+    ledger = FixLedger()
+    hits_by_file = {}
+    for root, dirs, files in os.walk(f'{TEXT_FILE_DIRECTORY}'):
+        for text_file in files:
+            if text_file.endswith(".txt"):
+                file_path = os.path.join(root, text_file)
+                if ledger.is_applied('fix_text_files_clean', file_path):
+                    continue
+                pre_hash = ledger.current_hash(file_path)
+                with open(file_path, "r") as f:
+                    text = f.read()
+                clean, hits = engine.rewrite(text)
+                if hits:
+                    hits_by_file[file_path[42:]] = hits
+                    if not args.dry_run:
+                        with open(file_path, "w") as f:
+                            f.write(clean)
+                if not args.dry_run:
+                    ledger.record('fix_text_files_clean', file_path,
+                                  pre_hash, None if hits else pre_hash)
+
+    if not args.dry_run:
+        ledger.save()
+    if args.dry_run:
+        for file_name in sorted(hits_by_file):
+            print(f'{file_name}: ' + ', '.join(
+                f'{rule} ({count})'
+                for rule, count in sorted(hits_by_file[file_name].items())
+            ))
+        totals = sum(hits_by_file.values(), Counter())
+        print(f'{len(hits_by_file)} files would change: ' + ', '.join(
+            f'{rule} ({count})' for rule, count in sorted(totals.items())
+        ))
+    if args.check_tokens:
+        found = find_check_tokens()
+        for key in sorted(found):
+            print(f'{key}  ; {found[key]}')
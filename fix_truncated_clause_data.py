@@ -1,14 +1,42 @@
 """
 This file aggregates a bunch of changes, all summarized in `DATA_CLEANING.md `.
+
+Every change is made through one `PatchSession`, which keeps the edits in
+memory (and each row's tokens in step with its content), so later sections see
+the edits of earlier ones. Each touched export is written once at the end.
+
+Exports this script went over before are recorded in the fix ledger
+(`utils.data.ledger`) and left out, so running it again doesn't fix anything
+twice (e.g. swap the 2005 speaker labels back). Pass `--mark-applied` to only
+record every export as already fixed.
 """
-from collections import Counter, defaultdict
-import importlib
-import random
+import argparse
+import re
+import sys
 import utils.data.datasaur as datasaur
-import utils.transcript
-from utils.transcript import Transcript
-import json
-import os
+from utils.data.ledger import FixLedger
+from utils.data.patches import PatchSession
+
+
+parser = argparse.ArgumentParser(
+    description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+)
+parser.add_argument('--mark-applied', action='store_true',
+                    help="Don't fix anything, record every export as already "
+                         "fixed in the ledger (for exports fixed before the "
+                         "ledger existed).")
+args = parser.parse_args()
+
+if args.mark_applied:
+    ledger = FixLedger()
+    marked = ledger.mark_applied('fix_truncated_clause_data',
+                                 datasaur.registry.paths)
+    ledger.save()
+    print(f"Marked {marked} exports as fixed")
+    sys.exit()
+
+session = PatchSession(ledger=FixLedger(),
+                       fix_id='fix_truncated_clause_data')
 
 
 """Speaker Label Corrections"""
@@ -20,22 +48,8 @@ In Transcript 012, the speaker label "Interviewee" was mistakenly labeled as
 "Interviewer". This code corrects that error by replacing all instances of
 "Interviewee" with "Interviewer".
 """
-for doc in Transcript("012").docs:
-    # Modify doc.row_data and fix Interviewer label
-    for i in range(len(doc.row_data)):
-        # Fix labels in the lines
-        doc.row_data[i]['content'] = doc.row_data[i]['content'].replace("Interviewee:", 
-                                                          "Interviewer:")
-        # Fix labels in the tokens
-        for j in range(len(doc.row_data[i]['tokens'])):
-            token: str = doc.row_data[i]['tokens'][j]
-            token = token.replace("Interviewee:", "Interviewer:") 
-            doc.row_data[i]['tokens'][j] = token
-    # Switch out old row data in the JSON dump with the new one
-    doc.json_dump['rows'] = doc.row_data
-
-    with open(doc.path, "w") as f:
-        json.dump(doc.json_dump, f)
+for doc in session.transcript("012"):
+    session.replace(doc, "Interviewee:", "Interviewer:")
 
 """
 ## De-identify Documents
@@ -50,32 +64,17 @@ replacements = {
     **dict.fromkeys(["Sand", "Buttonheim"], "LOCATION"),
 }
 
-for doc in datasaur.docs:
+for doc in session:
+    doc_replacements = replacements
     # If both Rebecca and Christian are present, we can distinguish them
     # (not necessary, but makes reading the transcript easier)
     if {"Rebecca", "Christian"}.issubset(doc.speaker_set(restrict=False)):
-        replacements["Rebecca"] = "Interviewer 1"
-        replacements["Christian"] = "Interviewer 2"
-    else:
-        replacements["Rebecca"] = "Interviewer"
-        replacements["Christian"] = "Interviewer"
-
-    # Modify doc.row_data
-    for i in range(len(doc.row_data)):
-        # Fix labels in the lines
-        for name, repl in replacements.items():
-            doc.row_data[i]['content'] = doc.row_data[i]['content'].replace(name, repl)
-        # Fix labels in the tokens (Commented out because it's not working lol)
-        for j in range(len(doc.row_data[i]['tokens'])):
-            token: str = doc.row_data[i]['tokens'][j]
-            for name, repl in replacements.items():
-                token = token.replace(name, repl)
-            doc.row_data[i]['tokens'][j] = token
-    # Switch out old row data in the JSON dump with the new one
-    doc.json_dump['rows'] = doc.row_data
-
-    with open(doc.path, "w") as f:
-        json.dump(doc.json_dump, f)
+        doc_replacements = {**replacements,
+                            "Rebecca": "Interviewer 1",
+                            "Christian": "Interviewer 2"}
+    # Replacements with spaces (like "Interviewer 1") stay a single token
+    for name, repl in doc_replacements.items():
+        session.replace(doc, name, repl)
 
 """
 ## Fix Misspelled Speaker Labels
@@ -88,30 +87,10 @@ misspellings = {
     "Interviewer" : ["Interviewer1", "1:Interviewer"],
     "Note" : ["1:Note"] # extra thing we caught---we'll fix even though it isn't a speaker label
 }
-for doc in datasaur.docs:
-    # Modify doc.row_data and labels
-    for i in range(len(doc.row_data)):
-        # Fix labels in the lines
-        for key in misspellings:
-            for misspelled in misspellings[key]:
-                doc.row_data[i]['content'] = (doc.row_data[i]['content']
-                                                 .replace(misspelled, key))
-        # Fix labels in the tokens
-        for j in range(len(doc.row_data[i]['tokens'])):
-            token: str = doc.row_data[i]['tokens'][j]
-            for key in misspellings:
-                if any(misspelling in token 
-                       for misspelling in misspellings[key]):
-                    # token = key (correct spelling)
-                    fixed_token = (doc.row_data[i]['tokens'][j]
-                                      .replace(token, key))
-                    doc.row_data[i]['tokens'][j] = fixed_token
-                    break # Found token's match, no need to keep checking
-    # Switch out old row data in the JSON dump with the new one
-    doc.json_dump['rows'] = doc.row_data
-
-    with open(doc.path, "w") as f:
-        json.dump(doc.json_dump, f)
+for doc in session:
+    for key in misspellings:
+        for misspelled in misspellings[key]:
+            session.replace(doc, misspelled, key)
 
 """
 ## Fix Specific Line in Document 3001_039.txt
@@ -119,22 +98,11 @@ for doc in datasaur.docs:
 Literally just change "Interviewer:Right" to "Interviewer: Right" in this 
 document. Necessary for speaker label detection.
 """
-doc = Transcript("3001")["039"]
-bad_line_index = [i for i in range(len(doc.row_data))][0]
-if "Interviewer:Right" in doc.row_data[bad_line_index]['content']:
-    doc.row_data[bad_line_index]['content'] = (doc.row_data[bad_line_index]['content'].replace("Interviewer:Right", "Interviewer: Right"))
-
-# Fix labels in the tokens
-tokens: list[str] = doc.row_data[bad_line_index]['tokens']
-# In this case, this line only had one token, so we can just delete it
-# and replace it with two new ones
-tokens[0] = "Interviewer:"
-tokens.insert(1, "Right")
-
-# Switch out old row data in the JSON dump with the new one
-doc.json_dump['rows'] = doc.row_data
-with open(doc.path, "w") as f:
-    json.dump(doc.json_dump, f)
+doc = session.document("3001_039")
+bad_line_index = 0
+# The line's one token is split into two, "Interviewer:" and "Right"
+session.replace(doc, "Interviewer:Right", "Interviewer: Right",
+                rows=[bad_line_index], split=True)
 
 
 """/Speaker Label Corrections"""
@@ -142,20 +110,20 @@ with open(doc.path, "w") as f:
 
 """Remove duplicate documents"""
 names = set()
-for doc in datasaur.docs:
+for doc in session:
     if doc.name not in names:
         names.add(doc.name)
     else:
-        os.remove(doc.path)
+        session.remove(doc)
     
     # Also remove 2017 documents
     if doc.transcript_number == '2017':
-        os.remove(doc.path)
+        session.remove(doc)
     
     # And these specific duplicate documents
     if doc.name in ["2026_393.txt", "2026_394.txt", "2026_395.txt", 
                     "2026_396.txt",  "2026_397.txt", "2026_398.txt"]:
-        os.remove(doc.path)
+        session.remove(doc)
 
 """
 ## Fix Transcripts 001-007
@@ -175,26 +143,12 @@ transcript_numbers = ['001', '002', '003', '004',
                       '005', '006', '007']
 
 for tn in transcript_numbers:
-    for doc in Transcript(tn).docs:
+    for doc in session.transcript(tn):
         unique_set2_speaker_labels = {'Interviewee', 'P1', 'P2', 'P3'}
         if any(speaker_label in doc.speaker_set() 
             for speaker_label in unique_set2_speaker_labels):
-            old_path = doc.path
-            new_name = '2' + doc.name
-            new_path = (os.path.dirname(old_path) + '/' + 
-                        new_name.rstrip('.txt') + '.json')
-            with open(old_path, 'w') as f:
-                print(f'Fixing {old_path}')
-                doc.json_dump['data']['document']['name'] = new_name
-                json.dump(doc.json_dump, f)
-            os.rename(old_path, new_path)
-            print(f'Renamed {old_path} to {new_path}')
-
-
-# Need to re-import to update changed file data
-importlib.reload(datasaur)
-importlib.reload(utils.transcript)
-from utils.transcript import Transcript
+            print(f'Renaming {doc.name} to 2{doc.name}')
+            session.rename(doc, '2' + doc.name)
 
 """
 ## Fix Transcript 2005 Speaker Labels
@@ -206,28 +160,14 @@ Note that this code needs to be run after the previous code, as otherwise some
 of the documents from 2005 will not be targeted, as they will be mistakenly 
 labeled under transcript 005.
 """
-for doc in Transcript('2005').docs:
-    # Fix rows/lines
-    for i in range(len(doc.row_data)):
-        line = doc.row_data[i]['content']
-        if 'P3' in line:
-            line = line.replace('P3', 'Interviewee')
-        elif 'Interviewee' in line:
-            line = line.replace('Interviewee', 'P3')
-        doc.row_data[i]['content'] = line
-        # Fix tokens
-        for j in range(len(doc.tokens)):
-            token = doc.tokens[j]
-            if 'P3' in token:
-                token = token.replace('P3', 'Interviewee')
-            elif 'Interviewee' in token:
-                token = token.replace('Interviewee', 'P3')
-            doc.tokens[j] = token
-        doc.row_data[i]['tokens'] = doc.tokens
-    doc.json_dump['rows'] = doc.row_data
-
-    with open(doc.path, "w") as f:
-        json.dump(doc.json_dump, f)
+swapped_labels = {'P3': 'Interviewee', 'Interviewee': 'P3'}
+swapped_labels_regex = re.compile('|'.join(swapped_labels))
+
+def swap_labels(text: str) -> str:
+    return swapped_labels_regex.sub(lambda m: swapped_labels[m.group()], text)
+
+for doc in session.transcript('2005'):
+    session.map_text(doc, swap_labels)
 
 
 """
@@ -264,32 +204,11 @@ broken_timestamps = [
 
 
 for broken_ts, fixed_ts, line_num, [trans_num, doc_num] in broken_timestamps: 
-    doc = Transcript(trans_num)[doc_num]
-
-    # Fix line
-    doc.row_data[line_num]['content'] = doc.row_data[line_num]['content'].replace(broken_ts, fixed_ts)
-
-    # Fix tokens
-    token_line: list[str] = doc.tokens[line_num]
-    if ' ' in broken_ts:
-        # Special fix for broken timestamps with spaces
-        broken_ts_parts = broken_ts.split()
-        if any(part not in token_line for part in broken_ts_parts):
-            continue
-        fixed_token_index = token_line.index(broken_ts_parts[0])
-        token_line[fixed_token_index] = fixed_ts
-        del token_line[fixed_token_index + 1]
-    else:
-        # Normal fix
-        try:
-            index = [i for i in range(len(token_line)) 
-                    if broken_ts in token_line[i]][0]
-        except IndexError:
-            continue
-        token_line[index] = token_line[index].replace(broken_ts, fixed_ts)
-    doc.row_data[line_num]['tokens'] = token_line
-
-    doc.json_dump['rows'] = doc.row_data
-
-    with open(doc.path, "w") as f:
-        json.dump(doc.json_dump, f)
\ No newline at end of file
+    doc = session.document(f'{trans_num}_{doc_num}')
+    # Timestamps broken by a space span two tokens, which get merged into one
+    session.replace(doc, broken_ts, fixed_ts, rows=[line_num])
+
+
+"""Write every changed export, once"""
+written = session.commit()
+print(f'Wrote {len(written)} documents')
\ No newline at end of file
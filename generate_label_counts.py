@@ -1,23 +1,134 @@
+"""
+Writes the label counts of every datasaur document to
+`./tables/label_counts.csv`.
+
+By default, only rows for exports that were added, changed or removed since the
+last run are recomputed. Which export each row came from (and the export's
+content hash) is kept in a manifest next to the corpus cache. Pass `--full` to
+rebuild every row.
+"""
+import argparse
+import json
+import os
 import pandas as pd
 from tqdm import tqdm
-import utils.data.datasaur as datasaur 
+import utils.data.datasaur as datasaur
+from utils.data.cache import CACHE_VERSION, file_digest, write_atomically
 
 
-if __name__ == "__main__":
-    # List of rows in the csv file 
-    table_rows = []
-    
-    pbar = tqdm(datasaur.docs)
-    for doc in pbar:
-        pbar.set_description(f"{doc}")
+TABLE_PATH = './tables/label_counts.csv'
+MANIFEST_PATH = './.cache/label_counts_manifest.json'
+
+# Bump this whenever the columns of a row (or how they're counted) change, so
+# that rows from an older manifest are recomputed. The manifest is also thrown
+# away when `CACHE_VERSION` changes, since that tracks changes to the parsing
+# and speaker logic the counts come from.
+MANIFEST_VERSION = 1
+
+
+def table_row(doc) -> dict:
+    return {
+        'Project' : doc.project,
+        'Document Name' : doc.name,
+        'Hoarder Flag' : doc.hoarder_flag,
+        **doc.label_counts,
+    }
+
+
+def manifest_version() -> list[int]:
+    return [MANIFEST_VERSION, CACHE_VERSION]
+
+
+def load_manifest(manifest_path: str=MANIFEST_PATH,
+                  table_path: str=TABLE_PATH) -> dict[str, dict]:
+    """
+    Maps each export's path to its mtime, size, content hash and table row
+    as of the last run. Empty if there was no run yet, or the manifest was
+    written by an older version of the counting code.
+    """
+    if not (os.path.exists(manifest_path) and os.path.exists(table_path)):
+        return {}
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != manifest_version():
+        return {}
+    return manifest['exports']
+
 
-        row = { 
-            'Project' : doc.project,
-            'Document Name' : doc.name, 
-            'Hoarder Flag' : doc.hoarder_flag,
-            **doc.label_counts,
+def is_unchanged(path: str, entry: None | dict) -> bool:
+    """
+    Whether the export at `path` is the same as when `entry` was recorded.
+    Only hashes the file if its mtime or size changed.
+    """
+    if entry is None:
+        return False
+    stat = os.stat(path)
+    if (entry['mtime_ns'], entry['size']) == (stat.st_mtime_ns, stat.st_size):
+        return True
+    return file_digest(path) == entry['hash']
+
+
+def update_manifest(registry: datasaur.DocumentRegistry,
+                    old_manifest: dict[str, dict],
+                    report=False) -> tuple[dict, list[str], set[str]]:
+    """
+    Build the manifest for the exports in `registry`, reusing the rows of
+    `old_manifest` for exports that didn't change. Returns the new manifest,
+    the paths whose rows were recomputed and the paths that were removed.
+    """
+    if not old_manifest:
+        # Parse every export up front, reading files in parallel
+        registry.preload(report=report)
+
+    manifest = {}
+    changed_paths = []
+    for path in registry.paths:
+        if is_unchanged(path, old_manifest.get(path)):
+            # Record the current mtime and size in case the file was touched
+            stat = os.stat(path)
+            manifest[path] = {**old_manifest[path],
+                              'mtime_ns': stat.st_mtime_ns,
+                              'size': stat.st_size}
+        else:
+            changed_paths.append(path)
+    removed_paths = old_manifest.keys() - set(registry.paths)
+
+    pbar = tqdm(changed_paths, disable=not report)
+    for path in pbar:
+        doc = registry.load(path)
+        pbar.set_description(f"{doc}")
+        stat = os.stat(path)
+        manifest[path] = {
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': file_digest(path),
+            'row': table_row(doc),
         }
-        table_rows.append(row)
+    return manifest, changed_paths, removed_paths
+
+
+def write_table(registry: datasaur.DocumentRegistry, manifest: dict,
+                manifest_path: str=MANIFEST_PATH,
+                table_path: str=TABLE_PATH) -> None:
+    """Write the table and the manifest it was built from."""
+    # List of rows in the csv file, in the same order as a full rebuild
+    table_rows = [manifest[path]['row'] for path in registry.paths]
+    write_atomically(table_path, pd.DataFrame(table_rows).to_csv(index=False))
+    write_atomically(manifest_path, json.dumps({'version': manifest_version(),
+                                                'exports': manifest}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--full', action='store_true',
+                        help="Recompute every row, ignoring the manifest.")
+    args = parser.parse_args()
 
-    df = pd.DataFrame(table_rows)
-    df.to_csv('./tables/label_counts.csv', index=False)
\ No newline at end of file
+    old_manifest = {} if args.full else load_manifest()
+    manifest, changed_paths, removed_paths = update_manifest(
+        datasaur.registry, old_manifest, report=True
+    )
+    print(f"{len(changed_paths)} rows recomputed, {len(removed_paths)} "
+          f"removed, {len(manifest) - len(changed_paths)} unchanged.")
+    if changed_paths or removed_paths or manifest != old_manifest:
+        write_table(datasaur.registry, manifest)
@@ -1,3 +1,19 @@
+"""
+Writes linguistic measures (TTR, ASL, NP ratio, MATTR and MTLD) of the 
+participant speech in every text file to `./tables/linguistic_data.csv`.
+
+Documents are parsed in batches, and batches are spread over `--workers` 
+processes that each load their own stanza pipeline (so each worker holds its
+own copy of the models in memory, which is why only a few are used by
+default). Rows are written in the same order as `raw.doc_paths` however many
+workers are used. Parses are kept in a `ling.ParseCache`, so only text that
+changed since the last run is parsed again.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import os
 import pandas as pd
 import utils.ling as ling
 import utils.data.raw as raw
@@ -6,28 +22,70 @@ from tqdm import tqdm
 import warnings
 
 
+# Every worker loads a full stanza pipeline, which takes a few GB of memory, so
+# this stays small however many cores there are
+DEFAULT_WORKERS = min(2, os.cpu_count() or 1)
+
+
+def linguistic_row(doc: TextDocument, parsed_part: ling.ParsedText) -> dict:
+    participant_tokens = ling.sentence_tokens(parsed_part)
+    if not participant_tokens:
+        if doc.content("Interviewer"):
+            warnings.warn(f"No participant content found in {doc.name}" +
+                           "(Note: Interviewer content present)")
+        else:
+            raise ValueError(f"No content found in {doc.name} "
+                              "for any speaker")
+    return {
+        'Document Name': doc.name,
+        'TTR': ling.type_token_ratio(participant_tokens),
+        'ASL': ling.average_sentence_length(participant_tokens),
+        'NPR': ling.NP_ratio_in_sd(parsed_part),
+        'MATTR': ling.MATTR(ling.iter_tokens([parsed_part])),
+        'MTLD': ling.MTLD(ling.iter_tokens([parsed_part])),
+    }
+
+
+def process_batch(doc_paths: list[str], batch_size: int) -> list[dict]:
+    """Table rows for a batch of text files, in the same order."""
+    docs = [TextDocument(doc_path) for doc_path in doc_paths]
+    parsed = ling.ParseCache().parse([doc.content("Participant") 
+                                      for doc in docs], batch_size)
+    return [linguistic_row(doc, parsed_part) 
+            for doc, parsed_part in zip(docs, parsed)]
+
+
 if __name__ == "__main__":
-    csv_rows = []
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help="Number of processes to parse with. Each loads "
+                             "its own stanza models, so mind the memory.")
+    parser.add_argument('--batch-size', type=int, default=32,
+                        help="Number of documents stanza parses at once.")
+    args = parser.parse_args()
 
-    for doc_path in tqdm(raw.doc_paths):
-        doc = TextDocument(doc_path)
-        stanza_doc_part = ling.nlp(doc.content("Participant"))
-        participant_tokens = [[token.text for token in sent.tokens] 
-                          for sent in stanza_doc_part.sentences] # type: ignore
-        if not participant_tokens:
-            if doc.content("Interviewer"):
-                warnings.warn(f"No participant content found in {doc.name}" +
-                               "(Note: Interviewer content present)")
-            else:
-                raise ValueError(f"No content found in {doc.name} "
-                                  "for any speaker")
-
-        csv_rows.append({
-            'Document Name': doc.name,
-            'TTR': ling.type_token_ratio(participant_tokens),
-            'ASL': ling.average_sentence_length(participant_tokens),
-            'NPR': ling.NP_ratio_in_sd(stanza_doc_part)
-        })
+    batches = [raw.doc_paths[i:i + args.batch_size]
+               for i in range(0, len(raw.doc_paths), args.batch_size)]
+    run_batch = partial(process_batch, batch_size=args.batch_size)
+    csv_rows = []
+    pbar = tqdm(total=len(raw.doc_paths))
+    if args.workers == 1:
+        for batch in batches:
+            csv_rows.extend(run_batch(batch))
+            pbar.update(len(batch))
+    else:
+        # Spawn rather than fork, so that no worker inherits the parent's
+        # torch state
+        with ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=ling.init_worker
+        ) as executor:
+            # `map` yields results in submission order, keeping rows in order
+            for batch, rows in zip(batches, executor.map(run_batch, batches)):
+                csv_rows.extend(rows)
+                pbar.update(len(batch))
+    pbar.close()
 
     df = pd.DataFrame(csv_rows)
-    df.to_csv('./tables/linguistic_data.csv', index=False)
\ No newline at end of file
+    df.to_csv('./tables/linguistic_data.csv', index=False)
@@ -0,0 +1,47 @@
+import json
+import os
+import shutil
+from utils.data.cache import CorpusCache
+
+
+EXPORT = ("./data/mathews/documents/datasaur_exports/truncated_clauses/"
+          "s1062_s2022-26_s3076-97-NDQ2OTMwYjg/REVIEW/062_745.json")
+
+
+def test_cache_round_trip(tmp_path):
+    path = str(tmp_path / "062_745.json")
+    shutil.copy(EXPORT, path)
+    cache = CorpusCache(str(tmp_path / "cache"))
+    assert cache.lookup(path) is None
+
+    doc = cache.load(path)
+    cached = cache.lookup(path)
+    assert cached is not None
+    assert cached.json_dump == doc.json_dump
+    # Derived state comes straight from the cache
+    assert 'speaker_turns' in cached.__dict__
+    assert cached._row_speakers == doc._row_speakers
+    assert cached.label_counts == doc.label_counts
+
+
+def test_cache_survives_touch(tmp_path):
+    path = str(tmp_path / "062_745.json")
+    shutil.copy(EXPORT, path)
+    cache = CorpusCache(str(tmp_path / "cache"))
+    cache.load(path)
+    os.utime(path, ns=(0, 0))
+    assert cache.lookup(path) is not None
+
+
+def test_cache_invalidated_by_edit(tmp_path):
+    path = str(tmp_path / "062_745.json")
+    shutil.copy(EXPORT, path)
+    cache = CorpusCache(str(tmp_path / "cache"))
+    cache.load(path)
+    with open(path) as f:
+        json_dump = json.load(f)
+    json_dump['data']['rows'][0][0]['content'] = "Participant:"
+    with open(path, 'w') as f:
+        json.dump(json_dump, f)
+    assert cache.lookup(path) is None
+    assert cache.load(path).full_lines[0] == "Participant:"
@@ -0,0 +1,64 @@
+import pytest
+from utils.data.datasaur import DocumentRegistry, load_documents, projects
+
+
+def test_registry_is_lazy():
+    registry = DocumentRegistry(projects)
+    assert len(registry) > 0
+    assert not registry._cache
+
+
+@pytest.mark.parametrize("name,transcript_number", [
+    ("062_745", "062"),
+    ("2022_335.txt", "2022"),
+    ("3001_090", "3001"),
+])
+def test_registry_get(name, transcript_number):
+    registry = DocumentRegistry(projects)
+    doc = registry.get(name)
+    assert doc.transcript_number == transcript_number
+    # Second access comes from the cache
+    assert registry.get(name) is doc
+    assert len(registry._cache) == 1
+
+
+def test_registry_get_missing():
+    registry = DocumentRegistry(projects)
+    with pytest.raises(KeyError):
+        registry.get("999_999")
+
+
+def test_registry_transcript():
+    registry = DocumentRegistry(projects)
+    docs = registry.transcript("2005")
+    assert docs
+    assert all(doc.transcript_number == "2005" for doc in docs)
+
+
+def test_registry_cache_is_bounded():
+    registry = DocumentRegistry(projects, maxsize=2)
+    for name in ("062_745", "2022_335", "3001_090"):
+        registry.get(name)
+    paths = [registry.paths_by_name[name + ".txt"]
+             for name in ("062_745", "2022_335", "3001_090")]
+    # The least recently used document was evicted
+    assert list(registry._cache) == paths[1:]
+    registry.get("2022_335")
+    registry.get("062_745")
+    assert list(registry._cache) == [paths[1], paths[0]]
+
+
+def test_docs_is_a_snapshot():
+    import utils.data.datasaur as datasaur
+    assert datasaur.docs is datasaur.docs
+    assert datasaur.docs_by_project[projects[0]][0] in datasaur.docs
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_load_documents_keeps_order(workers):
+    registry = DocumentRegistry(projects)
+    paths = registry.paths[:20]
+    docs = load_documents(paths, workers=workers)
+    assert [doc.path for doc in docs] == paths
+    assert [doc.full_text for doc in docs] == \
+           [registry.load(path).full_text for path in paths]
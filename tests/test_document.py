@@ -1,5 +1,5 @@
 import pytest
-from utils.document import DatasaurDocument
+from utils.document import BaseDocument, DatasaurDocument
 import json
 import os
 
@@ -272,4 +272,82 @@ def test_content_by_speaker(test_doc, speaker, speaker_labels, cleaned,
                             expected_lines):
     assert test_doc.content_by_speaker(speaker, 
                                        speaker_labels=speaker_labels,
-                                       cleaned=cleaned) == expected_lines
\ No newline at end of file
+                                       cleaned=cleaned) == expected_lines
+
+def test_lines_are_memoized():
+    doc = DatasaurDocument(f"./data/mathews/documents/datasaur_exports/"
+                            "truncated_clauses/s1062_s2022-26_s3076-97-"
+                            "NDQ2OTMwYjg/REVIEW/062_745.json")
+    participant = doc.content("Participant")
+    assert doc.content("Participant") == participant
+    assert doc.cache_info().hits == 1
+    # Modifying the returned list doesn't touch the cached one
+    doc.lines("Interviewer").append("extra line")
+    assert "extra line" not in doc.lines("Interviewer")
+    doc.clear_cache()
+    assert doc.cache_info().currsize == 0
+    assert doc.content("Participant") == participant
+
+
+def test_clear_cache_resets_speakers():
+    doc = BaseDocument("Interviewer: Hi\nParticipant: Hello\nInterviewer: Bye")
+    assert doc.speaker_tuple == ("Interviewer", "Participant")
+    assert doc.content("Participant") == "Participant: Hello"
+    doc.full_text = doc.full_text.replace("Participant:", "Interviewee:")
+    doc.full_lines = doc.full_text.split('\n')
+    doc.clear_cache()
+    assert doc.speaker_set() == {"Interviewer", "Interviewee"}
+    assert doc.speaker_tuple == ("Interviewer", "Interviewee")
+    assert doc.content("Participant") == "Interviewee: Hello"
+
+
+@pytest.mark.parametrize("test_doc", [
+    pytest.param(test_docs[name], id=name) for name in test_docs
+])
+def test_speaker_turns(test_doc):
+    turns = test_doc.speaker_turns
+    # Turns cover every row, in order, without gaps
+    assert turns.starts[0] == 0
+    assert turns.ends[-1] == len(test_doc.full_lines)
+    assert list(turns.starts[1:]) == list(turns.ends[:-1])
+    # Neighbouring turns always have different speakers
+    assert all(a != b for a, b in zip(turns.speaker_ids, 
+                                      turns.speaker_ids[1:]))
+
+
+@pytest.mark.parametrize("test_doc", [
+    pytest.param(test_docs[name], id=name) 
+    for name in ("062_745", "3001_090", "049_606", "051_628")
+])
+def test_span_text(test_doc):
+    for row, tokens in enumerate(test_doc.tokens):
+        if not tokens:
+            continue
+        # Single-row spans are the tokens joined by spaces
+        assert test_doc.span_text(row, 0, row, len(tokens) - 1) == \
+               " ".join(tokens)
+        assert test_doc.span_text(row, 1, row, 1) == " ".join(tokens[1:2])
+    # Multi-row spans are separated by a single space
+    last_row = len(test_doc.tokens) - 1
+    assert test_doc.span_text(0, 0, last_row, 
+                              len(test_doc.tokens[last_row]) - 1) == \
+           " ".join(token for tokens in test_doc.tokens for token in tokens)
+
+
+def test_span_text_empty_rows():
+    rows = ["Interviewer: Hi there", "", "Participant: Hello", ""]
+    doc = DatasaurDocument("./005_001.json", {'data': {
+        'project': {'id': 'ID', 'name': 'Test'},
+        'document': {'name': '005_001.txt'},
+        'rows': [[{'content': row, 'tokens': row.split(), 'metadata': []}]
+                 for row in rows],
+        'spanLabels': [],
+    }})
+    # Ending in an empty row stops at the last token before it
+    assert doc.span_text(0, 1, 1, 0) == "Hi there"
+    assert doc.span_text(0, 2, 3, 0) == "there Participant: Hello"
+    assert doc.span_text(2, 1, 3, 0) == "Hello"
+    # Spans inside an empty row are empty
+    assert doc.span_text(1, 0, 1, 0) == ""
+    assert doc.span_text(3, 0, 3, 2) == ""
+    assert doc.span_text(2, 0, 2, 5) == "Participant: Hello"
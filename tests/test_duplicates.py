@@ -0,0 +1,95 @@
+import hashlib
+import pytest
+from utils.data.datasaur import DocumentRegistry, projects
+from utils.data.duplicates import MinHashLSH, content_hash, \
+                                  exact_duplicates, shingles, \
+                                  Passage, PassageIndex
+
+
+text = ("Interviewer: So tell me about the things you keep in the kitchen. "
+        "Participant: Well, mostly newspapers and a lot of old jars, I "
+        "suppose, and some boxes that my sister left here years ago.")
+texts = {
+    "a": text,
+    "b": text.replace(" ", "\n"), # Same text, different whitespace
+    "c": text.replace("sister", "brother"), # Nearly the same text
+    "d": "Interviewer: Okay. Participant: Something else entirely, really.",
+}
+
+
+@pytest.mark.parametrize("text,k,expected", [
+    ("The cat sat on the mat", 3, {"the cat sat", "cat sat on", 
+                                   "sat on the", "on the mat"}),
+    ("The cat", 3, {"the cat"}),
+    ("", 3, set()),
+])
+def test_shingles(text, k, expected):
+    assert shingles(text, k) == expected
+
+
+def test_exact_duplicates():
+    assert content_hash(texts["a"]) == content_hash(texts["b"])
+    assert exact_duplicates(texts) == [["a", "b"]]
+
+
+def test_minhash_clusters():
+    lsh = MinHashLSH()
+    for key, value in texts.items():
+        lsh.add(key, value)
+    assert lsh.similarity("a", "b") == 1.0
+    assert lsh.similarity("a", "d") < 0.5
+    assert lsh.clusters(threshold=0.7) == [["a", "b", "c"]]
+
+
+def test_minhash_signature_is_exact():
+    # Same as computing (a * x + b) mod p with Python's unbounded ints
+    lsh = MinHashLSH(num_perm=16, bands=4)
+    text = "Interviewer: So tell me about your day. Participant: Fine."
+    ids = [int.from_bytes(hashlib.blake2b(shingle.encode(),
+                                          digest_size=4).digest(), 'little')
+           for shingle in shingles(text, lsh.k)]
+    assert lsh.signature(text).tolist() == [
+        min((int(a) * x + int(b)) % ((1 << 32) + 15) for x in ids)
+        for a, b in zip(lsh._a, lsh._b)
+    ]
+
+
+def test_minhash_bad_bands():
+    with pytest.raises(ValueError):
+        MinHashLSH(num_perm=128, bands=30)
+
+
+def test_export_matches_text_file():
+    doc = DocumentRegistry(projects).get("2022_335")
+    with open("./data/mathews/documents/text_files/set02/2022_335.txt",
+              encoding="utf-8") as f:
+        text_file = f.read()
+    lsh = MinHashLSH()
+    lsh.add("export", doc.full_text)
+    lsh.add("text", text_file)
+    assert lsh.similarity("export", "text") > 0.9
+
+
+passage = ["Participant: I keep the newspapers because I might need them.",
+           "",
+           "Interviewer: And what about the boxes in the hallway?",
+           "Participant: Those are my sister's, she left them years ago."]
+doc_a = ["Interviewer: Hello.", "Participant: Hi."] + passage + ["Bye."]
+doc_b = ["Something else entirely, nothing to see here at all."] + \
+        [line.upper() for line in passage]
+
+
+def test_repeated_passages():
+    index = PassageIndex(window=3, min_chars=40)
+    index.add("a", doc_a)
+    index.add("b", doc_b)
+    index.add("c", ["Interviewer: Hello.", "Participant: Hi."])
+    # Blank lines are skipped, and case and punctuation are ignored
+    assert index.repeated_passages() == [Passage("a", 3, 6, "b", 2, 5)]
+
+
+def test_repeated_passages_min_chars():
+    index = PassageIndex(window=2, min_chars=40)
+    index.add("a", ["Okay.", "Yeah.", "Okay."])
+    index.add("b", ["Okay.", "Yeah."])
+    assert index.repeated_passages() == []
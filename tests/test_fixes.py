@@ -0,0 +1,94 @@
+import os
+import pytest
+from utils.data.fixes import Fix, FixPipeline, documents, replace_fix, \
+                             transcripts
+from utils.data.ledger import FixLedger
+
+
+def rename_fix(name, content):
+    return ('2' + name, content) if 'P1' in content else (name, content)
+
+
+fixes = [
+    replace_fix('012', [('Interviewee:', 'Interviewer:')],
+                selects=transcripts('012')),
+    Fix('rename', rename_fix, selects=transcripts('005')),
+    # Selected by the name before the rename above
+    replace_fix('2005', [('P1:', 'P2:')], selects=transcripts('2005')),
+    replace_fix('typo', [('Speake:', 'Speaker:')]),
+    replace_fix('one doc', [('Okay', 'OK')],
+                selects=documents('005_100.txt')),
+]
+files = {
+    '012_001.txt': "Interviewee: Hi\r\nSpeake: Okay\r\n",
+    '005_100.txt': "P1: Hi\nInterviewer: Okay\n",
+    '2005_200.txt': "P1: Hi\n",
+    '3001_000.txt': "Interviewer: Hi\n",
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = []
+    for name, content in files.items():
+        path = str(tmp_path / name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        paths.append(path)
+    return paths
+
+
+def read(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name,content,expected", [
+    ('012_001.txt', files['012_001.txt'],
+     ('012_001.txt', "Interviewer: Hi\r\nSpeaker: Okay\r\n",
+      ['012', 'typo'])),
+    ('005_100.txt', files['005_100.txt'],
+     ('2005_100.txt', "P1: Hi\nInterviewer: OK\n", ['rename', 'one doc'])),
+    ('2005_200.txt', files['2005_200.txt'],
+     ('2005_200.txt', "P2: Hi\n", ['2005'])),
+    ('3001_000.txt', files['3001_000.txt'],
+     ('3001_000.txt', "Interviewer: Hi\n", [])),
+])
+def test_fix_content(name, content, expected):
+    assert FixPipeline(fixes).fix_content(name, content) == expected
+
+
+def test_run(paths):
+    mtime = os.stat(paths[3]).st_mtime_ns
+    results = FixPipeline(fixes).run(paths, workers=2)
+    assert [result.path for result in results] == paths
+    assert [os.path.basename(result.new_path) for result in results] == \
+           ['012_001.txt', '2005_100.txt', '2005_200.txt', '3001_000.txt']
+    # Line endings are kept
+    assert read(results[0].new_path) == "Interviewer: Hi\r\nSpeaker: Okay\r\n"
+    assert not os.path.exists(paths[1])
+    assert read(results[1].new_path) == "P1: Hi\nInterviewer: OK\n"
+    # Unchanged files aren't written
+    assert os.stat(paths[3]).st_mtime_ns == mtime
+    assert not any(name.endswith('.tmp')
+                   for name in os.listdir(os.path.dirname(paths[0])))
+
+
+def test_dry_run(paths):
+    results = FixPipeline(fixes).run(paths, dry_run=True)
+    assert [result.applied for result in results] == \
+           [['012', 'typo'], ['rename', 'one doc'], ['2005'], []]
+    assert [read(path) for path in paths] == list(files.values())
+
+
+def test_run_with_ledger(paths, tmp_path):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    pipeline = FixPipeline(fixes, ledger, 'test')
+    first = pipeline.run(paths)
+    assert os.path.exists(ledger.path)
+    new_paths = [result.new_path for result in first]
+    contents = [read(path) for path in new_paths]
+    # Fixing again (e.g. swapping labels back) is skipped
+    second = FixPipeline(fixes, FixLedger(ledger.path), 'test').run(new_paths)
+    assert [result.applied for result in second] == [[], [], [], []]
+    assert [read(path) for path in new_paths] == contents
@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import pandas as pd
+import pytest
+import generate_label_counts as label_counts
+import utils.data.datasaur as datasaur
+from utils.data.datasaur import DocumentRegistry
+
+
+names = ["062_745", "2022_335", "3001_090"]
+
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    """Copies of a few exports in a project of their own, and where the
+    manifest and table go."""
+    originals = DocumentRegistry(datasaur.projects).paths_by_name
+    monkeypatch.setattr(datasaur, 'project_dir_locations', str(tmp_path))
+    os.makedirs(tmp_path / 'Test' / 'REVIEW')
+    for name in names:
+        shutil.copy(originals[name + '.txt'],
+                    tmp_path / 'Test' / 'REVIEW' / (name + '.json'))
+    return (str(tmp_path / 'manifest.json'), str(tmp_path / 'counts.csv'))
+
+
+def run(paths, full=False):
+    registry = DocumentRegistry(['Test'])
+    old_manifest = {} if full else label_counts.load_manifest(*paths)
+    manifest, changed, removed = label_counts.update_manifest(registry,
+                                                              old_manifest)
+    label_counts.write_table(registry, manifest, *paths)
+    return registry, sorted(map(datasaur.doc_name, changed)), \
+           sorted(map(datasaur.doc_name, removed))
+
+
+def test_incremental_run(paths):
+    registry, changed, removed = run(paths)
+    assert len(changed) == 3 and not removed
+    full_table = pd.read_csv(paths[1])
+
+    # Nothing changed
+    assert run(paths)[1:] == ([], [])
+    # A touched file is rehashed, but its row is kept
+    os.utime(registry.paths_by_name['062_745.txt'], ns=(0, 0))
+    assert run(paths)[1:] == ([], [])
+
+    # A changed export is recomputed, a removed one is dropped
+    path = registry.paths_by_name['2022_335.txt']
+    with open(path, encoding='utf-8') as f:
+        json_dump = json.load(f)
+    json_dump['data']['spanLabels'] = []
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(json_dump, f)
+    os.remove(registry.paths_by_name['3001_090.txt'])
+    registry, changed, removed = run(paths)
+    assert changed == ['2022_335.txt'] and removed == ['3001_090.txt']
+    table = pd.read_csv(paths[1])
+    assert list(table['Document Name']) == \
+           [datasaur.doc_name(path) for path in registry.paths]
+    # Same table as a full rebuild
+    run(paths, full=True)
+    pd.testing.assert_frame_equal(table, pd.read_csv(paths[1]))
+    assert not table.equals(full_table)
+
+
+def test_manifest_from_older_version(paths, monkeypatch):
+    run(paths)
+    monkeypatch.setattr(label_counts, 'MANIFEST_VERSION',
+                        label_counts.MANIFEST_VERSION + 1)
+    assert label_counts.load_manifest(*paths) == {}
+    assert len(run(paths)[1]) == 3
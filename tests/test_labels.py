@@ -0,0 +1,47 @@
+import pytest
+from utils.data.datasaur import DocumentRegistry, projects
+from utils.data.labels import LabelTable
+from utils.document import LABELS
+
+
+registry = DocumentRegistry(projects)
+docs = [registry.get(name) for name in ("062_745", "2022_335", "3001_090",
+                                        "049_606", "2005_086", "051_628")]
+table = LabelTable.from_documents(docs)
+
+
+def test_table_size():
+    assert len(table) == sum(len(doc.label_data) for doc in docs)
+    assert table.doc_names == tuple(doc.name for doc in docs)
+
+
+@pytest.mark.parametrize("label", sorted(LABELS))
+@pytest.mark.parametrize("speaker", ["Interviewer", "Participant"])
+def test_counts_match_label_counts(label, speaker):
+    counts = table.counts_by_doc(label=label, speaker=speaker)
+    assert list(counts) == [doc.label_counts[f"{label}–{speaker}"]
+                            for doc in docs]
+
+
+@pytest.mark.parametrize("set", [1, 2, 3])
+def test_query_by_set(set):
+    expected = sum(doc.label_counts["Total"] for doc in docs 
+                   if doc.set == set)
+    assert table.count(set=set) == expected
+    assert all(docs[table.doc_ids[i]].set == set 
+               for i in table.query(set=set))
+
+
+@pytest.mark.parametrize("index,expected", [
+    (0, "I think,"),                                   # 062_745
+    (2, "somebody who has a uh…."),                    # 062_745
+    (8, "for me clinically,"),                         # 2022_335
+    (9, "Could you tell me a little bit about the..."),  # 3001_090
+    (13, "And sometimes"),                             # 049_606
+    (20, "yeah the ‘cause"),                           # 2005_086
+    (23, "I did that about—"),                         # 051_628
+])
+def test_span_texts(index, expected):
+    texts = table.span_texts(docs)
+    assert len(texts) == len(table)
+    assert texts[index] == expected
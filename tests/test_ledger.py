@@ -0,0 +1,124 @@
+import json
+import os
+import pytest
+import utils.data.ledger as ledger_module
+from utils.data.cache import file_digest
+from utils.data.ledger import FixLedger, ledger_key
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = str(tmp_path / "005_001.txt")
+    with open(path, 'w') as f:
+        f.write("P3: Hi\n")
+    return path
+
+
+def fix(ledger, fix_id, path, old, new):
+    pre_hash = ledger.current_hash(path)
+    with open(path) as f:
+        content = f.read()
+    with open(path, 'w') as f:
+        f.write(content.replace(old, new))
+    ledger.record(fix_id, path, pre_hash)
+
+
+def test_is_applied(tmp_path, path):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    assert not ledger.is_applied('swap', path)
+    fix(ledger, 'swap', path, 'P3', 'Interviewer')
+    assert ledger.is_applied('swap', path)
+    # Still applied after a later fix changed the file
+    fix(ledger, 'clean', path, 'Hi', 'Hello')
+    assert ledger.is_applied('swap', path)
+    assert ledger.is_applied('clean', path)
+    # But not once the file is replaced
+    with open(path, 'w') as f:
+        f.write("P3: Bye\n")
+    assert not ledger.is_applied('swap', path)
+
+
+def test_unchanged_files_are_not_read(tmp_path, path, monkeypatch):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"),
+                       str(tmp_path / "stats.json"))
+    fix(ledger, 'swap', path, 'P3', 'Interviewer')
+    ledger.save()
+    # The stat isn't part of the ledger, which is the same on every checkout
+    with open(tmp_path / "ledger.jsonl") as f:
+        assert 'mtime' not in f.read()
+
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"),
+                       str(tmp_path / "stats.json"))
+    assert len(ledger) == 1
+    def no_digest(path):
+        raise AssertionError(f"{path} was read")
+    monkeypatch.setattr(ledger_module, 'file_digest', no_digest)
+    assert ledger.is_applied('swap', path)
+
+
+def test_stats_are_cached_after_hashing(tmp_path, path, monkeypatch):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    fix(ledger, 'swap', path, 'P3', 'Interviewer')
+    ledger.save()
+    # A fresh checkout: the ledger is there but the stat cache isn't
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"),
+                       str(tmp_path / "stats.json"))
+    assert ledger.is_applied('swap', path)
+    mtime = os.stat(tmp_path / "ledger.jsonl").st_mtime_ns
+    ledger.save()
+    # Only the stat cache is written, since nothing was recorded
+    assert os.stat(tmp_path / "ledger.jsonl").st_mtime_ns == mtime
+    assert os.path.exists(tmp_path / "stats.json")
+
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"),
+                       str(tmp_path / "stats.json"))
+    def no_digest(path):
+        raise AssertionError(f"{path} was read")
+    monkeypatch.setattr(ledger_module, 'file_digest', no_digest)
+    assert ledger.is_applied('swap', path)
+
+
+def test_old_entries_are_loaded(tmp_path, path):
+    digest = file_digest(path)
+    with open(tmp_path / "ledger.jsonl", 'w') as f:
+        f.write(json.dumps({'fix_id': 'swap', 'path': ledger_key(path),
+                            'pre_hash': digest, 'post_hash': digest,
+                            'mtime_ns': 0, 'size': 0}) + '\n')
+    assert FixLedger(str(tmp_path / "ledger.jsonl")).is_applied('swap', path)
+
+
+def test_history_follows_renames(tmp_path, path):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    fix(ledger, 'swap', path, 'P3', 'Interviewer')
+    new_path = str(tmp_path / "1005_001.txt")
+    pre_hash = ledger.current_hash(path)
+    os.rename(path, new_path)
+    ledger.record('rename', new_path, pre_hash, pre_hash, old_path=path)
+    assert ledger.is_applied('swap', new_path)
+    assert ledger.is_applied('rename', new_path)
+    assert ledger_key(path) not in ledger.entries_by_path
+    assert ledger.current_hash(new_path) == file_digest(new_path)
+
+
+def test_paths_are_normalized(tmp_path, path, monkeypatch):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    fix(ledger, 'swap', path, 'P3', 'Interviewer')
+    ledger.save()
+    # Same file, spelled differently and from another working directory
+    monkeypatch.chdir(tmp_path)
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    assert ledger.is_applied('swap', "./005_001.txt")
+    assert ledger.is_applied('swap', "../" + os.path.basename(tmp_path) +
+                             "/005_001.txt")
+
+
+def test_mark_applied(tmp_path, path):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    assert ledger.mark_applied('swap', [path]) == 1
+    assert ledger.is_applied('swap', path)
+    assert ledger.mark_applied('swap', [path]) == 0
+    with open(path) as f:
+        assert f.read() == "P3: Hi\n"
+    # A later fix still sees the file as fixed
+    fix(ledger, 'clean', path, 'Hi', 'Hello')
+    assert ledger.is_applied('swap', path)
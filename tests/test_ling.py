@@ -1,9 +1,11 @@
 import pytest
 import warnings
-import stanza
+pytest.importorskip('stanza')
 from stanza.models.constituency import tree_reader
 from utils.ling import type_token_ratio, average_sentence_length, \
-                       count_nps, count_non_NP_phrases 
+                       count_nps, count_non_NP_phrases, NP_ratio_in_sd, \
+                       ParseCache, ParsedSentence, ParsedText, \
+                       sentence_tokens, pipeline, tree_stats, MATTR, MTLD
 
 @pytest.mark.parametrize("tokens,expected", [
     (["the", "cat", "sat", "on", "the", "mat"], 5 / 6), # 5 unique tokens out of 6 total
@@ -41,7 +43,10 @@ def test_average_sentence_length_empty():
         assert any("Empty sentences list" in str(warn.message) for warn in w)
 
 
-nlp = stanza.Pipeline(lang='en', processors='tokenize,pos,constituency')
+# Only tests that parse load the stanza models
+@pytest.fixture(scope="module")
+def nlp():
+    return pipeline('tokenize,pos,constituency')
 
 
 @pytest.mark.parametrize("text,expected", [
@@ -49,7 +54,7 @@ nlp = stanza.Pipeline(lang='en', processors='tokenize,pos,constituency')
     ("The tall man saw a cat.", 2), # 2 NPs
     ("My brother and his dog walked to the park.", 3),  # 3 surface-level NPs
 ])
-def test_count_nps(text, expected):
+def test_count_nps(nlp, text, expected):
     doc = nlp(text)
     tree = doc.sentences[0].constituency # type: ignore
     assert count_nps(tree) == expected
@@ -60,7 +65,7 @@ def test_count_nps(text, expected):
     ("The tall man saw a cat", 1), # *1* VP, 2 NPs (one nested in the VP)
     ("My brother and his dog walked to the park", 2), # 3 NPs, 1 VP + 1 PP
 ])
-def test_count_non_NP_phrases(text, expected):
+def test_count_non_NP_phrases(nlp, text, expected):
     doc = nlp(text)
     tree = doc.sentences[0].constituency # type: ignore
     assert count_non_NP_phrases(tree) == expected
@@ -72,4 +77,80 @@ tree = tree_reader.read_trees(tree_string)[0]
 # Found this in testing
 def test_count_weird_string():
     assert count_nps(tree) == 1
-    assert count_non_NP_phrases(tree) == 11
\ No newline at end of file
+    assert count_non_NP_phrases(tree) == 11
+
+
+def test_tree_stats():
+    stats = tree_stats(tree)
+    assert (stats.nps, stats.non_NP_phrases, stats.depth) == (1, 11, 9)
+    assert stats.label_counts['NP'] == 2
+    assert stats.label_counts['ADJP'] == 4
+    assert 'yeah' not in stats.label_counts
+
+def test_parse_cache(nlp, tmp_path):
+    text = "The tall man saw a cat. My brother and his dog walked to the park."
+    cache = ParseCache(cache_dir=str(tmp_path))
+    assert cache.get(text) is None
+    parsed = cache.parse([text, ""])
+    assert sentence_tokens(parsed[1]) == []
+    # Second parse is read back from disk
+    cached = ParseCache(cache_dir=str(tmp_path)).get(text)
+    assert cached is not None
+    assert sentence_tokens(cached) == sentence_tokens(parsed[0]) == \
+           [[token.text for token in sent.tokens]
+            for sent in nlp(text).sentences] # type: ignore
+    assert NP_ratio_in_sd(cached) == NP_ratio_in_sd(nlp(text))
+
+
+def test_parse_cache_round_trip(tmp_path):
+    # Deep enough that pickling the tree itself would hit the recursion limit
+    deep_tree = tree_reader.read_trees(
+        "(ROOT " + "(NP " * 2000 + "(NN x)" + ")" * 2000 + ")"
+    )[0]
+    parsed = ParsedText([ParsedSentence(("x",), ("NOUN",), deep_tree),
+                         ParsedSentence(("yeah",), ("INTJ",), tree),
+                         ParsedSentence(("hi",), (None,), None)])
+    cache = ParseCache(cache_dir=str(tmp_path))
+    cache.put("text", parsed)
+    cached = cache.get("text")
+    assert cached is not None
+    assert ["{}".format(sent.constituency) for sent in cached.sentences] == \
+           ["{}".format(sent.constituency) for sent in parsed.sentences]
+    assert cached.sentences[2].constituency is None
+    assert tree_stats(cached.sentences[1].constituency) == tree_stats(tree)
+    assert NP_ratio_in_sd(cached) == NP_ratio_in_sd(parsed)
+
+
+def test_pipeline_registry():
+    assert pipeline('tokenize') is pipeline(' tokenize')
+    assert pipeline('constituency,pos,tokenize') is \
+           pipeline('tokenize,pos,constituency')
+    assert pipeline('tokenize') is not pipeline('tokenize,pos,constituency')
+
+
+@pytest.mark.parametrize("tokens,window,expected", [
+    (["a", "b", "a", "c"], 3, 5 / 6), # Windows [a, b, a] and [b, a, c]
+    (["a", "b", "A", "c"], 3, 5 / 6), # Case insensitive
+    (["a", "b", "a"], 10, 2 / 3), # Shorter than the window: plain TTR
+    (["word"] * 10, 5, 0.2),
+])
+def test_MATTR(tokens, window, expected):
+    assert MATTR(iter(tokens), window) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("tokens,expected", [
+    (["a"] * 10, 2.0), # TTR drops to 0.5 every 2 tokens
+    (["a", "b", "c", "d"], 4.0), # TTR never drops
+    ("the cat sat on the mat the dog sat on the log".split(), 12.0),
+])
+def test_MTLD(tokens, expected):
+    assert MTLD(iter(tokens)) == pytest.approx(expected)
+
+
+def test_lexical_diversity_empty():
+    with warnings.catch_warnings(record=True) as w:
+        warnings.simplefilter("always")
+        assert MATTR(iter([])) == 0.0
+        assert MTLD(iter([])) == 0.0
+        assert sum("Empty token stream" in str(warn.message) 
+                   for warn in w) == 2
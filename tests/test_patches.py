@@ -0,0 +1,216 @@
+import json
+import os
+import pytest
+import utils.data.datasaur as datasaur
+from utils.data.datasaur import DocumentRegistry
+from utils.data.ledger import FixLedger
+from utils.data.patches import PatchSession, _replace_in_tokens
+from utils.document import DatasaurDocument
+
+
+def export(name, lines, labels=()):
+    """A minimal datasaur export of `lines`, with span labels given as
+    (row, start token, end token)."""
+    rows = [[{'content': line, 'tokens': line.split(), 'metadata': []}]
+            for line in lines]
+    span_labels = [
+        {'labelItem': {'labelName': 'Generic Disfluency'},
+         'textPosition': {
+             'start': {'row': row, 'tokenIndex': start, 'charIndex': 0},
+             'end': {'row': row, 'tokenIndex': end, 'charIndex': 0}}}
+        for row, start, end in labels
+    ]
+    return {'version': '1', 'data': {
+        'project': {'id': 'ID', 'name': 'Test'},
+        'document': {'name': name},
+        'rows': rows,
+        'spanLabels': span_labels,
+    }}
+
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    monkeypatch.setattr(datasaur, 'project_dir_locations', str(tmp_path))
+    os.makedirs(tmp_path / 'Test' / 'REVIEW')
+    exports = [
+        export('005_001.txt', ['Interviewee: Hi Ann', 'P1: Okay 07: 27 um'],
+               labels=[(1, 4, 4)]),
+        export('3001_039.txt', ['Interviewer:Right', 'Participant: Yes']),
+        export('3001_040.txt', ['Interviewer: Hi']),
+    ]
+    for json_dump in exports:
+        name = json_dump['data']['document']['name']
+        with open(tmp_path / 'Test' / 'REVIEW' / name.replace('.txt',
+                                                              '.json'),
+                  'w') as f:
+            json.dump(json_dump, f)
+    return DocumentRegistry(['Test'], cache=None)
+
+
+def read_rows(path):
+    with open(path) as f:
+        return [row[0] for row in json.load(f)['data']['rows']]
+
+
+@pytest.mark.parametrize("tokens,old,new,split,expected", [
+    (['Hi', 'Ann'], 'Ann', 'NAME', False, (['Hi', 'NAME'], [])),
+    (['Rebecca:', 'Hi'], 'Rebecca', 'Interviewer 1', False,
+     (['Interviewer 1:', 'Hi'], [])),
+    (['Okay', '07:', '27', 'um'], '07: 27', '07:27', False,
+     (['Okay', '07:27', 'um'], [(1, 2, 1)])),
+    (['Interviewer:Right'], 'Interviewer:Right', 'Interviewer: Right', True,
+     (['Interviewer:', 'Right'], [(0, 1, 2)])),
+    (['Hi'], 'Ann', 'NAME', False, (['Hi'], [])),
+])
+def test_replace_in_tokens(tokens, old, new, split, expected):
+    assert _replace_in_tokens(tokens, old, new, split) == expected
+
+
+def test_edits_are_staged(registry):
+    session = PatchSession(registry)
+    doc = session.document('005_001')
+    assert session.replace(doc, '07: 27', '07:27', rows=[1])
+    assert not session.replace(doc, 'Josha', 'NAME')
+    edited = session.document('005_001')
+    assert edited.row_data[1] == {'content': 'P1: Okay 07:27 um',
+                                  'tokens': ['P1:', 'Okay', '07:27', 'um'],
+                                  'metadata': []}
+    # The label on "um" moved with it
+    assert edited.label_data[0]['textPosition']['start']['tokenIndex'] == 3
+    # Nothing is written, and the registry's document is untouched
+    assert read_rows(doc.path)[1]['content'] == 'P1: Okay 07: 27 um'
+    assert registry.get('005_001').row_data[1]['content'] == \
+           'P1: Okay 07: 27 um'
+    session.rollback()
+    assert session.document('005_001') is registry.get('005_001')
+
+
+def test_commit(registry):
+    with PatchSession(registry) as session:
+        for doc in session:
+            session.replace(doc, 'Ann', 'NAME')
+        doc = session.document('3001_039')
+        session.replace(doc, 'Interviewer:Right', 'Interviewer: Right',
+                        rows=[0], split=True)
+        doc = session.document('005_001')
+        session.rename(doc, '2' + doc.name)
+        assert [doc.name for doc in session.transcript('2005')] == \
+               ['2005_001.txt']
+        session.remove(session.document('3001_040'))
+    # Written once, renamed, and the registry was updated in place
+    assert '005_001' not in registry and '3001_040' not in registry
+    renamed = registry.get('2005_001')
+    assert renamed.name == '2005_001.txt'
+    assert read_rows(renamed.path)[0] == {'content': 'Interviewee: Hi NAME',
+                                          'tokens': ['Interviewee:', 'Hi',
+                                                     'NAME'],
+                                          'metadata': []}
+    assert read_rows(registry.get('3001_039').path)[0]['tokens'] == \
+           ['Interviewer:', 'Right']
+    assert registry.names_by_transcript['3001'] == ['3001_039.txt']
+    assert len(os.listdir(os.path.dirname(renamed.path))) == 2
+
+
+def test_rollback_on_error(registry):
+    path = registry.get('005_001').path
+    with open(path) as f:
+        before = f.read()
+    with pytest.raises(KeyError):
+        with PatchSession(registry) as session:
+            session.replace(session.document('005_001'), 'Ann', 'NAME')
+            session.document('999_999')
+    with open(path) as f:
+        assert f.read() == before
+
+
+def test_failed_write_changes_nothing(registry, monkeypatch):
+    review = os.path.dirname(registry.paths[0])
+    def contents():
+        contents = {}
+        for filename in os.listdir(review):
+            with open(os.path.join(review, filename)) as f:
+                contents[filename] = f.read()
+        return contents
+    before = contents()
+    session = PatchSession(registry)
+    session.replace(session.document('005_001'), 'Ann', 'NAME')
+    session.remove(session.document('3001_040'))
+    # The second export can't be serialized
+    session.replace(session.document('3001_039'), 'Yes', 'Yeah')
+    session._staged[registry.paths_by_name['3001_039.txt']]['bad'] = object()
+    with pytest.raises(TypeError):
+        session.commit()
+    # Nothing was written or deleted, and no temporary files are left
+    assert contents() == before
+    assert len(registry) == 3
+
+
+def test_rename_onto_removed_export(registry):
+    with PatchSession(registry) as session:
+        session.remove(session.document('3001_040'))
+        session.rename(session.document('3001_039'), '3001_040.txt')
+    assert list(registry.paths_by_name) == ['005_001.txt', '3001_040.txt']
+    assert read_rows(registry.get('3001_040').path)[0]['content'] == \
+           'Interviewer:Right'
+
+
+def test_registry_put_outside_projects(registry, tmp_path):
+    doc = registry.get('005_001')
+    with pytest.raises(ValueError):
+        registry.put(DatasaurDocument(str(tmp_path / '005_001.json'),
+                                      doc.json_dump))
+    assert '005_001' in registry
+
+
+def test_ledger(registry, tmp_path):
+    ledger = FixLedger(str(tmp_path / "ledger.jsonl"))
+    with PatchSession(registry, ledger, 'test') as session:
+        for doc in session.transcript('005'):
+            session.rename(doc, '2' + doc.name)
+    assert len(ledger) == 3
+    with PatchSession(registry, FixLedger(ledger.path), 'test') as session:
+        # Every export was already gone over
+        assert not list(session) and not session.transcript('2005')
+        doc = session.document('2005_001')
+        assert not session.replace(doc, 'Hi', 'Hello')
+        assert session.commit() == []
+
+
+@pytest.fixture
+def malformed(registry, tmp_path):
+    """An export whose rows' tokens are the tokens of every row, as in
+    transcript 2005."""
+    json_dump = export('2005_001.txt', ['Interviewer: Hi there', 'P1: um yes'],
+                       labels=[(1, 1, 1)])
+    rows = json_dump['data']['rows']
+    all_tokens = [row[0]['tokens'] for row in rows]
+    for row in rows:
+        row[0]['tokens'] = all_tokens
+    path = str(tmp_path / 'Test' / 'REVIEW' / '2005_001.json')
+    with open(path, 'w') as f:
+        json.dump(json_dump, f)
+    return DocumentRegistry(['Test'], cache=None)
+
+
+def test_edits_leave_malformed_rows_alone(malformed):
+    session = PatchSession(malformed)
+    doc = session.document('2005_001')
+    assert not session.replace(doc, 'Josha', 'NAME')
+    assert not session._staged
+    assert session.replace(doc, 'Hi', 'Hello')
+    rows = session.document('2005_001').row_data
+    assert rows[0]['tokens'] == ['Interviewer:', 'Hello', 'there']
+    # The row that didn't change is left as it was
+    assert rows[1]['tokens'] == [['Interviewer:', 'Hi', 'there'],
+                                 ['P1:', 'um', 'yes']]
+
+
+def test_retokenize(malformed):
+    session = PatchSession(malformed)
+    doc = session.document('2005_001')
+    assert session.retokenize(doc)
+    edited = session.document('2005_001')
+    assert [row['tokens'] for row in edited.row_data] == [
+        ['Interviewer:', 'Hi', 'there'], ['P1:', 'um', 'yes']]
+    assert edited.label_data[0]['textPosition']['start']['tokenIndex'] == 1
+    assert not session.retokenize(edited)
@@ -52,6 +52,10 @@ from utils import regexes
 ])
 def test_speaker_labels(input_line, expected):
     assert regexes.speaker_labels_spaced.findall(input_line) == expected
+    # The scanner finds the same speaker labels when none of them are inside
+    # another token
+    assert [span.value for span in regexes.scan(input_line)
+            if span.kind == 'speaker'] == expected
 
 
 @pytest.mark.parametrize("string,expected", [
@@ -111,4 +115,65 @@ def test_extractable_token(string, expected):
     "(negative)",
 ])
 def test_removable_token(string):
-    assert regexes.remove_tokens(string) == ""
\ No newline at end of file
+    assert regexes.remove_tokens(string) == ""
+
+
+@pytest.mark.parametrize("line,expected", [
+    ("Interviewer 2: [inaudible 2:23] 1:24", [
+        ('speaker', 'Interviewer 2:', 'Interviewer'),
+        ('extractable', '[inaudible 2:23]', 'INAUDIBLE'),
+        ('timestamp', '1:24', '1:24'),
+    ]),
+    ("PART 2 of 4 ENDS (12:34:56) [END OF RECORDING]", [
+        ('removable', 'PART 2 of 4 ENDS (12:34:56)', 
+         'PART 2 of 4 ENDS (12:34:56)'),
+        ('removable', '[END OF RECORDING]', '[END OF RECORDING]'),
+    ]),
+    ("Interview 001", [('removable', 'Interview 001', 'Interview 001')]),
+    ("We went to (NAME, 2:23) and (LAUGHTER)", [
+        ('extractable', '(NAME, 2:23)', 'NAME'),
+        ('removable', '(LAUGHTER)', '(LAUGHTER)'),
+    ]),
+    ("Nothing to see here", []),
+])
+def test_scan(line, expected):
+    spans = regexes.scan(line)
+    assert [(span.kind, span.text, span.value) for span in spans] == expected
+    assert all(line[span.start:span.end] == span.text for span in spans)
+
+
+def test_scan_speakers_inside_tokens():
+    # Labels inside another token are part of that token's span
+    line = "Interviewer: I heard [inaudible 2:23] yes"
+    assert regexes.find_speakers(line, restrict=False) == \
+           ['Interviewer', 'inaudible']
+    assert [span.value for span in regexes.scan(line)
+            if span.kind == 'speaker'] == ['Interviewer']
+
+
+rewrite_engine = regexes.RewriteEngine([
+    regexes.RewriteRule('laughter', [' LAUGH', ' LAUGHS', '[LAUGH]'], ''),
+    regexes.RewriteRule('speaker', ['Speaker:', '-Speaker:'], 'Interviewee:'),
+    regexes.RewriteRule('end', [r'\[*END_OF_RECORDING\]*'],
+                        '[END_OF_RECORDING]', regex=True),
+    regexes.RewriteRule('underscore', [r'__+'], '[UNDERSCORE]', regex=True),
+])
+
+
+@pytest.mark.parametrize("text,expected,hits", [
+    ("Ha LAUGHS ha", "Ha ha", {'laughter': 1}), # Longest pattern wins
+    ("-Speaker: Hi", "Interviewee: Hi", {'speaker': 1}),
+    ("END_OF_RECORDING", "[END_OF_RECORDING]", {'end': 1}),
+    ("[END_OF_RECORDING]", "[END_OF_RECORDING]", {'end': 1}),
+    ("a ___ b __ [LAUGH]", "a [UNDERSCORE] b [UNDERSCORE] ", 
+     {'underscore': 2, 'laughter': 1}),
+    ("Nothing to fix", "Nothing to fix", {}),
+])
+def test_rewrite_engine(text, expected, hits):
+    assert rewrite_engine.rewrite(text) == (expected, hits)
+
+
+def test_rewrite_engine_duplicate_pattern():
+    with pytest.raises(ValueError):
+        regexes.RewriteEngine([regexes.RewriteRule('a', ['x'], 'y'),
+                               regexes.RewriteRule('b', ['x'], 'z')])
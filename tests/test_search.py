@@ -0,0 +1,93 @@
+import os
+import pytest
+from utils.data.search import CorpusIndex, Hit
+
+
+docs = {
+    "a.txt": ["Speaker1: Hello there", "Interviewer: Okay 07: 27",
+              "Speaker1: Bye"],
+    "b.txt": ["Interviewer 1: Hi", "Participant: hello Speaker1:x"],
+}
+
+
+@pytest.fixture
+def index():
+    index = CorpusIndex()
+    index.add("a.txt", docs["a.txt"])
+    # Tokens given like a datasaur export's, where labels are one token
+    index.add("b.txt", docs["b.txt"],
+              tokens=[["Interviewer 1:", "Hi"],
+                      ["Participant:", "hello", "Speaker1:x"]])
+    return index
+
+
+def test_find_token(index):
+    assert index.find_token("Speaker1:") == [
+        Hit("a.txt", 1, 0, "Speaker1:"), Hit("a.txt", 3, 0, "Speaker1:"),
+    ]
+    assert index.find_token("Interviewer 1:") == [
+        Hit("b.txt", 1, 0, "Interviewer 1:"),
+    ]
+    assert index.tokens["Okay"].tolist() == [1, 1]
+    assert index.find_token("Missing") == []
+
+
+def test_find_token_in_own_tokens():
+    index = CorpusIndex()
+    # Tokens that differ from a whitespace split, with one repeated and one
+    # that isn't in the content as-is
+    index.add("x.json", ["Hi there: Hi again"],
+              tokens=[["Hi", "there:", "Hi", "again!"]])
+    assert index.find_token("Hi") == [Hit("x.json", 1, 0, "Hi"),
+                                      Hit("x.json", 1, 10, "Hi")]
+    assert index.find_token("again!") == [Hit("x.json", 1, 13, "again!")]
+
+
+@pytest.mark.parametrize("substring,ignore_case,expected", [
+    ("Speaker1:", False, [("a.txt", 1, 0), ("a.txt", 3, 0),
+                          ("b.txt", 2, 19)]),
+    ("hello", False, [("b.txt", 2, 13)]),
+    ("hello", True, [("a.txt", 1, 10), ("b.txt", 2, 13)]),
+    ("07: 27", False, [("a.txt", 2, 18)]),
+    ("Hi", False, [("b.txt", 1, 15)]), # Shorter than an n-gram
+    ("nowhere", False, []),
+])
+def test_find(index, substring, ignore_case, expected):
+    assert [hit[:3] for hit in index.find(substring, ignore_case)] == \
+           expected
+
+
+def test_find_pattern(index):
+    assert index.find_pattern(r"\d\d: \d\d", literal=": ") == [
+        Hit("a.txt", 2, 18, "07: 27"),
+    ]
+    assert len(index.find_pattern(r"Speaker1")) == 3
+
+
+def test_remove_and_compact(index):
+    index.add("a.txt", ["Speaker1: Changed"])
+    assert [hit.line for hit in index.find_token("Speaker1:")] == [1]
+    assert index.find("Bye") == []
+    # Most rows are now removed ones, so the postings were rebuilt
+    assert not index._removed_rows
+    assert len(index.rows) == 3
+    index.remove("b.txt")
+    assert index.find("hello", ignore_case=True) == []
+    assert index.find_token("Interviewer 1:") == []
+    assert len(index) == 1
+
+
+def test_save_load_and_staleness(index, tmp_path):
+    path = str(tmp_path / "c.txt")
+    with open(path, "w") as f:
+        f.write("Speaker1: New\n")
+    index.add(path, ["Speaker1: New", ""])
+    index.save(str(tmp_path / "index.pickle"))
+    loaded = CorpusIndex.load(str(tmp_path / "index.pickle"))
+    assert loaded.find_token("Speaker1:") == index.find_token("Speaker1:")
+    assert not loaded.is_stale(path)
+    with open(path, "a") as f:
+        f.write("More\n")
+    assert loaded.is_stale(path)
+    # Missing or unreadable indexes load empty
+    assert len(CorpusIndex.load(str(tmp_path / "missing.pickle"))) == 0
@@ -0,0 +1,63 @@
+import pytest
+from utils.data.tokens import TokenTable
+
+
+texts = [
+    ("001_001.txt", "Interviewer", 1, [["How", "are", "you"], ["Good"]]),
+    ("001_001.txt", "Participant", 1, [["I", "am", "fine", "I", "think"],
+                                       ["Thanks", "thanks"]]),
+    ("2005_086.txt", "Participant", 2, [["The", "cat", "sat", "on", "the",
+                                         "mat"]]),
+    ("2005_086.txt", "Interviewer", 2, []),
+]
+table = TokenTable.from_sentences(texts)
+
+
+def ttr(sentences):
+    return sum(len(set(token.lower() for token in sent)) / len(sent)
+               for sent in sentences) / len(sentences)
+
+
+def test_interning():
+    assert len(table) == 17
+    assert table.vocabulary.count("the") == 1
+    assert "The" not in table.vocabulary
+    assert [table.vocabulary[i] for i in table.token_ids[:3]] == \
+           ["how", "are", "you"]
+
+
+def test_type_token_ratio_by_group():
+    ttrs = table.type_token_ratio()
+    for doc_name, speaker, _, sentences in texts:
+        expected = ttr(sentences) if sentences else 0.0
+        assert ttrs[(doc_name, speaker)] == pytest.approx(expected)
+
+
+def test_type_token_ratio_flat():
+    ttrs = table.type_token_ratio(by='set', per_sent=False)
+    assert ttrs[1] == pytest.approx(9 / 11)
+    assert ttrs[2] == pytest.approx(5 / 6)
+
+
+@pytest.mark.parametrize("by,expected", [
+    ('group', {("001_001.txt", "Interviewer"): 2.0,
+               ("001_001.txt", "Participant"): 3.5,
+               ("2005_086.txt", "Participant"): 6.0,
+               ("2005_086.txt", "Interviewer"): 0.0}),
+    ('doc', {"001_001.txt": 11 / 4, "2005_086.txt": 6.0}),
+    ('speaker', {"Interviewer": 2.0, "Participant": 13 / 3}),
+])
+def test_average_sentence_length(by, expected):
+    assert table.average_sentence_length(by) == pytest.approx(expected)
+
+
+def test_vocabulary_size():
+    assert table.vocabulary_size('doc') == {"001_001.txt": 9,
+                                            "2005_086.txt": 5}
+    assert table.vocabulary_size('speaker') == {"Interviewer": 4,
+                                                "Participant": 10}
+
+
+def test_bad_grouping():
+    with pytest.raises(ValueError):
+        table.vocabulary_size('transcript')
@@ -0,0 +1,39 @@
+import pytest
+from utils.transcript import Transcript, transcripts, transcript_numbers
+
+
+def test_transcripts_mapping():
+    assert list(transcripts) == transcript_numbers
+    assert len(transcripts) == len(transcript_numbers)
+    assert transcripts["2005"] is transcripts["2005"]
+    with pytest.raises(KeyError):
+        transcripts["9999"]
+
+
+@pytest.mark.parametrize("transcript_number", ["012", "2005", "3001"])
+def test_transcript_docs(transcript_number):
+    transcript = Transcript(transcript_number)
+    names = [doc.name for doc in transcript.docs]
+    assert names == sorted(names)
+    assert all(doc.transcript_number == transcript_number
+               for doc in transcript.docs)
+
+
+def test_transcript_getitem():
+    transcript = Transcript("3001")
+    assert transcript["039"].name == "3001_039.txt"
+    with pytest.raises(KeyError):
+        transcript["999"]
+
+
+@pytest.mark.parametrize("index,expected_first,expected_last", [
+    (slice("030", "048"), "3001_030.txt", "3001_048.txt"),
+    (slice(None, "002"), "3001_000.txt", "3001_002.txt"),
+    (slice("0295", "031"), "3001_030.txt", "3001_031.txt"),
+])
+def test_transcript_slice(index, expected_first, expected_last):
+    docs = Transcript("3001")[index]
+    assert docs[0].name == expected_first
+    assert docs[-1].name == expected_last
+    assert docs == [doc for doc in Transcript("3001")
+                    if expected_first <= doc.name <= expected_last]
@@ -0,0 +1,165 @@
+"""On-disk cache of parsed datasaur exports."""
+import hashlib
+import json
+import os
+import pickle
+from ..document import DatasaurDocument
+
+
+# Bump this whenever the parsing or speaker attribution logic in
+# `utils.document` changes, so that stale entries are thrown away.
+CACHE_VERSION = 2
+
+# Derived `DatasaurDocument` properties that are stored alongside the export.
+# These are all `cached_property`s, so restoring them into the document's
+# `__dict__` skips recomputing them (and running the speaker regexes).
+DERIVED_PROPERTIES = ('speaker_tuple', 'speaker_turns', '_labels')
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def write_atomically(path: str, content: str | bytes) -> None:
+    """
+    Write `content` to `path` through a temporary file in the same directory,
+    so `path` is never left half-written.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    if isinstance(content, bytes):
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+    else:
+        with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+    os.replace(tmp_path, path)
+
+
+class CorpusCache:
+    """
+    Pickled copy of each datasaur export along with its derived per-document
+    state (speaker turns, speaker tuple and labels).
+
+    Each export gets its own entry, keyed by its path. An entry is used as-is
+    while the file's mtime and size are unchanged; otherwise the file is
+    hashed, and the entry is only thrown away if the content hash differs.
+    """
+
+    def __init__(self, cache_dir: str='./.cache/datasaur') -> None:
+        self.cache_dir = cache_dir
+
+    def _entry_path(self, path: str) -> str:
+        key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def _read_entry(self, path: str) -> None | dict:
+        try:
+            with open(self._entry_path(path), 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if entry.get('version') != CACHE_VERSION or entry['path'] != path:
+            return None
+        return entry
+
+    def _write_entry(self, entry: dict) -> None:
+        write_atomically(self._entry_path(entry['path']),
+                         pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _pack_rows(json_dump: dict) -> tuple[dict, None | tuple]:
+        """
+        Split the rows out of an export into flat columns (contents, tokens
+        and metadata), which unpickle much faster than the nested row dicts.
+        """
+        rows = json_dump['data']['rows']
+        if any(len(row) != 1 for row in rows):
+            return json_dump, None
+        columns = tuple([row[0][key] for row in rows]
+                        for key in ('content', 'tokens', 'metadata'))
+        json_dump = {**json_dump, 'data': {**json_dump['data'], 'rows': None}}
+        return json_dump, columns
+
+    @staticmethod
+    def _unpack_rows(json_dump: dict, columns: None | tuple) -> dict:
+        if columns is None:
+            return json_dump
+        json_dump['data']['rows'] = [
+            [{'content': content, 'tokens': tokens, 'metadata': metadata}]
+            for content, tokens, metadata in zip(*columns)
+        ]
+        return json_dump
+
+    @classmethod
+    def _document(cls, entry: dict) -> DatasaurDocument:
+        json_dump = cls._unpack_rows(entry['json_dump'], entry['rows'])
+        doc = DatasaurDocument(entry['path'], json_dump)
+        doc.__dict__.update(entry['derived'])
+        return doc
+
+    def lookup(self, path: str) -> None | DatasaurDocument:
+        """
+        Return the cached document for `path`, or `None` if there is no
+        entry or the file changed since it was cached.
+        """
+        entry = self._read_entry(path)
+        if entry is None:
+            return None
+        stat = os.stat(path)
+        if (entry['mtime_ns'], entry['size']) != (stat.st_mtime_ns,
+                                                  stat.st_size):
+            if file_digest(path) != entry['hash']:
+                return None
+            # Same content, the file was just touched
+            entry['mtime_ns'], entry['size'] = stat.st_mtime_ns, stat.st_size
+            self._write_entry(entry)
+        return self._document(entry)
+
+    def store(self, doc: DatasaurDocument) -> None:
+        """
+        Cache a document, computing its derived properties if needed.
+        """
+        with open(doc.path, 'rb') as f:
+            raw = f.read()
+        stat = os.stat(doc.path)
+        derived = {}
+        for name in DERIVED_PROPERTIES:
+            try:
+                derived[name] = getattr(doc, name)
+            except ValueError:
+                # Documents without usable speakers raise here, don't store
+                # anything that depends on them
+                break
+        json_dump, rows = self._pack_rows(doc.json_dump)
+        self._write_entry({
+            'version': CACHE_VERSION,
+            'path': doc.path,
+            'mtime_ns': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'hash': hashlib.sha256(raw).hexdigest(),
+            'json_dump': json_dump,
+            'rows': rows,
+            'derived': derived,
+        })
+
+    def load(self, path: str) -> DatasaurDocument:
+        """
+        Return the document at `path`, from the cache if possible. On a miss,
+        the export is parsed and cached.
+        """
+        doc = self.lookup(path)
+        if doc is None:
+            with open(path, 'rb') as f:
+                doc = DatasaurDocument(path, json.loads(f.read()))
+            self.store(doc)
+        return doc
+
+    def invalidate(self, path: str) -> None:
+        """Remove the entry for `path`, if there is one."""
+        try:
+            os.remove(self._entry_path(path))
+        except FileNotFoundError:
+            pass
@@ -1,8 +1,13 @@
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from ..document import DatasaurDocument
+from .cache import CorpusCache
+import json
 import os
+from tqdm import tqdm
 
 # Functionality for projects
-project_dir_locations = ('./data/mathews/documents/datasaur_exports/' + 
+project_dir_locations = ('./data/mathews/documents/datasaur_exports/' +
                          'truncated_clauses')
 projects = [d for d in os.listdir(project_dir_locations)
             if os.path.isdir(os.path.join(project_dir_locations, d))]
@@ -17,9 +22,213 @@ def review_dir(project: str) -> str:
     return f"{project_dir_locations}/{project}/REVIEW/"
 
 
-# Functionality for getting all datasaur documents
-docs_by_project = {project: [DatasaurDocument(review_dir(project) + filename) 
-                        for filename in os.listdir(review_dir(project))] 
-                   for project in projects}
+def doc_name(path: str) -> str:
+    """
+    Given a path to a datasaur export, return the name of the document it
+    holds. Export filenames always match the document name.
+
+    Example: ".../REVIEW/001_001.json" -> "001_001.txt"
+    """
+    return os.path.splitext(os.path.basename(path))[0] + '.txt'
+
+
+def _read_bytes(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def load_documents(paths: list[str], workers: None | int=None,
+                   report=False) -> list[DatasaurDocument]:
+    """
+    Load many datasaur exports at once.
+
+    Files are read on a pool of `workers` threads, so reading later files
+    overlaps with parsing earlier ones in the calling thread. (Parsing on a
+    process pool doesn't pay off: unpickling a parsed export in the parent
+    takes longer than parsing its JSON there.) Documents are returned in the
+    same order as `paths`. If `report` is set, shows a progress bar.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as readers:
+        raw_files = readers.map(_read_bytes, paths)
+        return [DatasaurDocument(path, json.loads(raw))
+                for path, raw in tqdm(zip(paths, raw_files), total=len(paths),
+                                      desc="Loading exports",
+                                      disable=not report)]
+
+
+class DocumentRegistry:
+    """
+    Lazily-loaded collection of all datasaur documents.
+
+    Creating a registry only lists the paths of each project's REVIEW files.
+    A `DatasaurDocument` is built the first time it is accessed (by project,
+    name or transcript number) and kept in a least-recently-used cache holding
+    at most `maxsize` documents (`None` means no bound). If a `CorpusCache`
+    is given, documents are read through it instead of parsed from scratch.
+    """
+
+    def __init__(self, projects: list[str],
+                 maxsize: None | int=2048,
+                 cache: None | CorpusCache=None) -> None:
+        self.maxsize = maxsize
+        self.cache = cache
+        self.paths_by_project: dict[str, list[str]] = {
+            project: [review_dir(project) + filename
+                      for filename in os.listdir(review_dir(project))
+                      if filename.endswith('.json')]
+            for project in projects
+        }
+        self.paths = [path for paths in self.paths_by_project.values()
+                      for path in paths]
+        self.paths_by_name = {doc_name(path): path for path in self.paths}
+        self.names_by_transcript: dict[str, list[str]] = defaultdict(list)
+        for name in self.paths_by_name:
+            self.names_by_transcript[name.split('_')[0]].append(name)
+        self._cache: OrderedDict[str, DatasaurDocument] = OrderedDict()
+
+    @property
+    def transcript_numbers(self) -> list[str]:
+        return sorted(self.names_by_transcript)
+
+    def load(self, path: str) -> DatasaurDocument:
+        """
+        Return the document stored at `path`, building it if it isn't cached.
+        """
+        if path in self._cache:
+            self._cache.move_to_end(path)
+            return self._cache[path]
+        doc = self.cache.load(path) if self.cache else DatasaurDocument(path)
+        self._cache[path] = doc
+        if self.maxsize is not None and len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return doc
+
+    def get(self, name: str) -> DatasaurDocument:
+        """
+        Get a document by its name, with or without the '.txt' extension.
+
+        Ex: registry.get('2008_118') or registry.get('2008_118.txt')
+        """
+        if not name.endswith('.txt'):
+            name += '.txt'
+        if name not in self.paths_by_name:
+            raise KeyError(f"Document {name} not found in any project.")
+        return self.load(self.paths_by_name[name])
+
+    def project(self, project: str) -> list[DatasaurDocument]:
+        """Get all documents in a project."""
+        return [self.load(path) for path in self.paths_by_project[project]]
+
+    def transcript(self, transcript_number: str) -> list[DatasaurDocument]:
+        """Get all documents with the given transcript number."""
+        return [self.get(name)
+                for name in self.names_by_transcript.get(transcript_number,
+                                                         [])]
+
+    def preload(self, workers: None | int=None, report=False) -> None:
+        """
+        Load every document that isn't cached yet in bulk with
+        `load_documents`. Documents found in the on-disk cache are taken from
+        there instead.
+        """
+        missing = []
+        for path in self.paths:
+            if path in self._cache:
+                continue
+            doc = self.cache.lookup(path) if self.cache else None
+            if doc is None:
+                missing.append(path)
+            else:
+                self._cache[path] = doc
+        for path, doc in zip(missing, load_documents(missing, workers,
+                                                     report=report)):
+            if self.cache:
+                self.cache.store(doc)
+            self._cache[path] = doc
+        while self.maxsize is not None and len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        """Drop every cached document."""
+        self._cache.clear()
+
+    def remove(self, path: str) -> None:
+        """
+        Forget the document at `path` (after its export was deleted or
+        moved), dropping it from every index and from both caches.
+        """
+        if path not in self.paths:
+            return
+        self.paths.remove(path)
+        for paths in self.paths_by_project.values():
+            if path in paths:
+                paths.remove(path)
+        name = doc_name(path)
+        if self.paths_by_name.get(name) == path:
+            del self.paths_by_name[name]
+            transcript_names = self.names_by_transcript[name.split('_')[0]]
+            transcript_names.remove(name)
+            if not transcript_names:
+                del self.names_by_transcript[name.split('_')[0]]
+        self._cache.pop(path, None)
+        if self.cache:
+            self.cache.invalidate(path)
+
+    def put(self, doc: DatasaurDocument) -> None:
+        """
+        Add a document whose export was just written to `doc.path` (or
+        replace the one that was there), without rereading it.
+        """
+        project = next((project for project in self.paths_by_project
+                        if doc.path.startswith(review_dir(project))), None)
+        if project is None:
+            raise ValueError(f"{doc.path} isn't in the REVIEW directory of "
+                             "any project in the registry.")
+        self.remove(doc.path)
+        self.paths_by_project[project].append(doc.path)
+        self.paths.append(doc.path)
+        name = doc_name(doc.path)
+        self.paths_by_name[name] = doc.path
+        self.names_by_transcript[name.split('_')[0]].append(name)
+        self._cache[doc.path] = doc
+        while self.maxsize is not None and len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def __contains__(self, name: str) -> bool:
+        if not name.endswith('.txt'):
+            name += '.txt'
+        return name in self.paths_by_name
+
+    def __iter__(self):
+        return (self.load(path) for path in self.paths)
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def __repr__(self) -> str:
+        return (f"DocumentRegistry({len(self)} documents, "
+                f"{len(self._cache)} loaded)")
+
+
+registry = DocumentRegistry(projects, cache=CorpusCache())
+
 
-docs = [doc for doc_list in docs_by_project.values() for doc in doc_list]
+# Functionality for getting all datasaur documents. `docs` and
+# `docs_by_project` are built on first access (PEP 562) so that importing this
+# module doesn't parse the whole corpus. That first access loads every
+# document, and the result is then kept as a module attribute: later accesses
+# return the same list (and the same documents) without going through the
+# registry again. New code should use `registry` instead, which only loads
+# what it's asked for.
+def __getattr__(name: str):
+    if name in ('docs', 'docs_by_project'):
+        global docs, docs_by_project
+        docs = list(registry)
+        docs_by_path = {doc.path: doc for doc in docs}
+        docs_by_project = {
+            project: [docs_by_path[path]
+                      for path in registry.paths_by_project[project]]
+            for project in projects
+        }
+        return globals()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
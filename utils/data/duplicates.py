@@ -0,0 +1,303 @@
+"""
+Exact and near-duplicate detection over documents from any source (text files,
+datasaur exports), using content hashes and MinHash signatures, and detection 
+of passages repeated between documents using rolling hashes of lines.
+"""
+from collections import defaultdict, namedtuple
+import hashlib
+import re
+import numpy as np
+
+
+# Any prime above 2**32, so that hashes of 32-bit shingle ids stay distinct
+_PRIME = (1 << 32) + 15
+_MAX_HASH = np.uint64(_PRIME)
+
+word_regex = re.compile(r"\w+")
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash of a document's text, ignoring differences in whitespace (so a text
+    file and a datasaur export of the same text get the same hash).
+    """
+    return hashlib.sha256(' '.join(text.split()).encode()).hexdigest()
+
+
+def shingles(text: str, k: int=5) -> set[str]:
+    """
+    Set of `k`-word shingles (runs of `k` consecutive lowercase words) in a
+    text. Texts shorter than `k` words give a single shingle.
+
+    Ex: shingles("The cat sat on the mat", 3) ->
+        {'the cat sat', 'cat sat on', 'sat on the', 'on the mat'}
+    """
+    words = word_regex.findall(text.lower())
+    if len(words) <= k:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + k]) for i in range(len(words) - k + 1)}
+
+
+def _clusters(keys: list, pairs) -> list[list]:
+    """
+    Group `keys` into connected components given pairs of linked keys, and
+    return the components with more than one key (union-find).
+    """
+    parent = {key: key for key in keys}
+
+    def find(key):
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    for a, b in pairs:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[root_b] = root_a
+    components = defaultdict(list)
+    for key in keys:
+        components[find(key)].append(key)
+    return [component for component in components.values()
+            if len(component) > 1]
+
+
+def exact_duplicates(texts: dict[str, str]) -> list[list[str]]:
+    """
+    Groups of keys whose texts are identical (ignoring whitespace), given a
+    dictionary of texts by key (e.g. document path). One pass over the texts.
+    """
+    keys_by_hash = defaultdict(list)
+    for key, text in texts.items():
+        keys_by_hash[content_hash(text)].append(key)
+    return [keys for keys in keys_by_hash.values() if len(keys) > 1]
+
+
+class MinHashLSH:
+    """
+    Index of MinHash signatures for finding near-duplicate texts without
+    comparing every pair.
+
+    Each text's shingle set is summarized by `num_perm` minimum hashes; the
+    fraction of positions where two signatures agree estimates the Jaccard
+    similarity of their shingle sets. Signatures are split into `bands` bands
+    of `num_perm // bands` rows, and texts sharing any whole band are
+    candidates, so only candidates are ever compared. With the defaults
+    (32 bands of 4 rows), a pair with similarity 0.8 becomes a candidate
+    with probability over 0.99.
+
+    Ex:
+        >>> lsh = MinHashLSH()
+        >>> for path, text in texts.items():
+        ...     lsh.add(path, text)
+        >>> lsh.clusters(threshold=0.8)
+    """
+
+    def __init__(self, num_perm: int=128, bands: int=32, k: int=5,
+                 seed: int=0) -> None:
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of "
+                             f"bands ({bands}).")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.k = k
+        rng = np.random.default_rng(seed)
+        # Random hash functions h(x) = (a * x + b) mod _PRIME. a and b are
+        # drawn below 2**32 (rather than below _PRIME) so that the products
+        # in `signature` fit in 64 bits.
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self.signatures: dict[str, np.ndarray] = {}
+        self._buckets: list[dict[bytes, list[str]]] = [
+            defaultdict(list) for _ in range(bands)
+        ]
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a text's shingle set."""
+        ids = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode(),
+                                            digest_size=4).digest(), 'little')
+             for shingle in shingles(text, self.k)),
+            dtype=np.uint64
+        )
+        if not len(ids):
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # a, b, x < 2**32, so a * x + b <= 2**64 - 2**32 and can't overflow
+        # (uint64 would wrap silently)
+        hashes = (np.outer(self._a, ids) + self._b[:, None]) % _MAX_HASH
+        return hashes.min(axis=1)
+
+    def add(self, key: str, text: str) -> None:
+        signature = self.signature(text)
+        self.signatures[key] = signature
+        for bucket, band in zip(self._buckets,
+                                np.split(signature, self.bands)):
+            bucket[band.tobytes()].append(key)
+
+    def similarity(self, a: str, b: str) -> float:
+        """Estimated Jaccard similarity of two added texts."""
+        return float(np.mean(self.signatures[a] == self.signatures[b]))
+
+    def candidate_pairs(self) -> set[tuple[str, str]]:
+        """Pairs of keys that share at least one band."""
+        pairs = set()
+        for bucket in self._buckets:
+            for keys in bucket.values():
+                pairs.update((a, b) for i, a in enumerate(keys)
+                             for b in keys[i + 1:])
+        return pairs
+
+    def similar_pairs(self, threshold: float=0.8
+                      ) -> dict[tuple[str, str], float]:
+        """
+        Candidate pairs whose estimated similarity is at least `threshold`,
+        with their similarity.
+        """
+        similarities = {pair: self.similarity(*pair)
+                        for pair in self.candidate_pairs()}
+        return {pair: similarity for pair, similarity in similarities.items()
+                if similarity >= threshold}
+
+    def clusters(self, threshold: float=0.8) -> list[list[str]]:
+        """
+        Groups of keys linked by chains of pairs at least `threshold`
+        similar.
+        """
+        return _clusters(list(self.signatures),
+                         self.similar_pairs(threshold))
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+
+# Modulus and base of the polynomial rolling hash over line windows
+_ROLLING_MOD = (1 << 61) - 1
+_ROLLING_BASE = 1_000_003
+
+# A run of lines repeated in two documents: lines `start_a`-`end_a` of `key_a`
+# match lines `start_b`-`end_b` of `key_b` (1-based and inclusive, counted in
+# the original text, so blank lines inside the run are included)
+Passage = namedtuple('Passage', ['key_a', 'start_a', 'end_a',
+                                 'key_b', 'start_b', 'end_b'])
+
+
+def normalize_line(line: str) -> str:
+    """
+    Lowercase words of a line, ignoring punctuation and spacing.
+
+    Ex: "Interviewer:  Okay, so..." -> "interviewer okay so"
+    """
+    return ' '.join(word_regex.findall(line.lower()))
+
+
+def _line_hash(line: str) -> int:
+    return int.from_bytes(hashlib.blake2b(line.encode(),
+                                          digest_size=8).digest(), 'little')
+
+
+class PassageIndex:
+    """
+    Index of rolling hashes over every `window` consecutive (non-blank) lines
+    of a set of documents, for finding passages that are repeated between
+    documents.
+
+    Each window's hash is computed from the previous one in constant time, so
+    indexing is linear in the number of lines. Matching windows of two
+    documents are then merged into maximal repeated runs of lines. Windows 
+    with fewer than `min_chars` characters (runs of "Okay." and such) and
+    windows found in more than `max_repeats` places are ignored, as they
+    repeat by chance rather than because a passage was copied.
+
+    Ex: passages repeated across documents of transcript 3001
+        >>> index = PassageIndex()
+        >>> for path in raw.docs_by_transcript['3001']:
+        ...     index.add(path, open(path).read().splitlines())
+        >>> index.repeated_passages()
+    """
+
+    def __init__(self, window: int=3, min_chars: int=60,
+                 max_repeats: int=20) -> None:
+        self.window = window
+        self.min_chars = min_chars
+        self.max_repeats = max_repeats
+        # Normalized non-blank lines of each document, and the (0-based) line
+        # number each came from
+        self.lines: dict[str, list[str]] = {}
+        self.line_numbers: dict[str, list[int]] = {}
+        self._windows: dict[int, list[tuple[str, int]]] = defaultdict(list)
+
+    def add(self, key: str, lines: list[str]) -> None:
+        """Index the lines of a document."""
+        normalized, line_numbers = [], []
+        for line_number, line in enumerate(lines):
+            line = normalize_line(line)
+            if line:
+                normalized.append(line)
+                line_numbers.append(line_number)
+        self.lines[key] = normalized
+        self.line_numbers[key] = line_numbers
+        window = self.window
+        if len(normalized) < window:
+            return
+        hashes = [_line_hash(line) % _ROLLING_MOD for line in normalized]
+        lengths = [len(line) for line in normalized]
+        top_power = pow(_ROLLING_BASE, window - 1, _ROLLING_MOD)
+        rolling = chars = 0
+        for i, (line_hash, length) in enumerate(zip(hashes, lengths)):
+            if i >= window:
+                rolling -= hashes[i - window] * top_power
+                chars -= lengths[i - window]
+            rolling = (rolling * _ROLLING_BASE + line_hash) % _ROLLING_MOD
+            chars += length
+            if i >= window - 1 and chars >= self.min_chars:
+                self._windows[rolling].append((key, i - window + 1))
+
+    def _seeds(self) -> dict[tuple[str, str], list[tuple[int, int]]]:
+        """
+        Starts of matching windows between each pair of documents.
+        """
+        seeds = defaultdict(list)
+        for places in self._windows.values():
+            if len(places) < 2 or len(places) > self.max_repeats:
+                continue
+            for i, place_a in enumerate(places):
+                for place_b in places[i + 1:]:
+                    (key_a, start_a), (key_b, start_b) = sorted((place_a,
+                                                                 place_b))
+                    if key_a == key_b:
+                        continue
+                    # Hashes can collide, so check the lines really match
+                    if self.lines[key_a][start_a:start_a + self.window] != \
+                       self.lines[key_b][start_b:start_b + self.window]:
+                        continue
+                    seeds[(key_a, key_b)].append((start_a, start_b))
+        return seeds
+
+    def repeated_passages(self) -> list[Passage]:
+        """
+        Every maximal run of at least `window` lines that appears in two 
+        different documents, sorted by document pair and position.
+        """
+        passages = []
+        for (key_a, key_b), seeds in sorted(self._seeds().items()):
+            seeds.sort()
+            seed_set = set(seeds)
+            for start_a, start_b in seeds:
+                # Only start runs at seeds that don't continue an earlier one
+                if (start_a - 1, start_b - 1) in seed_set:
+                    continue
+                length = 1
+                while (start_a + length, start_b + length) in seed_set:
+                    length += 1
+                end_a = start_a + length + self.window - 2
+                end_b = start_b + length + self.window - 2
+                numbers_a = self.line_numbers[key_a]
+                numbers_b = self.line_numbers[key_b]
+                passages.append(Passage(
+                    key_a, numbers_a[start_a] + 1, numbers_a[end_a] + 1,
+                    key_b, numbers_b[start_b] + 1, numbers_b[end_b] + 1
+                ))
+        return passages
+
+    def __len__(self) -> int:
+        return len(self.lines)
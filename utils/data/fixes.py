@@ -0,0 +1,145 @@
+"""
+Staged pipeline for applying a sequence of fixes to the raw text files, reading
+and writing each file only once.
+"""
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+from .cache import write_atomically
+from .ledger import FixLedger
+
+
+# A single fix. `apply` takes a document's current name and content, and
+# returns its (possibly new) name and content. `selects` takes a document's
+# name as it was before any fix was applied, and says whether the fix applies
+# to it (`None` means every document).
+Fix = namedtuple('Fix', ['name', 'apply', 'selects'], defaults=[None])
+
+# What running the pipeline did to one file: the names of the fixes that
+# changed it, and its path before and after
+FixResult = namedtuple('FixResult', ['path', 'new_path', 'applied'])
+
+
+def transcripts(*transcript_numbers: str):
+    """
+    `Fix.selects` for the documents of the given transcripts.
+
+    Ex: Fix(..., selects=transcripts('012', '2005'))
+    """
+    return lambda name: name.split('_')[0] in transcript_numbers
+
+
+def documents(*doc_names: str):
+    """
+    `Fix.selects` for the given documents.
+
+    Ex: Fix(..., selects=documents('3001_039.txt'))
+    """
+    return lambda name: name in doc_names
+
+
+def replace_fix(name: str, replacements: list[tuple[str, str]],
+                selects=None) -> Fix:
+    """
+    A fix that replaces each `old` string with `new`, for each (old, new) in
+    `replacements`, in order.
+    """
+    def apply(doc_name: str, content: str) -> tuple[str, str]:
+        for old, new in replacements:
+            content = content.replace(old, new)
+        return doc_name, content
+    return Fix(name, apply, selects)
+
+
+class FixPipeline:
+    """
+    Applies a list of `Fix`es, in order, to many text files.
+
+    Each file is read into memory once, goes through every fix that selects
+    it, and is written back once (through an atomic rename) only if some fix
+    changed it. Fixes that rename a document move the file in the same write.
+    Files don't depend on each other, so they are processed on a pool of
+    `workers` threads.
+
+    If a `FixLedger` is given, files the pipeline already went over (under
+    `fix_id`) are skipped without being read, and every file it goes over is
+    recorded in the ledger (saved by `run`).
+
+    Ex:
+        >>> pipeline = FixPipeline([
+        ...     replace_fix('transcript 012', [('Interviewee:',
+        ...                                     'Interviewer:')],
+        ...                 selects=transcripts('012')),
+        ... ])
+        >>> pipeline.run(raw.doc_paths)
+    """
+
+    def __init__(self, fixes: list[Fix], ledger: None | FixLedger=None,
+                 fix_id: None | str=None) -> None:
+        if ledger is not None and fix_id is None:
+            raise ValueError("A fix_id is needed to record fixes in a "
+                             "ledger.")
+        self.fixes = fixes
+        self.ledger = ledger
+        self.fix_id = fix_id
+
+    def fix_content(self, name: str, content: str
+                    ) -> tuple[str, str, list[str]]:
+        """
+        Apply every fix that selects the document `name` to its content.
+        Returns the document's new name and content, and the names of the
+        fixes that changed it.
+        """
+        applied = []
+        new_name = name
+        for fix in self.fixes:
+            if fix.selects is not None and not fix.selects(name):
+                continue
+            fixed_name, fixed_content = fix.apply(new_name, content)
+            if (fixed_name, fixed_content) != (new_name, content):
+                applied.append(fix.name)
+            new_name, content = fixed_name, fixed_content
+        return new_name, content, applied
+
+    def fix_file(self, path: str, dry_run=False) -> FixResult:
+        if self.ledger is not None and \
+           self.ledger.is_applied(self.fix_id, path):
+            return FixResult(path, path, [])
+        # newline='' keeps line endings as they are in the file
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            content = f.read()
+        pre_hash = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        dir_path, name = os.path.split(path)
+        new_name, content, applied = self.fix_content(name, content)
+        new_path = os.path.join(dir_path, new_name)
+        if dry_run:
+            return FixResult(path, new_path, applied)
+        if applied:
+            write_atomically(new_path, content)
+            if new_path != path:
+                os.remove(path)
+        if self.ledger is not None:
+            self.ledger.record(
+                self.fix_id, new_path, pre_hash,
+                hashlib.sha256(content.encode('utf-8')).hexdigest(),
+                old_path=path
+            )
+        return FixResult(path, new_path, applied)
+
+    def run(self, paths: list[str], workers: None | int=None,
+            dry_run=False) -> list[FixResult]:
+        """
+        Fix every file in `paths`. With `dry_run`, nothing is written, but
+        the results still say what would have changed. Results are in the
+        same order as `paths`.
+        """
+        workers = workers or os.cpu_count() or 1
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(
+                    lambda path: self.fix_file(path, dry_run), paths
+                ))
+        finally:
+            if self.ledger is not None and not dry_run:
+                self.ledger.save()
@@ -0,0 +1,143 @@
+"""Corpus-wide, columnar table of every label span in the datasaur data."""
+import numpy as np
+from ..document import LABELS, DatasaurDocument
+
+
+class LabelTable:
+    """
+    Every label span across a collection of datasaur documents, stored as
+    one NumPy array per column so that queries are vectorized filters.
+
+    Label names, speakers and documents are interned: the `label_ids`,
+    `speaker_ids` and `doc_ids` columns hold codes into the `labels`,
+    `speakers` and `doc_names` tuples. `doc_sets` gives the set (1-3) of
+    each document, indexed by document code.
+
+    Ex: all Self Correction spans by participants in set 2
+        >>> table = LabelTable.from_documents(datasaur.registry)
+        >>> table.query(label='Self Correction', speaker='Participant',
+        ...             set=2)
+    """
+
+    speakers: tuple[str, ...] = DatasaurDocument.default_speaker_pair
+
+    def __init__(self, labels: tuple[str, ...], 
+                 doc_names: tuple[str, ...], doc_sets: np.ndarray,
+                 label_ids: np.ndarray, speaker_ids: np.ndarray,
+                 doc_ids: np.ndarray, start_rows: np.ndarray,
+                 end_rows: np.ndarray, start_tokens: np.ndarray,
+                 end_tokens: np.ndarray) -> None:
+        self.labels = labels
+        self.doc_names = doc_names
+        self._doc_codes = {name: i for i, name in enumerate(doc_names)}
+        self.doc_sets = doc_sets
+        self.label_ids = label_ids
+        self.speaker_ids = speaker_ids
+        self.doc_ids = doc_ids
+        self.start_rows = start_rows
+        self.end_rows = end_rows
+        self.start_tokens = start_tokens
+        self.end_tokens = end_tokens
+
+    @classmethod
+    def from_documents(cls, docs) -> 'LabelTable':
+        """
+        Build the table from an iterable of `DatasaurDocument`s in one pass.
+        """
+        # Labels we don't know of get codes after the ones in LABELS
+        label_codes = {label: i for i, label in enumerate(sorted(LABELS))}
+        speaker_codes = {speaker: i for i, speaker in enumerate(cls.speakers)}
+        doc_names: list[str] = []
+        doc_sets: list[int] = []
+        columns: list[list[int]] = [[] for _ in range(7)]
+        for doc_id, doc in enumerate(docs):
+            doc_names.append(doc.name)
+            doc_sets.append(doc.set)
+            for (label, speaker), label_data in zip(doc._labels,
+                                                    doc.label_data):
+                start = label_data['textPosition']['start']
+                end = label_data['textPosition']['end']
+                label_code = label_codes.setdefault(label, len(label_codes))
+                for column, value in zip(columns, (
+                    label_code, speaker_codes[speaker], doc_id,
+                    start['row'], end['row'],
+                    start['tokenIndex'], end['tokenIndex']
+                )):
+                    column.append(value)
+        label_ids, speaker_ids, doc_ids, *positions = columns
+        return cls(tuple(label_codes), 
+                   tuple(doc_names), np.array(doc_sets, dtype=np.int8),
+                   np.array(label_ids, dtype=np.int8),
+                   np.array(speaker_ids, dtype=np.int8),
+                   np.array(doc_ids, dtype=np.int32),
+                   *(np.array(column, dtype=np.int32)
+                     for column in positions))
+
+    @property
+    def sets(self) -> np.ndarray:
+        """The set (1-3) each span's document is from."""
+        return self.doc_sets[self.doc_ids]
+
+    def mask(self, label: None | str=None, speaker: None | str=None,
+             set: None | int=None, doc: None | str=None) -> np.ndarray:
+        """
+        Boolean mask over all spans matching every given condition.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if label is not None:
+            mask &= self.label_ids == self.labels.index(label)
+        if speaker is not None:
+            mask &= self.speaker_ids == self.speakers.index(speaker)
+        if set is not None:
+            mask &= self.sets == set
+        if doc is not None:
+            if not doc.endswith('.txt'):
+                doc += '.txt'
+            mask &= self.doc_ids == self._doc_codes[doc]
+        return mask
+
+    def query(self, **conditions) -> np.ndarray:
+        """
+        Indices of all spans matching the given conditions (see `mask`).
+        """
+        return np.flatnonzero(self.mask(**conditions))
+
+    def count(self, **conditions) -> int:
+        """
+        Number of spans matching the given conditions (see `mask`).
+        """
+        return int(np.count_nonzero(self.mask(**conditions)))
+
+    def counts_by_doc(self, **conditions) -> np.ndarray:
+        """
+        Number of spans matching the given conditions in each document,
+        indexed by document code.
+        """
+        return np.bincount(self.doc_ids[self.mask(**conditions)],
+                           minlength=len(self.doc_names))
+
+    def span_texts(self, docs, indices=None) -> list[str]:
+        """
+        Text of the spans at `indices` (all spans by default), in the same 
+        order. `docs` must be the documents the table was built from, in the
+        same order.
+
+        Ex: the text of every Misspeak by a participant
+            >>> table.span_texts(docs, table.query(label='Misspeak',
+            ...                                    speaker='Participant'))
+        """
+        if indices is None:
+            indices = range(len(self))
+        docs = list(docs)
+        return [docs[self.doc_ids[i]].span_text(int(self.start_rows[i]),
+                                                int(self.start_tokens[i]),
+                                                int(self.end_rows[i]),
+                                                int(self.end_tokens[i]))
+                for i in indices]
+
+    def __len__(self) -> int:
+        return len(self.label_ids)
+
+    def __repr__(self) -> str:
+        return (f"LabelTable({len(self)} spans, "
+                f"{len(self.doc_names)} documents)")
@@ -0,0 +1,199 @@
+"""
+Ledger of the fixes applied to each data file, so that the fix scripts can
+skip files they already fixed.
+"""
+from collections import defaultdict, namedtuple
+import json
+import os
+import threading
+from .cache import file_digest, write_atomically
+
+
+# Root of the repository. Paths in the ledger are relative to it, so the same
+# file has the same key however the path to it was spelled (`./data/...`,
+# `data/...`, or from another working directory).
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+
+LEDGER_PATH = os.path.join(REPO_ROOT, 'data', 'fix_ledger.jsonl')
+
+# The mtime, size and hash each file had when the ledger last hashed it, so an
+# untouched file can be recognized without reading it. Mtimes differ between
+# checkouts, so these are kept out of the committed ledger.
+STATS_PATH = os.path.join(REPO_ROOT, '.cache', 'fix_ledger_stats.json')
+
+# Running fix `fix_id` over the file at `path` turned its contents from
+# `pre_hash` into `post_hash` (the same hash if the fix didn't change it).
+# `path` is where the file is after the fix.
+LedgerEntry = namedtuple('LedgerEntry', ['fix_id', 'path', 'pre_hash',
+                                         'post_hash'])
+
+
+def ledger_key(path: str) -> str:
+    """
+    The key of the file at `path` (relative to the working directory) in the
+    ledger.
+
+    Ex: './data/mathews/../005_001.txt' -> 'data/005_001.txt'
+    """
+    return os.path.relpath(os.path.abspath(path), REPO_ROOT)
+
+
+class FixLedger:
+    """
+    Record of (fix id, file, pre-hash, post-hash) for every file a fix script
+    has gone over, stored as JSON lines in `path`.
+
+    A fix counts as applied to a file if the file's current contents are what
+    the fix left behind, or what later fixes made of that. This way, a file
+    that went through `fix_raw` and then `fix_text_files_clean` is still
+    skipped by `fix_raw`, while a file that was replaced since (e.g. restored
+    from the raw exports) gets fixed again.
+
+    The mtime, size and hash of every file the ledger hashes are kept in a
+    local stat cache at `stats_path` (by default `STATS_PATH` for the
+    committed ledger, and nowhere for any other), and a file whose mtime and
+    size are unchanged isn't read again.
+
+    Files that were fixed before the ledger existed (like the committed
+    corpus) are recorded with `mark_applied`, so that the fixes aren't
+    applied to them again.
+
+    Ex:
+        >>> ledger = FixLedger()
+        >>> if not ledger.is_applied('fix_set1', path):
+        ...     pre_hash = ledger.current_hash(path)
+        ...     os.rename(path, new_path)
+        ...     ledger.record('fix_set1', new_path, pre_hash, old_path=path)
+        >>> ledger.save()
+    """
+
+    def __init__(self, path: str=LEDGER_PATH,
+                 stats_path: None | str=None) -> None:
+        self.path = path
+        self.stats_path = (STATS_PATH if stats_path is None
+                           and path == LEDGER_PATH else stats_path)
+        self.entries_by_path: dict[str, list[LedgerEntry]] = defaultdict(list)
+        self.stats: dict[str, tuple[int, int, str]] = {}
+        self._lock = threading.Lock()
+        self._entries_changed = self._stats_changed = False
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        fields = json.loads(line)
+                        # Older ledgers also stored each file's stat
+                        entry = LedgerEntry(**{
+                            field: fields[field]
+                            for field in LedgerEntry._fields
+                        })
+                        # Entries are stored relative to `REPO_ROOT`
+                        entry = entry._replace(
+                            path=os.path.normpath(entry.path)
+                        )
+                        self.entries_by_path[entry.path].append(entry)
+        if self.stats_path is not None and os.path.exists(self.stats_path):
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                self.stats = {key: tuple(stat)
+                              for key, stat in json.load(f).items()}
+
+    def current_hash(self, path: str) -> str:
+        """
+        Hash of the file at `path`, taken from the stat cache if the file
+        wasn't touched since it was last hashed. Safe to call from several
+        threads.
+        """
+        key = ledger_key(path)
+        stat = os.stat(path)
+        cached = self.stats.get(key)
+        if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        digest = file_digest(path)
+        self._remember(key, stat, digest)
+        return digest
+
+    def _remember(self, key: str, stat: os.stat_result, digest: str) -> None:
+        with self._lock:
+            self.stats[key] = (stat.st_mtime_ns, stat.st_size, digest)
+            self._stats_changed = True
+
+    def applied_hashes(self, fix_id: str, path: str) -> set[str]:
+        """
+        Every hash the file at `path` had after fix `fix_id` was applied to
+        it, including after later fixes.
+        """
+        hashes = set()
+        for entry in self.entries_by_path.get(ledger_key(path), []):
+            if entry.fix_id == fix_id or entry.pre_hash in hashes:
+                hashes.add(entry.post_hash)
+        return hashes
+
+    def is_applied(self, fix_id: str, path: str) -> bool:
+        """Whether fix `fix_id` was already applied to the file at `path`."""
+        hashes = self.applied_hashes(fix_id, path)
+        return bool(hashes) and self.current_hash(path) in hashes
+
+    def record(self, fix_id: str, path: str, pre_hash: str,
+               post_hash: None | str=None, old_path: None | str=None
+               ) -> LedgerEntry:
+        """
+        Record that fix `fix_id` went over a file, which is now at `path`
+        (and was at `old_path`, if the fix moved it), and whose contents
+        hashed to `pre_hash` before. `post_hash` is computed if not given.
+        Safe to call from several threads.
+        """
+        stat = os.stat(path)
+        key = ledger_key(path)
+        entry = LedgerEntry(fix_id, key, pre_hash,
+                            post_hash or file_digest(path))
+        self._remember(key, stat, entry.post_hash)
+        with self._lock:
+            self._entries_changed = True
+            if old_path is not None and ledger_key(old_path) != key:
+                # The file's history moves with it
+                self.entries_by_path[key].extend(
+                    old_entry._replace(path=key)
+                    for old_entry in self.entries_by_path.pop(
+                        ledger_key(old_path), []
+                    )
+                )
+                self.stats.pop(ledger_key(old_path), None)
+            self.entries_by_path[key].append(entry)
+        return entry
+
+    def mark_applied(self, fix_id: str, paths: list[str]) -> int:
+        """
+        Record fix `fix_id` as applied to each file in `paths` as it is now,
+        without changing it. For files fixed before they were in the ledger.
+        Returns how many files weren't already marked.
+        """
+        marked = 0
+        for path in paths:
+            if not self.is_applied(fix_id, path):
+                current_hash = self.current_hash(path)
+                self.record(fix_id, path, current_hash, current_hash)
+                marked += 1
+        return marked
+
+    def save(self) -> None:
+        """
+        Write the ledger to `path` if anything was recorded, and the stat
+        cache to `stats_path` if it changed, each through a temporary file.
+        """
+        if self._entries_changed:
+            write_atomically(self.path, ''.join(
+                json.dumps(entry._asdict()) + '\n'
+                for entries in self.entries_by_path.values()
+                for entry in entries
+            ))
+            self._entries_changed = False
+        if self._stats_changed and self.stats_path is not None:
+            write_atomically(self.stats_path, json.dumps(self.stats))
+            self._stats_changed = False
+
+    def __len__(self) -> int:
+        return sum(map(len, self.entries_by_path.values()))
+
+    def __repr__(self) -> str:
+        return f"FixLedger({self.path}, {len(self)} entries)"
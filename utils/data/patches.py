@@ -0,0 +1,410 @@
+"""
+Batched, transactional edits to datasaur exports: edits are collected in
+memory, kept consistent between each row's content and tokens, and written
+once per file on commit.
+"""
+import copy
+import json
+import os
+from collections.abc import Callable
+from difflib import SequenceMatcher
+from . import datasaur
+from .datasaur import DocumentRegistry
+from .ledger import FixLedger
+from ..document import DatasaurDocument
+
+
+def _replace_in_tokens(tokens: list[str], old: str, new: str, split=False
+                       ) -> tuple[list[str], list[tuple[int, int, int]]]:
+    """
+    Replace `old` with `new` in a row's tokens the same way `str.replace`
+    does in its content.
+
+    If `old` spans several whitespace-separated tokens, each run of tokens
+    holding it is merged into one token. If `split` is set, tokens that hold
+    whitespace after the replacement are split into separate tokens.
+    Returns the new tokens, and each (index, removed, added) splice that
+    changed the number of tokens, with indices into the old tokens.
+
+    Ex: _replace_in_tokens(['Okay', '07:', '27'], '07: 27', '07:27') ->
+        (['Okay', '07:27'], [(1, 2, 1)])
+    """
+    width = max(len(old.split()), 1)
+    new_tokens, splices = [], []
+    i = 0
+    while i < len(tokens):
+        joined = ' '.join(tokens[i:i + width])
+        if i + width <= len(tokens) and old in joined:
+            replaced = joined.replace(old, new)
+            added = replaced.split() if split else [replaced]
+            if len(added) != width:
+                splices.append((i, width, len(added)))
+            new_tokens.extend(added)
+            i += width
+        else:
+            new_tokens.append(tokens[i])
+            i += 1
+    return new_tokens, splices
+
+
+def _shift_position(position: dict, splices: list[tuple[int, int, int]],
+                    tokens: list[str], is_end: bool) -> None:
+    """
+    Move a label's start or end `position` in a row to where its token went
+    after `splices`. Positions inside a splice go to the first (start) or
+    last (end) of the tokens that replaced it.
+    """
+    index = position['tokenIndex']
+    offset = 0
+    for start, removed, added in splices:
+        if index >= start + removed:
+            offset += added - removed
+        elif index >= start:
+            new_index = start + offset + (max(added - 1, 0) if is_end else 0)
+            position['tokenIndex'] = min(new_index, max(len(tokens) - 1, 0))
+            position['charIndex'] = (
+                max(len(tokens[position['tokenIndex']]) - 1, 0)
+                if is_end and tokens else 0
+            )
+            return
+    position['tokenIndex'] = index + offset
+
+
+def _is_malformed(tokens: list) -> bool:
+    return any(not isinstance(token, str) for token in tokens)
+
+
+def _repair_tokens(content: str, tokens: list, row: int
+                   ) -> tuple[list[str], list[tuple[int, int, int]]]:
+    """
+    Tokens for a row whose tokens were overwritten with lists (see transcript
+    2005), split from its content on whitespace. Those lists are the tokens
+    of every row of the document, so the row's labels point into its own
+    entry; the splices that turn that entry into the new tokens are returned
+    too, so the labels can be moved to match (see `_shift_position`).
+    """
+    new_tokens = content.split()
+    old_tokens = tokens[row] if row < len(tokens) else None
+    if not isinstance(old_tokens, list) or _is_malformed(old_tokens):
+        return new_tokens, []
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    return new_tokens, [(i1, i2 - i1, j2 - j1)
+                        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+                        if i2 - i1 != j2 - j1]
+
+
+class PatchSession:
+    """
+    A set of edits to datasaur exports that are applied together.
+
+    Edits (`replace`, `map_text`, `rename`, `remove`) are made to an
+    in-memory copy of each touched export, so the documents in the registry
+    are left alone until `commit` writes every touched export once and
+    updates the registry's indexes and caches in place, and `rollback`
+    drops every edit. Documents read through the session (`document`,
+    `transcript`, iterating over it) reflect the edits made so far.
+
+    Used as a context manager, the session commits if the block finishes
+    and rolls back if it raises.
+
+    Some rows of transcript 2005 have their tokens overwritten with the
+    tokens of every row. Edits split such a row's content into tokens again
+    only if they change the row, and `retokenize` repairs them outright.
+
+    If a `FixLedger` is given, exports that a session with the same `fix_id`
+    already committed are left out: they aren't loaded when iterating over
+    the session or a transcript, and edits to them do nothing. On commit,
+    every other export is recorded in the ledger.
+
+    Ex:
+        >>> with PatchSession() as session:
+        ...     for doc in session.transcript('012'):
+        ...         session.replace(doc, "Interviewee:", "Interviewer:")
+    """
+
+    def __init__(self, registry: DocumentRegistry=datasaur.registry,
+                 ledger: None | FixLedger=None, fix_id: None | str=None
+                 ) -> None:
+        if ledger is not None and fix_id is None:
+            raise ValueError("A fix_id is needed to record fixes in a "
+                             "ledger.")
+        self.registry = registry
+        self.ledger = ledger
+        self.fix_id = fix_id
+        self.rollback()
+
+    def rollback(self) -> None:
+        """Drop every edit made since the last commit."""
+        # Edited exports and the documents built from them, by the path the
+        # document was loaded from
+        self._staged: dict[str, dict] = {}
+        self._docs: dict[str, DatasaurDocument] = {}
+        self._new_paths: dict[str, str] = {}
+        self._removed: set[str] = set()
+        # Whether the ledger says each export was already fixed
+        self._done: dict[str, bool] = {}
+        # Current name of each document, and the path it was loaded from
+        self._paths_by_name: dict[str, str] = dict(
+            self.registry.paths_by_name
+        )
+
+    def document(self, name: str) -> DatasaurDocument:
+        """
+        Get a document by its current name, with or without the '.txt'
+        extension, with the edits made so far.
+        """
+        if not name.endswith('.txt'):
+            name += '.txt'
+        if name not in self._paths_by_name:
+            raise KeyError(f"Document {name} not found in any project.")
+        return self._load(self._paths_by_name[name])
+
+    def _is_done(self, path: str) -> bool:
+        if self.ledger is None:
+            return False
+        if path not in self._done:
+            self._done[path] = self.ledger.is_applied(self.fix_id, path)
+        return self._done[path]
+
+    def _load(self, path: str) -> DatasaurDocument:
+        if path not in self._staged:
+            return self.registry.load(path)
+        if path not in self._docs:
+            self._docs[path] = DatasaurDocument(path, self._staged[path])
+        return self._docs[path]
+
+    def transcript(self, transcript_number: str) -> list[DatasaurDocument]:
+        """
+        Get all documents whose current name has the given transcript
+        number, in order, leaving out those the ledger says were fixed.
+        """
+        return [self.document(name) for name in sorted(self._paths_by_name)
+                if name.split('_')[0] == transcript_number and
+                   not self._is_done(self._paths_by_name[name])]
+
+    def _json(self, doc: DatasaurDocument) -> dict:
+        """The export of `doc` as edited so far, without copying it."""
+        if doc.path in self._staged:
+            return self._staged[doc.path]
+        return self.registry.load(doc.path).json_dump
+
+    def _stage(self, doc: DatasaurDocument) -> dict:
+        """The editable copy of the export of `doc`."""
+        if doc.path in self._removed:
+            raise ValueError(f"{doc} was removed in this session.")
+        if doc.path not in self._staged:
+            self._staged[doc.path] = copy.deepcopy(self._json(doc))
+        # Documents built from the export are now out of date
+        self._docs.pop(doc.path, None)
+        return self._staged[doc.path]
+
+    def _edit_rows(self, doc: DatasaurDocument, edit_row: Callable,
+                   rows: None | list[int]=None) -> bool:
+        """
+        Apply `edit_row(content, tokens) -> (content, tokens, splices)` to
+        each row in `rows` (every row by default), staging the export only
+        if a row changed. Labels are moved along with their tokens.
+
+        Rows with malformed tokens are edited as if they had been
+        `retokenize`d, and are only repaired if the edit changes them.
+        """
+        if self._is_done(doc.path):
+            return False
+        row_data = [row[0] for row in self._json(doc)['data']['rows']]
+        edits = {}
+        for i in (range(len(row_data)) if rows is None else rows):
+            content, tokens = row_data[i]['content'], row_data[i]['tokens']
+            steps = []
+            if _is_malformed(tokens):
+                tokens, repair_splices = _repair_tokens(content, tokens, i)
+                steps.append((repair_splices, tokens))
+            new_content, new_tokens, splices = edit_row(content, tokens)
+            if (new_content, new_tokens) != (content, tokens):
+                edits[i] = (new_content, new_tokens,
+                            steps + [(splices, new_tokens)])
+        return self._apply_edits(doc, edits)
+
+    def _apply_edits(self, doc: DatasaurDocument,
+                     edits: dict[int, tuple[str, list[str], list]]) -> bool:
+        """
+        Stage each row `i`'s new content and tokens for every `i` in
+        `edits`, moving the row's labels through each (splices, tokens) step
+        in turn.
+        """
+        if not edits:
+            return False
+        json_dump = self._stage(doc)
+        for i, (content, tokens, steps) in edits.items():
+            row = json_dump['data']['rows'][i][0]
+            row['content'], row['tokens'] = content, tokens
+            for splices, step_tokens in steps:
+                if not splices:
+                    continue
+                for label in json_dump['data']['spanLabels']:
+                    start = label['textPosition']['start']
+                    end = label['textPosition']['end']
+                    if start['row'] == i:
+                        _shift_position(start, splices, step_tokens,
+                                        is_end=False)
+                    if end['row'] == i:
+                        _shift_position(end, splices, step_tokens,
+                                        is_end=True)
+        return True
+
+    def retokenize(self, doc: DatasaurDocument,
+                   rows: None | list[int]=None) -> bool:
+        """
+        Repair the rows of `doc` (every row by default) whose tokens were
+        overwritten with lists (see transcript 2005): their tokens are split
+        from their content on whitespace, and their labels are moved to the
+        tokens they pointed at. Returns whether any row was repaired.
+        """
+        if self._is_done(doc.path):
+            return False
+        row_data = [row[0] for row in self._json(doc)['data']['rows']]
+        edits = {}
+        for i in (range(len(row_data)) if rows is None else rows):
+            content, tokens = row_data[i]['content'], row_data[i]['tokens']
+            if _is_malformed(tokens):
+                tokens, splices = _repair_tokens(content, tokens, i)
+                edits[i] = (content, tokens, [(splices, tokens)])
+        return self._apply_edits(doc, edits)
+
+    def replace(self, doc: DatasaurDocument, old: str, new: str,
+                rows: None | list[int]=None, split=False) -> bool:
+        """
+        Replace every `old` with `new` in the content and tokens of `doc`'s
+        `rows` (every row by default). A replacement that spans tokens
+        merges them, and with `split`, tokens holding whitespace after the
+        replacement are split; labels in the row are moved to match.
+        Returns whether anything changed.
+
+        Ex: session.replace(doc, '07: 27', '07:27', rows=[4])
+        """
+        def edit_row(content, tokens):
+            return (content.replace(old, new),
+                    *_replace_in_tokens(tokens, old, new, split))
+        return self._edit_rows(doc, edit_row, rows)
+
+    def map_text(self, doc: DatasaurDocument, function: Callable[[str], str],
+                 rows: None | list[int]=None) -> bool:
+        """
+        Apply `function` to the content of `doc`'s `rows` (every row by
+        default) and to each of their tokens. `function` shouldn't add or
+        remove whitespace, so the tokens keep matching the content.
+        Returns whether anything changed.
+        """
+        def edit_row(content, tokens):
+            return function(content), [function(token) for token in tokens], []
+        return self._edit_rows(doc, edit_row, rows)
+
+    def rename(self, doc: DatasaurDocument, new_name: str) -> None:
+        """
+        Rename a document. Its export is moved to match on commit.
+
+        Ex: session.rename(doc, '2' + doc.name)
+        """
+        if self._is_done(doc.path):
+            return
+        if new_name in self._paths_by_name:
+            raise ValueError(f"Can't rename {doc} to {new_name}, a document "
+                              "with that name already exists.")
+        old_name = self._json(doc)['data']['document']['name']
+        self._stage(doc)['data']['document']['name'] = new_name
+        del self._paths_by_name[old_name]
+        self._paths_by_name[new_name] = doc.path
+        self._new_paths[doc.path] = os.path.join(
+            os.path.dirname(doc.path), os.path.splitext(new_name)[0] + '.json'
+        )
+
+    def remove(self, doc: DatasaurDocument) -> None:
+        """Delete a document's export on commit."""
+        if doc.path in self._removed or self._is_done(doc.path):
+            return
+        self._removed.add(doc.path)
+        name = self._json(doc)['data']['document']['name']
+        if self._paths_by_name.get(name) == doc.path:
+            del self._paths_by_name[name]
+        self._staged.pop(doc.path, None)
+        self._docs.pop(doc.path, None)
+
+    def commit(self) -> list[str]:
+        """
+        Write every edited export once (skipping those whose edits cancel
+        out) and delete removed ones, then update the registry to match
+        (without rereading any export), and record every export the session
+        went over in the ledger. Returns the paths written.
+
+        Every edited export is first written to a temporary file, so if any
+        of those writes fails, no export has been touched yet. Only then are
+        they moved into place, and removed (or renamed) exports deleted.
+        """
+        kept = [path for path in self.registry.paths
+                if path not in self._removed and not self._is_done(path)]
+        pre_hashes = {}
+        if self.ledger is not None:
+            pre_hashes = {path: self.ledger.current_hash(path)
+                          for path in kept}
+        writes = []
+        for path, json_dump in self._staged.items():
+            new_path = self._new_paths.get(path, path)
+            if new_path == path and \
+               json_dump['data'] == self.registry.load(path).data:
+                # Later edits undid the earlier ones
+                continue
+            # Exports keep a copy of the rows at the top level too
+            json_dump['rows'] = [row[0] for row in json_dump['data']['rows']]
+            writes.append((path, new_path, json_dump))
+        try:
+            for path, new_path, json_dump in writes:
+                with open(new_path + '.tmp', 'w', encoding='utf-8') as f:
+                    json.dump(json_dump, f)
+        except BaseException:
+            for path, new_path, json_dump in writes:
+                if os.path.exists(new_path + '.tmp'):
+                    os.remove(new_path + '.tmp')
+            raise
+        for path, new_path, json_dump in writes:
+            os.replace(new_path + '.tmp', new_path)
+        written = [new_path for path, new_path, json_dump in writes]
+        # A renamed export can take the path of a removed one
+        deleted = (self._removed | {path for path, new_path, json_dump
+                                    in writes if new_path != path}) \
+                  - set(written)
+        for path in deleted:
+            os.remove(path)
+            self.registry.remove(path)
+        for path, new_path, json_dump in writes:
+            self.registry.put(DatasaurDocument(new_path, json_dump))
+        if self.ledger is not None:
+            for path in kept:
+                new_path = self._new_paths.get(path, path)
+                self.ledger.record(
+                    self.fix_id, new_path, pre_hashes[path],
+                    None if new_path in written else pre_hashes[path],
+                    old_path=path
+                )
+            self.ledger.save()
+        self.rollback()
+        return written
+
+    def __iter__(self):
+        """
+        Every document not removed in this session (or already fixed,
+        according to the ledger), with its edits.
+        """
+        return (self._load(path) for path in list(self.registry.paths)
+                if path not in self._removed and not self._is_done(path))
+
+    def __enter__(self) -> 'PatchSession':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def __repr__(self) -> str:
+        return (f"PatchSession({len(self._staged)} edited, "
+                f"{len(self._removed)} removed)")
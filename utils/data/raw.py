@@ -17,6 +17,13 @@ docs_by_transcript = {tn: [dp for dp in doc_paths
                       for tn in transcript_numbers}
 
 
+def text_file_paths() -> list[str]:
+    """Every text file, listed now (`doc_paths` is listed on import)."""
+    return [root + '/' + file
+            for root, dirs, files in os.walk(text_files_dir)
+            for file in files if file.endswith('.txt')]
+
+
 def get_doc_path(doc_name: str) -> str:
     set_num = '1' if doc_name[0] == '0' else doc_name[0]
-    return f'{text_files_dir}/set0{set_num}/{doc_name}'
\ No newline at end of file
+    return f'{text_files_dir}/set0{set_num}/{doc_name}'
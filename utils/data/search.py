@@ -0,0 +1,322 @@
+"""
+Persistent positional index over every line of the text files and every row of
+the datasaur exports, for finding tokens, substrings and patterns in the whole
+corpus without reading it again.
+"""
+from array import array
+from collections import defaultdict, namedtuple
+import os
+import pickle
+import re
+from . import datasaur
+from .cache import write_atomically
+from .raw import text_file_paths
+
+
+INDEX_PATH = './.cache/corpus_index.pickle'
+
+# Bump this whenever what is indexed (or how) changes, so old indexes are
+# rebuilt instead of loaded
+INDEX_VERSION = 2
+
+# Where a match was found: the file, the (1-based) line in it (for datasaur
+# exports, row `i` is line `i + 1`), the (0-based) column the match starts at,
+# and the match
+Hit = namedtuple('Hit', ['path', 'line', 'column', 'match'])
+
+token_regex = re.compile(r"\S+")
+
+
+def _ngrams(text: str, n: int) -> set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def token_offsets(row: str, tokens: list[str]) -> array:
+    """
+    Column each of a row's `tokens` starts at, found by searching the row
+    from the end of the previous token. A token that isn't in the row as-is
+    is placed at the next whitespace-separated word.
+    """
+    offsets = array('I')
+    end = 0
+    for token in tokens:
+        start = row.find(token, end)
+        if start != -1:
+            end = start + len(token)
+        else:
+            word = token_regex.search(row, end)
+            start, end = (word.span() if word else (end, end))
+        offsets.append(start)
+    return offsets
+
+
+def text_file_rows(path: str) -> list[str]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().split('\n')
+
+
+class CorpusIndex:
+    """
+    Positional inverted index over the rows of many documents.
+
+    A row is a line of a text file or a row of a datasaur export. Two indexes
+    are kept over the rows:
+    - `tokens`: each whitespace-separated token to the (row, position)
+      pairs it occurs at, for exact token lookups (`find_token`).
+    - `ngrams`: each lowercase character `n`-gram to the rows that contain
+      it, so a substring query (`find`) only checks rows holding all of its
+      `n`-grams.
+    Patterns (`find_pattern`) are matched against the stored rows, which is
+    still much faster than reading every file.
+
+    The index is kept in `INDEX_PATH` along with each file's size and mtime,
+    and `update` only reindexes the files that changed since.
+
+    Ex: every "Speaker1:" in the corpus
+        >>> index = CorpusIndex.load()
+        >>> index.update()
+        >>> index.find_token('Speaker1:')
+        [Hit(path='./data/.../3001_011.txt', line=58, column=0,
+             match='Speaker1:'), ...]
+    """
+
+    def __init__(self, n: int=3) -> None:
+        self.n = n
+        self.version = INDEX_VERSION
+        # Text of each row, and the document and line it's from. Rows of
+        # removed documents are blanked and listed in `_removed_rows`.
+        self.rows: list[str] = []
+        self.row_docs = array('I')
+        self.row_lines = array('I')
+        self.docs: list[str] = []
+        self._doc_ids: dict[str, int] = {}
+        # Rows of each indexed document, and its (mtime_ns, size) when it was
+        # indexed
+        self.doc_rows: dict[str, range] = {}
+        self.doc_stats: dict[str, tuple[int, int]] = {}
+        # Tokens of the rows that weren't split on whitespace, and the
+        # column each of those tokens starts at
+        self.row_tokens: dict[int, list[str]] = {}
+        self.row_offsets: dict[int, array] = {}
+        self.tokens: dict[str, array] = defaultdict(lambda: array('I'))
+        self.ngrams: dict[str, array] = defaultdict(lambda: array('I'))
+        self._removed_rows: set[int] = set()
+
+    def add(self, path: str, rows: list[str],
+            tokens: None | list[list[str]]=None) -> None:
+        """
+        Index the rows of the document at `path`, replacing whatever was
+        indexed for it before. Each row is split into tokens on whitespace,
+        unless its `tokens` are given (e.g. a datasaur row's, so that token
+        positions match label positions).
+        """
+        self.remove(path)
+        if path not in self._doc_ids:
+            self._doc_ids[path] = len(self.docs)
+            self.docs.append(path)
+        doc_id = self._doc_ids[path]
+        first_row = len(self.rows)
+        for line, row in enumerate(rows):
+            row_id = len(self.rows)
+            self.rows.append(row)
+            self.row_docs.append(doc_id)
+            self.row_lines.append(line + 1)
+            row_tokens = row.split()
+            if tokens is not None and tokens[line] != row_tokens:
+                row_tokens = self.row_tokens[row_id] = tokens[line]
+                self.row_offsets[row_id] = token_offsets(row, row_tokens)
+            for position, token in enumerate(row_tokens):
+                self.tokens[token].extend((row_id, position))
+            for ngram in _ngrams(row.lower(), self.n):
+                self.ngrams[ngram].append(row_id)
+        self.doc_rows[path] = range(first_row, len(self.rows))
+        if os.path.exists(path):
+            stat = os.stat(path)
+            self.doc_stats[path] = (stat.st_mtime_ns, stat.st_size)
+
+    def remove(self, path: str) -> None:
+        """
+        Drop a document from the index. Its rows are left out of results,
+        and the postings are rebuilt once most rows are removed ones.
+        """
+        rows = self.doc_rows.pop(path, None)
+        self.doc_stats.pop(path, None)
+        if not rows:
+            return
+        self._removed_rows.update(rows)
+        for row_id in rows:
+            self.rows[row_id] = ''
+            self.row_tokens.pop(row_id, None)
+            self.row_offsets.pop(row_id, None)
+        if len(self._removed_rows) > len(self.rows) // 2:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rebuild the index from the rows of the documents still in it."""
+        documents = [
+            (path, [self.rows[row_id] for row_id in rows],
+             [self.row_tokens.get(row_id, self.rows[row_id].split())
+              for row_id in rows],
+             self.doc_stats.get(path))
+            for path, rows in self.doc_rows.items()
+        ]
+        self.__init__(self.n)
+        for path, rows, tokens, stat in documents:
+            self.add(path, rows, tokens)
+            if stat is not None:
+                self.doc_stats[path] = stat
+
+    def _hit(self, row_id: int, column: int, match: str) -> Hit:
+        return Hit(self.docs[self.row_docs[row_id]], self.row_lines[row_id],
+                   column, match)
+
+    def _live(self, row_ids) -> list[int]:
+        if not self._removed_rows:
+            return sorted(row_ids)
+        return sorted(row_id for row_id in row_ids
+                      if row_id not in self._removed_rows)
+
+    def find_token(self, token: str) -> list[Hit]:
+        """
+        Every occurrence of `token` as a whole token.
+
+        Ex: index.find_token('Speaker1:')
+        """
+        postings = self.tokens.get(token, array('I'))
+        hits = []
+        for i in range(0, len(postings), 2):
+            row_id, position = postings[i], postings[i + 1]
+            if row_id in self._removed_rows:
+                continue
+            row = self.rows[row_id]
+            if row_id in self.row_offsets:
+                column = self.row_offsets[row_id][position]
+            else:
+                column = [match.start()
+                          for match in token_regex.finditer(row)][position]
+            hits.append(self._hit(row_id, column, token))
+        return hits
+
+    def _candidate_rows(self, substring: str) -> list[int]:
+        """Rows that contain every `n`-gram of `substring` (lowercased)."""
+        if len(substring) < self.n:
+            return self._live(range(len(self.rows)))
+        postings = sorted((self.ngrams.get(ngram, array('I'))
+                           for ngram in _ngrams(substring.lower(), self.n)),
+                          key=len)
+        rows = set(postings[0])
+        for posting in postings[1:]:
+            if not rows:
+                break
+            rows.intersection_update(posting)
+        return self._live(rows)
+
+    def find(self, substring: str, ignore_case=False) -> list[Hit]:
+        """
+        Every occurrence of `substring` in any row.
+
+        Ex: index.find('Interviewer:Right')
+        """
+        if not substring:
+            raise ValueError("Can't search for an empty string.")
+        hits = []
+        needle = substring.lower() if ignore_case else substring
+        for row_id in self._candidate_rows(substring):
+            row = self.rows[row_id]
+            haystack = row.lower() if ignore_case else row
+            column = haystack.find(needle)
+            while column != -1:
+                hits.append(self._hit(row_id, column,
+                                      row[column:column + len(substring)]))
+                column = haystack.find(needle, column + 1)
+        return hits
+
+    def find_pattern(self, pattern: str | re.Pattern,
+                     literal: None | str=None) -> list[Hit]:
+        """
+        Every match of a regex in any row. If every match must contain the
+        string `literal`, only rows containing it are searched.
+
+        Ex: index.find_pattern(r'\\d\\d: \\d\\d', literal=': ')
+        """
+        regex = re.compile(pattern)
+        row_ids = (self._candidate_rows(literal) if literal
+                   else self._live(range(len(self.rows))))
+        return [self._hit(row_id, match.start(), match.group())
+                for row_id in row_ids
+                for match in regex.finditer(self.rows[row_id])]
+
+    def is_stale(self, path: str) -> bool:
+        """Whether the file at `path` changed since it was indexed."""
+        stat = os.stat(path)
+        return self.doc_stats.get(path) != (stat.st_mtime_ns, stat.st_size)
+
+    def update(self, text_files=True, datasaur_exports=True,
+               workers: None | int=None) -> list[str]:
+        """
+        Reindex the text files and/or datasaur exports that changed (or
+        appeared) since they were indexed, and drop those that are gone.
+        Returns the paths reindexed.
+        """
+        paths = []
+        if text_files:
+            paths += text_file_paths()
+        if datasaur_exports:
+            paths += datasaur.DocumentRegistry(datasaur.projects).paths
+        current = set(paths)
+        for path in list(self.doc_rows):
+            if path not in current and \
+               (text_files or not path.endswith('.txt')) and \
+               (datasaur_exports or not path.endswith('.json')):
+                self.remove(path)
+        stale = [path for path in paths if self.is_stale(path)]
+        for path in stale:
+            if path.endswith('.txt'):
+                self.add(path, text_file_rows(path))
+        exports = [path for path in stale if path.endswith('.json')]
+        for doc in (datasaur.load_documents(exports, workers)
+                    if exports else []):
+            tokens = doc.tokens
+            if any(not isinstance(token, str)
+                   for row in tokens for token in row):
+                tokens = None # Malformed (see transcript 2005)
+            self.add(doc.path, [row['content'].rstrip('\r\n')
+                                for row in doc.row_data], tokens)
+        return stale
+
+    @classmethod
+    def load(cls, path: str=INDEX_PATH) -> 'CorpusIndex':
+        """
+        Load the index saved at `path`, or an empty one if there is none (or
+        it's from an older version).
+        """
+        try:
+            with open(path, 'rb') as f:
+                index = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+            return cls()
+        if getattr(index, 'version', None) != INDEX_VERSION:
+            return cls()
+        return index
+
+    def save(self, path: str=INDEX_PATH) -> None:
+        """Save the index to `path`, through a temporary file."""
+        write_atomically(path,
+                         pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def __getstate__(self) -> dict:
+        # defaultdicts with lambdas can't be pickled
+        return {**self.__dict__, 'tokens': dict(self.tokens),
+                'ngrams': dict(self.ngrams)}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self.tokens = defaultdict(lambda: array('I'), state['tokens'])
+        self.ngrams = defaultdict(lambda: array('I'), state['ngrams'])
+
+    def __len__(self) -> int:
+        return len(self.doc_rows)
+
+    def __repr__(self) -> str:
+        return (f"CorpusIndex({len(self)} documents, "
+                f"{len(self.rows) - len(self._removed_rows)} rows)")
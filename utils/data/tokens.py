@@ -0,0 +1,186 @@
+"""Corpus-wide table of interned tokens, for vectorized lexical metrics."""
+import numpy as np
+
+
+class TokenTable:
+    """
+    Every token of a collection of tokenized texts, interned into integer ids
+    and stored as flat NumPy arrays so that lexical metrics over the whole
+    corpus are a handful of vectorized operations.
+
+    Tokens are lowercased when they are interned, so `vocabulary[i]` is the
+    lowercase type with id `i`. The tokens of sentence `s` are
+    `token_ids[sentence_offsets[s]:sentence_offsets[s + 1]]`.
+
+    Each text is one group: the speech of one speaker in one document. The
+    `doc_names`, `speakers` and `sets` tuples give each group's document,
+    speaker and set, and `sentence_groups` gives the group of each sentence.
+
+    Ex: mean per-sentence TTR of each participant in set 2
+        >>> table = TokenTable.from_documents(docs)
+        >>> table.type_token_ratio(by='group')
+    """
+
+    def __init__(self, vocabulary: tuple[str, ...],
+                 doc_names: tuple[str, ...], speakers: tuple[str, ...],
+                 sets: tuple[int, ...], token_ids: np.ndarray,
+                 sentence_offsets: np.ndarray,
+                 sentence_groups: np.ndarray) -> None:
+        self.vocabulary = vocabulary
+        self.doc_names = doc_names
+        self.speakers = speakers
+        self.sets = sets
+        self.token_ids = token_ids
+        self.sentence_offsets = sentence_offsets
+        self.sentence_groups = sentence_groups
+
+    @classmethod
+    def from_sentences(cls, texts) -> 'TokenTable':
+        """
+        Build the table from an iterable of (document name, speaker, set,
+        sentences) tuples, where `sentences` is a list of tokenized sentences
+        (`list[list[str]]`).
+        """
+        type_ids: dict[str, int] = {}
+        doc_names: list[str] = []
+        speakers: list[str] = []
+        sets: list[int] = []
+        token_ids: list[int] = []
+        sentence_offsets = [0]
+        sentence_groups: list[int] = []
+        for group, (doc_name, speaker, set, sentences) in enumerate(texts):
+            doc_names.append(doc_name)
+            speakers.append(speaker)
+            sets.append(set)
+            for sent in sentences:
+                token_ids.extend(type_ids.setdefault(token.lower(),
+                                                     len(type_ids))
+                                 for token in sent)
+                sentence_offsets.append(len(token_ids))
+                sentence_groups.append(group)
+        return cls(tuple(type_ids), tuple(doc_names), tuple(speakers),
+                   tuple(sets), np.array(token_ids, dtype=np.int32),
+                   np.array(sentence_offsets, dtype=np.int64),
+                   np.array(sentence_groups, dtype=np.int32))
+
+    @classmethod
+    def from_documents(cls, docs, speakers=('Interviewer', 'Participant'),
+                       cache=None) -> 'TokenTable':
+        """
+        Tokenize the speech of each of `speakers` in each document with
+        stanza and build the table from it. Tokenizing goes through a
+        `ling.ParseCache` (`cache`, tokenizer only by default), so only text
+        that wasn't tokenized before loads stanza.
+        """
+        # Imported here so that building tables from already tokenized text
+        # doesn't need stanza
+        from .. import ling
+        cache = cache or ling.ParseCache(processors=ling.TOKENIZE)
+        docs = list(docs)
+        keys = [(doc, speaker) for doc in docs for speaker in speakers]
+        parsed = cache.parse([doc.content(speaker) for doc, speaker in keys])
+        return cls.from_sentences(
+            (doc.name, speaker, doc.set, ling.sentence_tokens(parsed_text))
+            for (doc, speaker), parsed_text in zip(keys, parsed)
+        )
+
+    @property
+    def sentence_lengths(self) -> np.ndarray:
+        return np.diff(self.sentence_offsets)
+
+    @property
+    def token_groups(self) -> np.ndarray:
+        """The group of each token."""
+        return np.repeat(self.sentence_groups, self.sentence_lengths)
+
+    def _keys(self, by: str) -> tuple[np.ndarray, list]:
+        """
+        Code of each group when grouping by `by` ('group', 'doc', 'speaker'
+        or 'set'), and the key each code stands for.
+        """
+        if by == 'group':
+            keys = list(zip(self.doc_names, self.speakers))
+        elif by == 'doc':
+            keys = self.doc_names
+        elif by == 'speaker':
+            keys = self.speakers
+        elif by == 'set':
+            keys = self.sets
+        else:
+            raise ValueError(f"Can't group by {by!r}. Expected 'group', "
+                             "'doc', 'speaker' or 'set'.")
+        codes: dict = {}
+        group_codes = np.array([codes.setdefault(key, len(codes))
+                                for key in keys], dtype=np.int32)
+        return group_codes, list(codes)
+
+    @staticmethod
+    def _ratios(numerators: np.ndarray, denominators: np.ndarray,
+                keys: list) -> dict:
+        """Map each key to its ratio, or 0.0 if its denominator is 0."""
+        ratios = np.divide(numerators, denominators,
+                           out=np.zeros(len(keys)), where=denominators > 0)
+        return dict(zip(keys, ratios.tolist()))
+
+    def _types_per(self, owners: np.ndarray, n_owners: int) -> np.ndarray:
+        """
+        Number of distinct types among each owner's tokens, given the owner
+        (sentence or key code) of each token.
+        """
+        n_types = max(len(self.vocabulary), 1)
+        pairs = np.unique(owners.astype(np.int64) * n_types + self.token_ids)
+        return np.bincount(pairs // n_types, minlength=n_owners)
+
+    def type_token_ratio(self, by: str='group', per_sent=True) -> dict:
+        """
+        Type-token ratio of each group, document, speaker or set (see
+        `ling.type_token_ratio`). With `per_sent`, the TTR of each sentence
+        is calculated and their average is returned; otherwise, it's the TTR
+        of all of the key's tokens at once.
+        """
+        group_codes, keys = self._keys(by)
+        sentence_keys = group_codes[self.sentence_groups]
+        lengths = self.sentence_lengths
+        if per_sent:
+            sentence_ids = np.repeat(np.arange(len(lengths)), lengths)
+            types = self._types_per(sentence_ids, len(lengths))
+            sentence_ttrs = np.divide(types, lengths,
+                                      out=np.zeros(len(lengths)),
+                                      where=lengths > 0)
+            return self._ratios(
+                np.bincount(sentence_keys, sentence_ttrs, len(keys)),
+                np.bincount(sentence_keys, minlength=len(keys)), keys
+            )
+        token_keys = np.repeat(sentence_keys, lengths)
+        return self._ratios(self._types_per(token_keys, len(keys)),
+                            np.bincount(token_keys, minlength=len(keys)),
+                            keys)
+
+    def average_sentence_length(self, by: str='group') -> dict:
+        """
+        Average number of tokens per sentence of each group, document,
+        speaker or set (see `ling.average_sentence_length`).
+        """
+        group_codes, keys = self._keys(by)
+        sentence_keys = group_codes[self.sentence_groups]
+        return self._ratios(
+            np.bincount(sentence_keys, self.sentence_lengths, len(keys)),
+            np.bincount(sentence_keys, minlength=len(keys)), keys
+        )
+
+    def vocabulary_size(self, by: str='group') -> dict:
+        """
+        Number of distinct (lowercased) types used by each group, document,
+        speaker or set.
+        """
+        group_codes, keys = self._keys(by)
+        token_keys = group_codes[self.token_groups]
+        return dict(zip(keys, self._types_per(token_keys, 
+                                              len(keys)).tolist()))
+
+    def __len__(self) -> int:
+        return len(self.token_ids)
+
+    def __repr__(self) -> str:
+        return (f"TokenTable({len(self)} tokens, {len(self.vocabulary)} "
+                f"types, {len(self.doc_names)} texts)")
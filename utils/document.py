@@ -1,11 +1,12 @@
-from collections import Counter, defaultdict
-from functools import cached_property
-from itertools import product
+from array import array
+from collections import Counter, OrderedDict, defaultdict, namedtuple
+from functools import cached_property, lru_cache, partial
+from itertools import accumulate, product
 import json
 import os
 import warnings
 from . import regexes
-from .regexes import SPEAKER_PAIRS, SPEAKERS
+from .regexes import SPEAKER_PAIR_LOOKUP, SPEAKER_PAIRS, SPEAKERS
 import string
 
 
@@ -21,17 +22,148 @@ LABELS = {
 }
 
 
+class CleaningPipeline:
+    """
+    Cleans lines according to a fixed set of cleaning options. Every enabled
+    step is applied to each line in a single pass, in this order:
+
+    1. Remove timestamps (`remove_timestamps`)
+    2. Replace bracketed tokens with better representations (`do_replacements`)
+    3. Remove tokens that are not useful for us (`do_removals`)
+    4. Remove speaker labels (`speaker_labels`)
+    5. Lowercase (`lower`)
+    6. Remove punctuation (`remove_punctuation`)
+
+    Lines left empty are dropped. Use `cleaning_pipeline` to get the (shared)
+    pipeline for a combination of options rather than building one directly.
+    """
+
+    punctuation_table = str.maketrans('', '', string.punctuation)
+
+    def __init__(self, remove_timestamps=True, do_replacements=True,
+                 do_removals=True, speaker_labels=False,
+                 remove_punctuation=False, lower=False) -> None:
+        self.steps = []
+        if remove_timestamps == True:
+            self.steps.append(self._remove_timestamps)
+        if do_replacements == True:
+            self.steps.append(regexes.replace_tokens)
+        if do_removals == True:
+            self.steps.append(regexes.remove_tokens)
+        if speaker_labels == True:
+            self.steps.append(partial(regexes.speaker_labels_restricted.sub,
+                                      ''))
+        if lower == True:
+            self.steps.append(str.lower)
+        if remove_punctuation == True:
+            self.steps.append(self._remove_punctuation)
+
+    @staticmethod
+    def _remove_timestamps(line: str) -> str:
+        return regexes.timestamps.sub('', line).strip()
+
+    @classmethod
+    def _remove_punctuation(cls, line: str) -> str:
+        return line.translate(cls.punctuation_table)
+
+    def clean(self, line: str) -> str:
+        """Apply every step to a single line."""
+        for step in self.steps:
+            line = step(line)
+        return line
+
+    def __call__(self, lines: list[str]) -> list[str]:
+        return [cleaned for line in lines if (cleaned := self.clean(line))]
+
+
+@lru_cache(maxsize=None)
+def cleaning_pipeline(remove_timestamps=True, do_replacements=True,
+                      do_removals=True, speaker_labels=False,
+                      remove_punctuation=False, lower=False
+    ) -> CleaningPipeline:
+    """
+    Get the `CleaningPipeline` for a combination of cleaning options. Each
+    combination's pipeline is only built once.
+    """
+    return CleaningPipeline(remove_timestamps=remove_timestamps,
+                            do_replacements=do_replacements,
+                            do_removals=do_removals,
+                            speaker_labels=speaker_labels,
+                            remove_punctuation=remove_punctuation,
+                            lower=lower)
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+# Run-length encoded speakers of a document's rows. Turn `i` covers rows
+# `starts[i]` up to (not including) `ends[i]`, all spoken by
+# `speakers[speaker_ids[i]]`. An id of -1 means no speaker was found for
+# those rows.
+SpeakerTurns = namedtuple('SpeakerTurns', 
+                          ['starts', 'ends', 'speaker_ids', 'speakers'])
+
+
 class BaseDocument:
     """
     Read-only class that provides information relevant to us given a raw-text
     document.
+
+    Results of `lines()` and `content()` are memoized per document, keyed by
+    the speaker and cleaning options they were called with. At most
+    `view_cache_size` results are kept; see `cache_info()` and 
+    `clear_cache()`.
     """
 
     default_speaker_pair = regexes.SPEAKER_PAIRS[0]
+    view_cache_size = 16
 
     def __init__(self, text: str) -> None:
         self.full_text = text
         self.full_lines = text.split('\n')
+        self._view_cache: OrderedDict[tuple, list[str] | str] = OrderedDict()
+        self._view_cache_hits = 0
+        self._view_cache_misses = 0
+        self._speaker_sets: dict[bool, frozenset[str]] = {}
+
+    def _cached_view(self, key: tuple, compute):
+        """
+        Return the memoized result for `key`, calling `compute` to get it on
+        a miss. The least recently used result is dropped once the cache is
+        full.
+        """
+        if key in self._view_cache:
+            self._view_cache_hits += 1
+            self._view_cache.move_to_end(key)
+            return self._view_cache[key]
+        self._view_cache_misses += 1
+        value = compute()
+        self._view_cache[key] = value
+        if len(self._view_cache) > self.view_cache_size:
+            self._view_cache.popitem(last=False)
+        return value
+
+    def cache_info(self) -> CacheInfo:
+        """
+        Hit/miss statistics for the `lines()`/`content()` cache, in the same
+        format as `functools.lru_cache`.
+        """
+        return CacheInfo(self._view_cache_hits, self._view_cache_misses,
+                         self.view_cache_size, len(self._view_cache))
+
+    def clear_cache(self) -> None:
+        """
+        Forget everything computed from the document's text: every memoized
+        `lines()`/`content()` result, the speaker sets, and every cached 
+        property (speaker turns, speaker tuple, labels, ...). Call this after
+        changing the document's text (`full_text` and `full_lines`).
+        """
+        self._view_cache.clear()
+        self._view_cache_hits = self._view_cache_misses = 0
+        self._speaker_sets.clear()
+        for cls in type(self).__mro__:
+            for name, attribute in vars(cls).items():
+                if isinstance(attribute, cached_property):
+                    self.__dict__.pop(name, None)
 
     def clean_lines(self, lines, 
                     remove_timestamps=True,
@@ -41,32 +173,15 @@ class BaseDocument:
                     lower=False) -> list[str]:
         """
         Big function to clean lines according to specified parameters.
+        See `CleaningPipeline` for what each parameter does.
         """
-        if remove_timestamps == True:
-            # Remove timestamps from the lines
-            lines = [regexes.timestamps.sub('', line).strip()
-                        for line in lines]
-        if do_replacements == True:
-            # Replace bracketed stuff with better representations
-            lines = [regexes.replace_tokens(line)
-                        for line in lines]
-        if do_removals == True:
-            # Remove tokens that are not useful for us
-            lines = [regexes.remove_tokens(line)
-                        for line in lines]
-        if speaker_labels == True:
-            # Remove speaker labels from the lines
-            lines = [regexes.speaker_labels_restricted.sub('', line)
-                     for line in lines]
-        if lower == True:
-            lines = [line.lower() for line in lines]
-        if remove_punctuation == True:
-            # Remove punctuation
-            lines = [line.translate(str.maketrans('', '', string.punctuation))
-                     for line in lines]
-        # Remove empty lines
-        lines = [line for line in lines if line]
-        return lines
+        pipeline = cleaning_pipeline(remove_timestamps=remove_timestamps,
+                                     do_replacements=do_replacements,
+                                     do_removals=do_removals,
+                                     speaker_labels=speaker_labels,
+                                     remove_punctuation=remove_punctuation,
+                                     lower=lower)
+        return pipeline(lines)
 
     def lines(self, 
               speaker: None | str=None, cleaned=True, 
@@ -77,6 +192,28 @@ class BaseDocument:
         Returns a dictionary where keys are speaker names and values are lists
         of lines spoken by that speaker.
         """
+        # Raw lines need no work, don't bother caching them
+        if speaker is None and not cleaned:
+            return self.full_lines
+        key = ('lines', speaker, cleaned, remove_timestamps, do_replacements,
+               do_removals, speaker_labels, remove_punctuation, lower)
+        lines = self._cached_view(key, lambda: self._lines(
+            speaker, cleaned=cleaned, remove_timestamps=remove_timestamps,
+            do_replacements=do_replacements, do_removals=do_removals,
+            speaker_labels=speaker_labels,
+            remove_punctuation=remove_punctuation, lower=lower
+        ))
+        # Copy so callers can't modify the cached list
+        return list(lines)
+
+    def _lines(self, 
+               speaker: None | str=None, cleaned=True, 
+               remove_timestamps=True, do_replacements=True, do_removals=True,
+               speaker_labels=False, remove_punctuation=False, lower=False
+        ) -> list[str]:
+        """
+        Uncached version of `lines()`.
+        """
         # If no speaker is specified...
         if speaker is None:
             # And the user asks to clean, return all lines with cleaning 
@@ -101,9 +238,11 @@ class BaseDocument:
             f"Speaker label {speaker} not in default speaker pair " \
             f"{self.default_speaker_pair}, check spelling? ({self})"
         # Filter full lines to only those spoken by the specified speaker
-        speaker_lines = [self.full_lines[i] 
-                         for i in range(len(self.full_lines))
-                         if self._row_speakers_default[i] == speaker]
+        speaker_lines = [line 
+                         for start, end, turn_speaker 
+                         in self._default_speaker_turns
+                         if turn_speaker == speaker
+                         for line in self.full_lines[start:end]]
         # If the user asks to clean, clean the speaker lines before 
         # returning them
         if cleaned:
@@ -125,13 +264,17 @@ class BaseDocument:
         Returns a dictionary where keys are speaker names and values are lists
         of lines spoken by that speaker.
         """
-        content = '\n'.join(self.lines(speaker, cleaned=cleaned,
+        key = ('content', speaker, cleaned, remove_timestamps, 
+               do_replacements, do_removals, speaker_labels, 
+               remove_punctuation, lower)
+        content = self._cached_view(key, lambda: '\n'.join(self.lines(
+                         speaker, cleaned=cleaned,
                          remove_timestamps=remove_timestamps, 
                          do_replacements=do_replacements, 
                          do_removals=do_removals, 
                          speaker_labels=speaker_labels, 
                          remove_punctuation=remove_punctuation, 
-                         lower=lower))
+                         lower=lower)))
         return content
 
     def speaker_set(self, restrict=True) -> set[str]:
@@ -141,13 +284,17 @@ class BaseDocument:
         speaker labels (those strings captured by `regexes.find_speakers`) will
         be returned.
         """
-        speaker_matches = regexes.find_speakers(self.full_text, 
-                                                restrict=restrict)
-        if not speaker_matches:
-            # There should never be 0 speakers in a document
-            raise ValueError(f'No speakers found in {self}. '
-                             f'Assuming something is wrong.')
-        return set(speaker_matches)
+        restrict = bool(restrict)
+        # The regex runs over the whole text, so only do it once per option
+        if restrict not in self._speaker_sets:
+            speaker_matches = regexes.find_speakers(self.full_text, 
+                                                    restrict=restrict)
+            if not speaker_matches:
+                # There should never be 0 speakers in a document
+                raise ValueError(f'No speakers found in {self}. '
+                                 f'Assuming something is wrong.')
+            self._speaker_sets[restrict] = frozenset(speaker_matches)
+        return set(self._speaker_sets[restrict])
     
     @cached_property
     def speaker_tuple(self) -> tuple:
@@ -155,90 +302,133 @@ class BaseDocument:
         Uses the _speaker_set property to find which pair of speakers in 
         SPEAKER_PAIRS is speaking in the document.
         """
-        if len(self.speaker_set()) == 1:
+        speakers = frozenset(self.speaker_set())
+        # All pairs in SPEAKER_PAIRS that contain every speaker found
+        pairs = SPEAKER_PAIR_LOOKUP.get(speakers, ())
+        if len(speakers) == 1:
             # If we only find one speaker label, find the pair in 
             # SPEAKER_PAIRS that contains that label
-            speaker = next(iter(self.speaker_set()))
-            pairs_with_speaker = [pair for pair in SPEAKER_PAIRS 
-                                  if speaker in pair]
+            speaker = next(iter(speakers))
             # If we find more than one pair, give up.
-            if len(pairs_with_speaker) > 1:
+            if len(pairs) > 1:
                 warnings.warn(f'Not enough information to determine '
                                'speaker tuple. Only 1 speaker label, '
                               f'\"{speaker}\", found in {self} '
-                              f'yet there are {len(pairs_with_speaker)} '
+                              f'yet there are {len(pairs)} '
                                'speaker tuples that have this speaker in '
-                              f'them: {pairs_with_speaker}')
-            elif not pairs_with_speaker:
+                              f'them: {list(pairs)}')
+            elif not pairs:
                 raise ValueError('No speaker tuple found containing speaker '
                                 f'label \"{speaker}\".')
-            return pairs_with_speaker[0]
+            return pairs[0]
         # If all elements in some speaker pair are in the speaker set, we 
         # assume we've found the right pair
-        for pair in SPEAKER_PAIRS:
-            if all(speaker in pair for speaker in self.speaker_set()):
-                return pair
+        if pairs:
+            return pairs[0]
         # If we still haven't found a match, something has gone wrong
         raise ValueError(f'No valid speaker pair found for {self}. '
                          f'Speakers: {self.speaker_set()}')
 
     @cached_property
-    def _row_speakers(self) -> list[str | None]:
+    def speaker_turns(self) -> SpeakerTurns:
         """
-        Returns a list where index in this list corresponds to a row in the 
-        document, and each index in the list contains the speaker of that row.
-        This list can be thought of as a mapping between each row index and the
-        speaker of the row corresponding to each index.
+        Finds the speaker of every row in a single pass over the document's
+        rows, and stores the result as a list of turns (see `SpeakerTurns`).
         """
         lines = self.lines(cleaned=False)
-        row_speakers: list[str | None] = [None] * len(lines)
+        starts: list[int] = []
+        ends: list[int] = []
+        names: list[str | None] = []
         current_speaker: str | None = None
         for i in range(len(lines)):
-            line = lines[i]
-            speaker_matches = regexes.find_speakers(line)
+            speaker_matches = regexes.find_speakers(lines[i])
             # If speaker found, change global current_speaker variable
             if speaker_matches:
                 # In the case that len(speaker_matches) > 1, we use the last 
                 # entry in the list so that the next line is most up-to-date
                 current_speaker = speaker_matches[-1]
-            row_speakers[i] = current_speaker
-            # If we've found a speaker farther than at the first row,
-            # and the first row is empty, we assume that all rows up to this
-            # point haven't been labeled (check)
-            if i > 0 and current_speaker and not row_speakers[0]:
-                # In the case when there are two speakers, we know the
-                # empty rows are spoken by the other speaker.
-                if len(self.speaker_tuple) == 2:
-                    current_speaker_ind = (self.speaker_tuple
-                                               .index(current_speaker))
-                    other_speaker = self.speaker_tuple[current_speaker_ind-1]
-                    row_speakers[:i] = [other_speaker] * i
-                else:
-                    warnings.warn(f'First {i+1} rows (out of '
-                                  f'{len(lines)}) empty in {self}, but '
-                                   'there are too many speakers! I don\'t '
-                                   'know how to fill them.')
-        
-        rows_without_speakers = tuple(i for i in range(len(row_speakers)) 
-                                      if not row_speakers[i])
+            # Extend the current turn, or start a new one if the speaker 
+            # changed
+            if names and names[-1] == current_speaker:
+                ends[-1] = i + 1
+            else:
+                starts.append(i)
+                ends.append(i + 1)
+                names.append(current_speaker)
+        # If we've found a speaker farther than at the first row, and the 
+        # first row is empty, we assume that all rows up to this point 
+        # haven't been labeled (check)
+        if len(names) > 1 and names[0] is None:
+            # In the case when there are two speakers, we know the
+            # empty rows are spoken by the other speaker.
+            if len(self.speaker_tuple) == 2:
+                current_speaker_ind = self.speaker_tuple.index(names[1])
+                names[0] = self.speaker_tuple[current_speaker_ind-1]
+            else:
+                warnings.warn(f'First {ends[0]+1} rows (out of '
+                              f'{len(lines)}) empty in {self}, but '
+                               'there are too many speakers! I don\'t '
+                               'know how to fill them.')
+
+        rows_without_speakers = tuple(row 
+                                      for start, end, name 
+                                      in zip(starts, ends, names)
+                                      if not name 
+                                      for row in range(start, end))
         if any(rows_without_speakers):
             warnings.warn(f'Rows {rows_without_speakers} in {self} '
                           f'are missing speakers.')
+
+        speakers = tuple(dict.fromkeys(name for name in names if name))
+        speaker_ids = [speakers.index(name) if name else -1 
+                       for name in names]
+        return SpeakerTurns(array('I', starts), array('I', ends),
+                            array('b', speaker_ids), speakers)
+
+    @cached_property
+    def _row_speakers(self) -> list[str | None]:
+        """
+        Returns a list where index in this list corresponds to a row in the 
+        document, and each index in the list contains the speaker of that row.
+        This list can be thought of as a mapping between each row index and the
+        speaker of the row corresponding to each index.
+        """
+        turns = self.speaker_turns
+        row_speakers: list[str | None] = []
+        for start, end, speaker_id in zip(turns.starts, turns.ends, 
+                                          turns.speaker_ids):
+            speaker = turns.speakers[speaker_id] if speaker_id >= 0 else None
+            row_speakers += [speaker] * (end - start)
         return row_speakers
     
     @cached_property
-    def _row_speakers_default(self) -> list[str]:
+    def _default_speaker_turns(self) -> list[tuple[int, int, str]]:
         """
-        Convert all names in _row_speakers to their default pair names given
-        by SPEAKER_PAIRS[0].
+        Turns from `speaker_turns` as (start row, end row, speaker) tuples, 
+        with speakers converted to their default pair names given by 
+        SPEAKER_PAIRS[0].
         """
         # See default_speaker_pair definition for convention
         default_interviewer_name = self.default_speaker_pair[0]
         default_participant_name = self.default_speaker_pair[1]
         last_speaker_in_pair = self.speaker_tuple[-1]
-        return [default_participant_name if speaker == last_speaker_in_pair 
-                else default_interviewer_name 
-                for speaker in self._row_speakers]
+        turns = self.speaker_turns
+        return [(start, end, 
+                 default_participant_name 
+                 if speaker_id >= 0 and 
+                    turns.speakers[speaker_id] == last_speaker_in_pair
+                 else default_interviewer_name)
+                for start, end, speaker_id in zip(turns.starts, turns.ends,
+                                                  turns.speaker_ids)]
+
+    @cached_property
+    def _row_speakers_default(self) -> list[str]:
+        """
+        Convert all names in _row_speakers to their default pair names given
+        by SPEAKER_PAIRS[0].
+        """
+        return [speaker for start, end, speaker in self._default_speaker_turns
+                for _ in range(start, end)]
 
 
 class TextDocument(BaseDocument):
@@ -271,9 +461,13 @@ class DatasaurDocument(BaseDocument):
     # at index 1
     default_speaker_pair = regexes.SPEAKER_PAIRS[0]
         
-    def __init__(self, path: str) -> None:
-        with open(path) as f:
-            self.json_dump = json.load(f)
+    def __init__(self, path: str, json_dump: None | dict=None) -> None:
+        # The parsed export may be passed in directly (see
+        # `utils.data.datasaur.load_documents`), otherwise it's read from path
+        if json_dump is None:
+            with open(path) as f:
+                json_dump = json.load(f)
+        self.json_dump = json_dump
         self.path = path
         # JSON always looks like {'version' : '1.0', 'data' : {...}},
         # So we will just index into the 'data' key
@@ -343,6 +537,57 @@ class DatasaurDocument(BaseDocument):
 
         return labels_with_speakers
     
+    @cached_property
+    def _token_offsets(self) -> tuple[str, array, array, array]:
+        """
+        All of the document's tokens joined by single spaces into one string,
+        where each token starts and ends in that string, and the index of 
+        each row's first token (with an extra entry at the end, so row `i`'s 
+        tokens are `row_firsts[i]` up to `row_firsts[i+1]`).
+        """
+        tokens = self.tokens
+        if any(not isinstance(token, str) for row in tokens for token in row):
+            # Some exports have rows whose tokens were overwritten with lists
+            # (see transcript 2005), so fall back to splitting the lines
+            warnings.warn(f'Malformed tokens in {self}, splitting lines on '
+                           'whitespace instead.')
+            tokens = [line.split() for line in self.full_lines]
+        flat_tokens = [token for row in tokens for token in row]
+        row_firsts = array('I', accumulate((len(row) for row in tokens),
+                                           initial=0))
+        starts, ends = array('I'), array('I')
+        position = 0
+        for token in flat_tokens:
+            starts.append(position)
+            position += len(token)
+            ends.append(position)
+            position += 1 # The space between tokens
+        return ' '.join(flat_tokens), starts, ends, row_firsts
+
+    def span_text(self, start_row: int, start_token: int, 
+                  end_row: int, end_token: int) -> str:
+        """
+        Text of the tokens from (start_row, start_token) through 
+        (end_row, end_token), inclusive, separated by single spaces (also
+        across rows). A span that ends in a row without tokens ends with the
+        last token before that row.
+        """
+        text, starts, ends, row_firsts = self._token_offsets
+        first = min(row_firsts[start_row] + start_token, 
+                    row_firsts[start_row + 1])
+        if row_firsts[end_row] == row_firsts[end_row + 1]:
+            # The end row has no tokens, so the span ends with the last token
+            # of the rows before it (if it starts before the end row at all)
+            if start_row == end_row:
+                return ''
+            last = row_firsts[end_row] - 1
+        else:
+            last = min(row_firsts[end_row] + end_token, 
+                       row_firsts[end_row + 1] - 1)
+        if last < first:
+            return ''
+        return text[starts[first]:ends[last]]
+
     def label_text(self):
         """
         Method that gives the contents of labels in the document, organized
@@ -356,23 +601,12 @@ class DatasaurDocument(BaseDocument):
         labels = defaultdict(list)
         for label in self.label_data:
             label_name = label['labelItem']['labelName']
-
-            start_row = label['textPosition']['start']['row']
-            start_token = label['textPosition']['start']['tokenIndex']
-            end_row = label['textPosition']['end']['row']
-            end_token = label['textPosition']['end']['tokenIndex']
-
-            if start_row == end_row:
-                label_text = " ".join(self.tokens[start_row][start_token:end_token+1])
-            else:
-                distance = end_row - start_row
-                label_text = " ".join(self.tokens[start_row][start_token:])
-                if distance > 1:
-                    for i in range(1, distance):
-                        label_text += self.full_lines[start_row + i]
-                label_text += " ".join(self.tokens[end_row][:end_token+1])
-            
-            labels[label_name].append(label_text)
+            start = label['textPosition']['start']
+            end = label['textPosition']['end']
+            labels[label_name].append(self.span_text(start['row'], 
+                                                     start['tokenIndex'],
+                                                     end['row'], 
+                                                     end['tokenIndex']))
         return labels
 
     @cached_property
@@ -1,10 +1,205 @@
+from collections import Counter, deque, namedtuple
+from collections.abc import Iterable, Iterator
+import hashlib
+import os
+import pickle
 import warnings
 import stanza
 import stanza.models.constituency.parse_tree as pt
+from stanza.models.constituency import tree_reader
 import statistics as stats
 
 
-nlp = stanza.Pipeline(lang='en', processors='tokenize,pos,constituency')
+# Processors needed for all metrics below. TTR and ASL only need tokens, so
+# they can be computed with just the `TOKENIZE` processor.
+PROCESSORS = 'tokenize,pos,constituency'
+TOKENIZE = 'tokenize'
+
+_pipelines: dict[str, stanza.Pipeline] = {}
+
+
+def processor_key(processors: str) -> str:
+    """
+    Normalized form of a comma-separated list of processors, so that lists 
+    naming the same processors give the same pipeline and cache entries.
+
+    Ex: 'pos, tokenize,constituency' -> 'constituency,pos,tokenize'
+    """
+    return ','.join(sorted({processor.strip() 
+                            for processor in processors.split(',')}))
+
+
+def pipeline(processors: str=PROCESSORS) -> stanza.Pipeline:
+    """
+    The shared stanza pipeline running `processors`. Each pipeline is only 
+    built the first time it's asked for, so importing this module loads no
+    models, token-level metrics only load the tokenizer, and results read 
+    from a `ParseCache` never load the neural models at all.
+    """
+    key = processor_key(processors)
+    if key not in _pipelines:
+        _pipelines[key] = stanza.Pipeline(lang='en', processors=key)
+    return _pipelines[key]
+
+
+# `nlp` is kept as a module attribute for existing code, built on access
+# (PEP 562)
+def __getattr__(name: str):
+    if name == 'nlp':
+        return pipeline()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def parse_texts(texts: list[str], batch_size: int=32,
+                processors: str=PROCESSORS) -> list[stanza.Document]:
+    """
+    Run many texts through the pipeline for `processors`, handing stanza 
+    `batch_size` documents at a time so that its models work on full batches
+    instead of one short text at a time. Returns one stanza document per 
+    text, in the same order. Empty texts are not sent to the pipeline and 
+    give documents with no sentences.
+    """
+    nlp = pipeline(processors)
+    stanza_docs = [stanza.Document([], text=text) for text in texts]
+    non_empty = [i for i, text in enumerate(texts) if text.strip()]
+    for batch_start in range(0, len(non_empty), batch_size):
+        batch = non_empty[batch_start:batch_start + batch_size]
+        processed = nlp.bulk_process([stanza_docs[i] for i in batch])
+        for i, stanza_doc in zip(batch, processed):
+            stanza_docs[i] = stanza_doc
+    return stanza_docs
+
+
+# Plain copy of the parts of a stanza document the metrics below use. Has the
+# same `sentences` and `constituency` attributes as a stanza document, so it
+# can be passed to `NP_ratio_in_sd`, but its tokens are plain strings.
+ParsedSentence = namedtuple('ParsedSentence', 
+                            ['tokens', 'pos', 'constituency'])
+ParsedText = namedtuple('ParsedText', ['sentences'])
+
+
+def parsed_text(stanza_doc: stanza.Document) -> ParsedText:
+    """
+    Copy the tokens, POS tags and trees out of a stanza document. Each POS tag
+    is `None` if the pipeline didn't run `pos`, and so is the tree if it 
+    didn't run `constituency`.
+    """
+    return ParsedText([
+        ParsedSentence(tuple(token.text for token in sent.tokens),
+                       tuple(word.upos for word in sent.words),
+                       sent.constituency)
+        for sent in stanza_doc.sentences
+    ])
+
+
+def sentence_tokens(parsed: ParsedText) -> list[list[str]]:
+    """The tokens of each sentence, as `type_token_ratio` etc. expect."""
+    return [list(sent.tokens) for sent in parsed.sentences]
+
+
+def iter_tokens(parsed_texts: Iterable[ParsedText]) -> Iterator[str]:
+    """
+    Stream the tokens of one or more parsed texts in order, without building
+    lists of sentences.
+
+    Ex: the MATTR of all of a transcript's participant speech
+        >>> MATTR(iter_tokens(ParseCache().parse(
+        ...     [doc.content("Participant") for doc in transcript])))
+    """
+    for parsed in parsed_texts:
+        for sent in parsed.sentences:
+            yield from sent.tokens
+
+
+# Bump this whenever what a `ParseCache` entry holds changes, so that old 
+# entries are parsed again instead of read
+PARSE_CACHE_VERSION = 2
+
+
+class ParseCache:
+    """
+    Persistent store of parsed texts, so reruns of the linguistic metrics 
+    don't reparse text that was parsed before.
+
+    Each text gets its own entry, keyed by a hash of the text, the stanza 
+    version and the processors used, so upgrading stanza or changing the 
+    processors never returns stale parses. Trees are stored in their 
+    bracketed form: stanza writes and reads that without recursion, whereas 
+    pickling a `Tree` recurses once per level and fails on deep parses.
+
+    Ex: 
+        >>> cache = ParseCache()
+        >>> parsed = cache.parse([doc.content("Participant") for doc in docs])
+        >>> NP_ratio_in_sd(parsed[0])
+    """
+
+    def __init__(self, cache_dir: str='./.cache/stanza',
+                 processors: str=PROCESSORS) -> None:
+        self.cache_dir = cache_dir
+        self.processors = processor_key(processors)
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256('\0'.join(
+            (str(PARSE_CACHE_VERSION), stanza.__version__, self.processors, 
+             text)
+        ).encode()).hexdigest()
+
+    def _entry_path(self, text: str) -> str:
+        return os.path.join(self.cache_dir, self.key(text) + '.pickle')
+
+    def get(self, text: str) -> None | ParsedText:
+        """The cached parse of `text`, or `None` if it was never parsed."""
+        try:
+            with open(self._entry_path(text), 'rb') as f:
+                parsed = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        return ParsedText([
+            sent._replace(constituency=tree_reader.read_trees(
+                sent.constituency, use_tqdm=False
+            )[0]) if sent.constituency is not None else sent
+            for sent in parsed.sentences
+        ])
+
+    def put(self, text: str, parsed: ParsedText) -> None:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(text)
+        # Write to a temporary file first so readers (possibly in other
+        # processes) never see half an entry
+        tmp_path = f"{entry_path}.{os.getpid()}.tmp"
+        flat = ParsedText([
+            sent._replace(constituency="{}".format(sent.constituency))
+            if sent.constituency is not None else sent
+            for sent in parsed.sentences
+        ])
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(flat, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+    def parse(self, texts: list[str], batch_size: int=32) -> list[ParsedText]:
+        """
+        Parse of each text, in the same order. Only texts that aren't cached
+        are run through the pipeline (see `parse_texts`), and their parses 
+        are cached.
+        """
+        parsed = [self.get(text) for text in texts]
+        missing = [i for i, result in enumerate(parsed) if result is None]
+        if missing:
+            stanza_docs = parse_texts([texts[i] for i in missing], batch_size,
+                                      self.processors)
+            for i, stanza_doc in zip(missing, stanza_docs):
+                parsed[i] = parsed_text(stanza_doc)
+                self.put(texts[i], parsed[i])
+        return parsed # type: ignore
+
+
+def init_worker(threads: int=1) -> None:
+    """
+    Initializer for worker processes that each run their own pipeline. Limits
+    the threads torch uses in each, so that workers don't compete for cores.
+    """
+    import torch
+    torch.set_num_threads(threads)
 
 
 def type_token_ratio(tokens: list[str] | list[list[str]],
@@ -56,10 +251,162 @@ def average_sentence_length(sentences: list[list[str]]) -> float:
     return sum(len(sent) for sent in sentences) / len(sentences)
 
 
+def MATTR(tokens: Iterable[str], window: int=50) -> float:
+    """
+    Calculate the moving-average type-token ratio (MATTR) of a stream of 
+    tokens: the mean TTR of every run of `window` consecutive tokens. Unlike
+    per-sentence TTR, it doesn't depend on how long sentences are.
+
+    Types are counted incrementally as the window slides, so this takes one 
+    pass over `tokens`, which can be any iterable (e.g. `iter_tokens`).
+
+    :param tokens: A stream of tokens.
+    :type tokens: Iterable[str]
+    :param window: The number of tokens in each window. If there are fewer
+                   tokens than this, the TTR of all the tokens is returned.
+    :type window: int
+    :return: The MATTR of the tokens.
+    :rtype: float
+
+    """
+    counts = Counter()
+    recent = deque()
+    ttr_sum = 0.0
+    n_windows = 0
+    for token in tokens:
+        token = token.lower()
+        counts[token] += 1
+        recent.append(token)
+        if len(recent) > window:
+            oldest = recent.popleft()
+            counts[oldest] -= 1
+            if not counts[oldest]:
+                del counts[oldest]
+        if len(recent) == window:
+            ttr_sum += len(counts) / window
+            n_windows += 1
+    if not recent:
+        warnings.warn("Empty token stream provided for MATTR calculation.")
+        return 0.0
+    if not n_windows:
+        # Shorter than one window
+        return len(counts) / len(recent)
+    return ttr_sum / n_windows
+
+
+def _MTLD_factors(tokens: Iterable[str], threshold: float) -> float:
+    """
+    Number of factors in one MTLD pass: runs of tokens over which the TTR 
+    falls to `threshold`, plus a partial factor for the leftover tokens.
+    """
+    factors = 0.0
+    types = set()
+    n_tokens = 0
+    for token in tokens:
+        types.add(token)
+        n_tokens += 1
+        if len(types) / n_tokens <= threshold:
+            factors += 1
+            types.clear()
+            n_tokens = 0
+    if n_tokens:
+        factors += (1 - len(types) / n_tokens) / (1 - threshold)
+    return factors
+
+
+def MTLD(tokens: Iterable[str], threshold: float=0.72) -> float:
+    """
+    Calculate the measure of textual lexical diversity (MTLD) of a stream of
+    tokens (McCarthy & Jarvis, 2010): the average number of tokens it takes
+    for the running TTR to fall to `threshold`, averaged over a forward and a
+    backward pass.
+
+    Each pass is linear in the number of tokens. The tokens are kept in one
+    flat list for the backward pass, so sentences never need to be stored.
+
+    :param tokens: A stream of tokens.
+    :type tokens: Iterable[str]
+    :param threshold: The TTR at which a factor ends.
+    :type threshold: float
+    :return: The MTLD of the tokens. If the TTR never falls at all (every 
+             token is distinct), this is the number of tokens.
+    :rtype: float
+
+    """
+    tokens = [token.lower() for token in tokens]
+    if not tokens:
+        warnings.warn("Empty token stream provided for MTLD calculation.")
+        return 0.0
+    scores = []
+    for stream in (tokens, reversed(tokens)):
+        factors = _MTLD_factors(stream, threshold)
+        scores.append(len(tokens) / factors if factors 
+                      else float(len(tokens)))
+    return stats.mean(scores)
+
+
+# Phrase labels that `count_non_NP_phrases` doesn't count as phrases
+NON_PHRASE_LABELS = frozenset({'ROOT', 'S', 'NP'})
+
+TreeStats = namedtuple('TreeStats', ['nps', 'non_NP_phrases', 'depth',
+                                     'label_counts'])
+
+
+def tree_stats(tree: pt.Tree) -> TreeStats:
+    """
+    Gather the statistics of a constituency parse tree the NP metrics use,
+    in a single traversal:
+
+    - `nps`: the number of surface-level (lowest) noun phrases, see 
+      `count_nps`
+    - `non_NP_phrases`: the number of phrase nodes that aren't NP, S or 
+      ROOT, see `count_non_NP_phrases`
+    - `depth`: the number of edges on the longest path from the root to a 
+      word
+    - `label_counts`: a `Counter` of the labels of all non-word nodes 
+      (phrases and POS tags)
+
+    The tree is walked with an explicit stack rather than recursion, so very
+    long utterances can't hit Python's recursion limit.
+
+    :param tree: A constituency parse tree for a sentence.
+    :type tree: stanza.models.constituency.parse_tree.Tree
+    :rtype: TreeStats
+
+    """
+    nps = non_NP_phrases = depth = 0
+    label_counts = Counter()
+    # Each entry is (node, its depth, whether it can still count as a lowest
+    # NP, whether it can count as a phrase)
+    stack = [(tree, 0, True, True)]
+    while stack:
+        node, node_depth, np_counting, phrase_counting = stack.pop()
+        children = [child for child in node.children 
+                    if isinstance(child, pt.Tree)]
+        if children:
+            label_counts[node.label] += 1
+        else:
+            depth = max(depth, node_depth)
+        # Nothing below a lowest NP counts as an NP
+        if np_counting and node.label == 'NP' and \
+                all(child.label != 'NP' for child in children):
+            nps += 1
+            np_counting = False
+        # Words under a POS tag aren't phrases
+        if node.is_preterminal():
+            phrase_counting = False
+        elif phrase_counting and node.label not in NON_PHRASE_LABELS:
+            non_NP_phrases += 1
+        stack.extend((child, node_depth + 1, np_counting, phrase_counting)
+                     for child in children)
+    return TreeStats(nps, non_NP_phrases, depth, label_counts)
+
+
 def count_nps(tree: pt.Tree) -> int:
     """
-    Recursively count the number of surface-level noun phrases (NPs) in a 
-    constituency parse tree.
+    Count the number of surface-level noun phrases (NPs) in a constituency
+    parse tree: NP nodes that have no NP children. Nothing below such an NP
+    is counted.
 
     :param tree: A constituency parse tree for a sentence.
     :type tree: stanza.models.constituency.parse_tree.Tree
@@ -67,23 +414,15 @@ def count_nps(tree: pt.Tree) -> int:
     :rtype: int
 
     """
-    # Theoretically, this will count only the lowest node
-    # If this node is an NP and contains no NP children, it's a lowest NP
-    if tree.label == 'NP' and \
-        all(child.label != 'NP' for child in tree.children 
-            if isinstance(child, pt.Tree)):
-        return 1
-    # Recurse into children
-    return sum(count_nps(child) for child in tree.children 
-               if isinstance(child, pt.Tree)) # type: ignore
+    return tree_stats(tree).nps
 
 
 def count_non_NP_phrases(tree: pt.Tree) -> int:
     """
-    Recursively counts the total number of phrase nodes in a Stanza 
-    constituency tree. We define a "phrase" to be any node that is not 
-    preterminal—since all terminal nodes are words, we assume preterminal
-    nodes are POS tags for the words.
+    Counts the total number of phrase nodes in a Stanza constituency tree. 
+    We define a "phrase" to be any node that is not preterminal—since all 
+    terminal nodes are words, we assume preterminal nodes are POS tags for 
+    the words. ROOT, S and NP nodes are not counted.
 
     :param tree: The constituency tree or a sub-tree.
     :type tree: stanza.models.constituency.parse_tree.Tree
@@ -91,15 +430,7 @@ def count_non_NP_phrases(tree: pt.Tree) -> int:
     :rtype: int
 
     """
-    # Base case    
-    if tree.is_preterminal():
-        return 0
-
-    # Recursive step: Count this node as 1 phrase, then add the counts
-    # from all of its children that are also sub-trees.
-    # Exclude the ROOT and S nodes from the count
-    return int(tree.label not in {'ROOT', 'S', 'NP'}) + \
-            sum(count_non_NP_phrases(child) for child in tree.children)
+    return tree_stats(tree).non_NP_phrases
 
 
 def NP_ratio(tree: pt.Tree) -> float:
@@ -116,17 +447,17 @@ def NP_ratio(tree: pt.Tree) -> float:
     """
     if not tree:
         return 0.0
-    np_count = count_nps(tree)
-    other_phrases_count = count_non_NP_phrases(tree)
-    if np_count + other_phrases_count == 0:
+    counts = tree_stats(tree)
+    if counts.nps + counts.non_NP_phrases == 0:
         return 0.0
-    return np_count / (np_count + other_phrases_count)
+    return counts.nps / (counts.nps + counts.non_NP_phrases)
 
 
 def count_nps_in_sd(stanza_doc) -> int:
     if not stanza_doc:
         return 0
-    return sum(count_nps(sent.constituency) for sent in stanza_doc.sentences)
+    return sum(tree_stats(sent.constituency).nps
+               for sent in stanza_doc.sentences)
 
 
 def NP_ratio_in_sd(stanza_doc) -> float:
@@ -1,5 +1,7 @@
 import re
+from collections import Counter, namedtuple
 from difflib import get_close_matches
+from itertools import combinations
 
 
 # List of Interviewer/Participant speaker name tuples found in the data.
@@ -14,6 +16,15 @@ SPEAKER_PAIRS: list[tuple] = [
     ("P1", "P2", "Interviewee") # Transcript no. 2008
 ]
 SPEAKERS: set = {speaker for pair in SPEAKER_PAIRS for speaker in pair}
+# Maps every set of speakers that can be found together in a document to all
+# pairs in SPEAKER_PAIRS that contain them (in the same order as 
+# SPEAKER_PAIRS).
+SPEAKER_PAIR_LOOKUP: dict[frozenset, tuple[tuple, ...]] = {}
+for _pair in SPEAKER_PAIRS:
+    for _n in range(1, len(_pair) + 1):
+        for _speakers in combinations(_pair, _n):
+            SPEAKER_PAIR_LOOKUP[frozenset(_speakers)] = \
+                SPEAKER_PAIR_LOOKUP.get(frozenset(_speakers), ()) + (_pair,)
 
 
 # This regex is used to match timestamps, i.e. '19:24', '3:14', or '12:34:56'.
@@ -95,6 +106,9 @@ removable_token_patterns = [
     r'\(affirmative\)|\(negative\)|\(laughter\)', # Remove (affirmative), (negative), and (laughter)
     r'\[affirmative\]|\[negative\]|\[laughter\]', # Remove [affirmative], [negative], and [laughter]
 ]
+# All removable tokens in one regex, so they are removed in a single pass
+removable_token = re.compile('|'.join(removable_token_patterns), 
+                             re.IGNORECASE)
 
 def remove_tokens(string: str) -> str:
     """
@@ -106,9 +120,58 @@ def remove_tokens(string: str) -> str:
     Returns:
         str: The string with the tokens removed.
     """
-    for pattern in removable_token_patterns:
-        string = re.sub(pattern, '', string, flags=re.IGNORECASE)
-    return string.strip()
+    return removable_token.sub('', string).strip()
+
+
+# A typed span of a line found by `scan`. `kind` is one of 'removable', 
+# 'speaker', 'extractable' or 'timestamp', and `value` is the speaker's name
+# for speaker labels, the replacement for extractable tokens (see 
+# `replace_tokens`), and the matched text otherwise.
+Span = namedtuple('Span', ['kind', 'start', 'end', 'text', 'value'])
+
+# Every kind of token we look for in one regex. Order matters where tokens 
+# overlap: removable tokens can contain timestamps and look like extractable
+# tokens (i.e. '[END OF RECORDING]'), and speaker labels can contain 
+# timestamps (i.e. 'Interviewer 23:14:').
+token_scanner = re.compile(
+    r'(?P<removable>(?i:{removable}))|(?P<speaker>{speaker})|'
+    r'(?P<extractable>{extractable})|(?P<timestamp>{timestamp})'
+    .format(removable=removable_token.pattern,
+            speaker=speaker_labels_spaced.pattern,
+            extractable=extractable_token.pattern,
+            timestamp=timestamps.pattern)
+)
+
+
+def scan(line: str) -> list[Span]:
+    """
+    Walks a line once and returns every timestamp, speaker label, extractable
+    token and removable token in it, in order, as `Span`s.
+
+    Spans don't overlap, so this isn't the same as running each regex on its
+    own: anything that looks like a speaker label or a timestamp inside a 
+    removable or extractable token is part of that token's span. E.g. in
+    'Interviewer: I heard [inaudible 2:23] yes', `find_speakers` (with
+    `restrict=False`) finds 'Interviewer' and 'inaudible', but only
+    'Interviewer' is a speaker span here.
+
+    Example:
+    - 'Interviewer 2: [inaudible 2:23] 1:24' -> 
+        [Span('speaker', 0, 14, 'Interviewer 2:', 'Interviewer'),
+         Span('extractable', 15, 31, '[inaudible 2:23]', 'INAUDIBLE'),
+         Span('timestamp', 32, 36, '1:24', '1:24')]
+    """
+    spans = []
+    for match in token_scanner.finditer(line):
+        kind, text = match.lastgroup, match.group()
+        if kind == 'speaker':
+            value = speaker_labels_spaced.match(text).group(1) # type: ignore
+        elif kind == 'extractable':
+            value = replace_tokens(text)
+        else:
+            value = text
+        spans.append(Span(kind, match.start(), match.end(), text, value))
+    return spans
 
 
 def find_speaker_format_issues(text, speaker_set=SPEAKERS):
@@ -177,4 +240,73 @@ def find_multi_speaker_lines(text):
         matches = pattern.findall(line)
         if len(matches) > 1:
             multi_speaker_lines.append((i + 1, line.strip(), matches))
-    return multi_speaker_lines
\ No newline at end of file
+    return multi_speaker_lines
+
+# A rule for `RewriteEngine`: every string in `patterns` is replaced with 
+# `replacement`. If `regex` is set, `patterns` are regular expressions 
+# rather than literal strings.
+RewriteRule = namedtuple('RewriteRule', ['name', 'patterns', 'replacement',
+                                         'regex'], defaults=[False])
+
+
+class RewriteEngine:
+    """
+    Applies a set of `RewriteRule`s to a text in a single pass.
+
+    All literal patterns are compiled into one alternation (longest first, so
+    e.g. '[LAUGHS]' wins over '[LAUGH'), followed by one named group per 
+    regex rule. Each match is looked up to find its rule, so every rule costs
+    the same single scan of the text, however many rules there are. Text that
+    was put in by a replacement is never matched again.
+
+    Ex:
+        >>> engine = RewriteEngine([
+        ...     RewriteRule('laughter', ['[laughter]', '[LAUGH]'], ''),
+        ...     RewriteRule('underscore', [r'__+'], '[UNDERSCORE]', True),
+        ... ])
+        >>> engine.rewrite("Ha [LAUGH] __")
+        ('Ha  [UNDERSCORE]', Counter({'laughter': 1, 'underscore': 1}))
+    """
+
+    def __init__(self, rules: list[RewriteRule]) -> None:
+        self.rules = rules
+        self._literal_rules: dict[str, RewriteRule] = {}
+        self._regex_rules: dict[str, RewriteRule] = {}
+        alternatives = []
+        for rule in rules:
+            if not rule.regex:
+                for pattern in rule.patterns:
+                    if pattern in self._literal_rules:
+                        raise ValueError(f"Pattern {pattern!r} is in both "
+                                         f"{self._literal_rules[pattern].name}"
+                                         f" and {rule.name}.")
+                    self._literal_rules[pattern] = rule
+        if self._literal_rules:
+            alternatives.append('|'.join(
+                map(re.escape, sorted(self._literal_rules, key=len, 
+                                      reverse=True))
+            ))
+        for i, rule in enumerate(rule for rule in rules if rule.regex):
+            group = f'rule{i}'
+            self._regex_rules[group] = rule
+            alternatives.append(f"(?P<{group}>{'|'.join(rule.patterns)})")
+        self.pattern = re.compile('|'.join(alternatives))
+
+    def _rule(self, match: re.Match) -> RewriteRule:
+        if match.lastgroup in self._regex_rules:
+            return self._regex_rules[match.lastgroup]
+        return self._literal_rules[match.group()]
+
+    def rewrite(self, text: str) -> tuple[str, Counter]:
+        """
+        Return the rewritten text, and how many times each rule was applied
+        (by rule name).
+        """
+        hits = Counter()
+
+        def replace(match: re.Match) -> str:
+            rule = self._rule(match)
+            hits[rule.name] += 1
+            return rule.replacement
+
+        return self.pattern.sub(replace, text), hits
@@ -1,11 +1,19 @@
 from .document import DatasaurDocument
 from .data import datasaur as datasaur
+from bisect import bisect_left, bisect_right
 from functools import cached_property
 from collections import Counter
+from collections.abc import Mapping
 
 
-transcript_numbers = sorted(list(set(doc.transcript_number 
-                                     for doc in datasaur.docs)))
+# Names of the documents in each transcript, sorted so transcript order is
+# preserved. Built from the registry's index of export paths, so no document
+# is loaded until a transcript is.
+doc_names_by_transcript: dict[str, list[str]] = {
+    tn: sorted(names)
+    for tn, names in datasaur.registry.names_by_transcript.items()
+}
+transcript_numbers = sorted(doc_names_by_transcript)
 
 
 class Transcript(DatasaurDocument):
@@ -23,13 +31,16 @@ class Transcript(DatasaurDocument):
         # i.e. if transcript_number is "005", then this will have
         # '005_082', '005_083', '005_086', etc.
         self.docs: list[DatasaurDocument] = [
-            doc for doc in datasaur.docs 
-            if doc.transcript_number == self.number
+            datasaur.registry.get(name)
+            for name in doc_names_by_transcript[self.number]
         ]
         assert self.docs, \
             f"No documents found for transcript number {transcript_number}"
-        # Sorted so transcript order is preserved
-        self.docs.sort(key=lambda doc: doc.name) 
+        # Document numbers within the transcript, i.e. '082' for '005_082',
+        # in the same (sorted) order as self.docs
+        self.doc_indices = [doc.name[len(self.number) + 1:-len('.txt')]
+                            for doc in self.docs]
+        self._docs_by_index = dict(zip(self.doc_indices, self.docs))
         self.set = self.docs[0].set
         self.hoarder_flag = self.docs[0].hoarder_flag
         # Extracting data from all documents, flattening the lists
@@ -98,21 +109,72 @@ class Transcript(DatasaurDocument):
             summed_counter.update(doc.label_counts)
         return dict(summed_counter)
 
-    def __getitem__(self, index: str) -> DatasaurDocument:
+    def __getitem__(self, index: str | slice
+                    ) -> DatasaurDocument | list[DatasaurDocument]:
         """
         Get a document by its index within the transcript.
         
         Ex: if you want document '2008_118', access Transcript('2008')['118'].
+
+        Slicing by index gives a list of every document in that range, in
+        order. Unlike list slicing, both ends are included, and they don't
+        need to be documents that exist.
+
+        Ex: Transcript('3001')['030':'048'] gives documents '3001_030' 
+            through '3001_048'.
         """
-        for doc in self.docs:
-            if doc.name == f"{self.number}_{index}.txt":
-                return doc
+        if isinstance(index, slice):
+            start = (0 if index.start is None 
+                     else bisect_left(self.doc_indices, index.start))
+            stop = (len(self.doc_indices) if index.stop is None 
+                    else bisect_right(self.doc_indices, index.stop))
+            return self.docs[start:stop:index.step]
+        if index in self._docs_by_index:
+            return self._docs_by_index[index]
         raise KeyError(f"Document no. {index} "
                        f"('{self.number}_{index}.txt') not found "
                        f"in transcript {self.number}")
 
+    def __iter__(self):
+        return iter(self.docs)
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
     def __repr__(self) -> str:
         return f"Transcript(\"{self.number}\")"
 
 
-transcripts = [Transcript(tn) for tn in transcript_numbers]
\ No newline at end of file
+class TranscriptCollection(Mapping):
+    """
+    Read-only mapping from transcript numbers to `Transcript`s. Each
+    transcript is only built (and its documents loaded) the first time it is
+    accessed.
+
+    Ex: transcripts['2005'] is the same as Transcript('2005').
+    """
+
+    def __init__(self) -> None:
+        self._transcripts: dict[str, Transcript] = {}
+
+    def __getitem__(self, transcript_number: str) -> Transcript:
+        if transcript_number not in self._transcripts:
+            if transcript_number not in doc_names_by_transcript:
+                raise KeyError(f'Transcript number {transcript_number} not '
+                                'found in available transcripts.')
+            self._transcripts[transcript_number] = \
+                Transcript(transcript_number)
+        return self._transcripts[transcript_number]
+
+    def __iter__(self):
+        return iter(transcript_numbers)
+
+    def __len__(self) -> int:
+        return len(transcript_numbers)
+
+    def __repr__(self) -> str:
+        return (f"TranscriptCollection({len(self)} transcripts, "
+                f"{len(self._transcripts)} loaded)")
+
+
+transcripts = TranscriptCollection()
\ No newline at end of file
@@ -4,7 +4,7 @@ import utils.data.datasaur as datasaur
 TEXT_FILE_DIRECTORY = './data/mathews/documents/text_files/'
 
 
-for doc in datasaur.docs:
+for doc in datasaur.registry:
     set_dir = "set0" + str(doc.set)
     filename = doc.fixed_name
     with open(TEXT_FILE_DIRECTORY + f"{set_dir}/{filename}", 'w+') \